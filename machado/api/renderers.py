@@ -0,0 +1,66 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Renderers."""
+
+from typing import Iterable, Iterator
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+# types orjson doesn't serialize natively (eg. Decimal, lazy strings)
+ENCODER = JSONEncoder()
+
+# number of items serialized at once by stream_json
+STREAM_CHUNK_SIZE = 1000
+
+
+def dumps(data) -> bytes:
+    """Serialize to JSON with orjson."""
+    return orjson.dumps(data, default=ENCODER.default)
+
+
+def stream_json(items: Iterable, key: str = None) -> Iterator[bytes]:
+    """Serialize a list to JSON one chunk of items at a time.
+
+    If key is set, the list is wrapped in an object: {key: [...]}.
+    """
+    yield b"[" if key is None else b"{" + dumps(key) + b":["
+    chunk = list()
+    separator = b""
+    for item in items:
+        chunk.append(dumps(item))
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield separator + b",".join(chunk)
+            separator = b","
+            chunk = list()
+    if chunk:
+        yield separator + b",".join(chunk)
+    yield b"]" if key is None else b"]}"
+
+
+class ORJSONRenderer(BaseRenderer):
+    """Render JSON with orjson."""
+
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        """Render data into JSON."""
+        if data is None:
+            return b""
+        return dumps(data)
+
+
+# the orjson renderer replaces the JSON one of the default renderers
+RENDERER_CLASSES = [ORJSONRenderer] + [
+    renderer
+    for renderer in api_settings.DEFAULT_RENDERER_CLASSES
+    if not issubclass(renderer, JSONRenderer)
+]
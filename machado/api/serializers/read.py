@@ -5,6 +5,7 @@
 # have been included as part of this package for licensing information.
 
 """Serializers."""
+
 import re
 from django.core.exceptions import ObjectDoesNotExist
 from rest_framework import serializers
@@ -19,6 +20,14 @@ class JBrowseGlobalSerializer(serializers.Serializer):
     """JBrowse global settings serializer."""
 
     featureDensity = serializers.FloatField()
+    featureCount = serializers.IntegerField(required=False)
+
+
+class JBrowseRegionFeatureDensitiesSerializer(serializers.Serializer):
+    """JBrowse region feature densities serializer."""
+
+    bins = serializers.ListField(child=serializers.IntegerField())
+    stats = serializers.DictField(child=serializers.IntegerField())
 
 
 class JBrowseNamesSerializer(serializers.ModelSerializer):
@@ -87,6 +96,8 @@ class JBrowseFeatureSerializer(serializers.ModelSerializer):
 
     def _get_location(self, obj):
         """Get the location."""
+        if "locations" in self.context:
+            return self.context["locations"].get(obj.feature_id)
         try:
             feature_loc = Featureloc.objects.get(
                 feature_id=obj.feature_id, srcfeature_id=self.context.get("refseq")
@@ -146,6 +157,8 @@ class JBrowseFeatureSerializer(serializers.ModelSerializer):
 
     def get_subfeatures(self, obj):
         """Get the subfeatures."""
+        if "subfeatures" in self.context:
+            return self.context["subfeatures"].get(obj.feature_id, list())
         relationship = FeatureRelationship.objects.filter(
             subject_id=obj.feature_id, type__name="part_of", type__cv__name="sequence"
         )
@@ -160,6 +173,8 @@ class JBrowseFeatureSerializer(serializers.ModelSerializer):
 
     def get_display(self, obj):
         """Get the display."""
+        if "displays" in self.context:
+            return self.context["displays"].get(obj.feature_id)
         return obj.get_display()
 
 
@@ -385,6 +400,7 @@ class FeatureSimilaritySerializer(serializers.Serializer):
     query_end = serializers.CharField()
     score = serializers.CharField()
     evalue = serializers.CharField()
+    identity = serializers.CharField()
 
 
 class FeatureCoexpressionSerializer(serializers.ModelSerializer):
@@ -23,6 +23,16 @@ router = routers.SimpleRouter(trailing_slash=False)
 router.register(
     "jbrowse/stats/global", readViews.JBrowseGlobalViewSet, basename="jbrowse_global"
 )
+router.register(
+    r"jbrowse/stats/region/(?P<refseq>.+)",
+    readViews.JBrowseRegionStatsViewSet,
+    basename="jbrowse_region_stats",
+)
+router.register(
+    r"jbrowse/stats/regionFeatureDensities/(?P<refseq>.+)",
+    readViews.JBrowseRegionFeatureDensitiesViewSet,
+    basename="jbrowse_region_feature_densities",
+)
 router.register(
     r"jbrowse/features/(?P<refseq>.+)",
     readViews.JBrowseFeatureViewSet,
@@ -93,6 +103,9 @@ router.register(
     readViews.FeatureSimilarityViewSet,
     basename="feature_similarity",
 )
+router.register(
+    r"feature/batch", readViews.FeatureBatchViewSet, basename="feature_batch"
+)
 
 # loadViews
 
@@ -7,10 +7,11 @@
 """Read views."""
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db import connection
+from django.http import StreamingHttpResponse
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
-from django.core.paginator import Paginator
 
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
@@ -18,16 +19,28 @@ from drf_yasg.utils import swagger_auto_schema
 from haystack.query import SearchQuerySet
 
 from rest_framework import viewsets, status
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from rest_framework.response import Response
 
+from machado.api.renderers import RENDERER_CLASSES, stream_json
 from machado.api.serializers import read as readSerializers
+from machado.cache import versioned_cache_key, versioned_cache_page
+from machado.decorators import EXPRESSION_SAMPLE_FIELDS
+from machado.decorators import get_feature_locations, prefetch_feature_props
+from machado.decorators import retrieve_display_props, retrieve_feature_displays
 from machado.loaders.common import retrieve_organism, retrieve_feature_id
-from machado.models import Analysis, Analysisfeature, Cvterm, Organism, Pub
+from machado.loaders.common import retrieve_overlapping_featurelocs
+from machado.loaders.density import retrieve_feature_densities
+from machado.loaders.density import retrieve_feature_density
+from machado.models import Cvterm, Organism, Pub
 from machado.models import Feature, Featureloc, Featureprop, FeatureRelationship
+from machado.models import FeatureCvterm, FeatureDbxref, FeatureExpressionSample
+from machado.models import FeaturePub
+from machado.models import Pubauthor, PubDbxref
 from django.db.models import Q
 from machado.models import History
 
+from hashlib import md5
 from re import escape, search, IGNORECASE
 
 
@@ -37,6 +50,44 @@ except AttributeError:
     CACHE_TIMEOUT = 60 * 60
 
 
+try:
+    TILE_SIZE = settings.MACHADO_JBROWSE_TILE_SIZE
+except AttributeError:
+    TILE_SIZE = 100000
+
+try:
+    BATCH_MAX_FEATURES = settings.MACHADO_BATCH_MAX_FEATURES
+except AttributeError:
+    BATCH_MAX_FEATURES = 10000
+
+# features retrieved by each set-based query of the batch endpoint
+BATCH_CHUNK_SIZE = 1000
+
+TILE_STATS_KEYS = {"hits": "jbrowse_tile_hits", "misses": "jbrowse_tile_misses"}
+
+
+def record_tile_stats(hits, misses):
+    """Add to the number of JBrowse tiles found in and missing from the cache."""
+    for name, value in (("hits", hits), ("misses", misses)):
+        if value:
+            cache.add(TILE_STATS_KEYS[name], 0, None)
+            try:
+                cache.incr(TILE_STATS_KEYS[name], value)
+            except ValueError:
+                # evicted between add and incr
+                cache.set(TILE_STATS_KEYS[name], value, None)
+
+
+def is_streamed(request):
+    """Return whether the client asked for a streamed response."""
+    return request.query_params.get("stream", "").lower() in ("1", "true")
+
+
+def retrieve_tile_stats():
+    """Retrieve the number of JBrowse tiles found in and missing from the cache."""
+    return {name: cache.get(key, 0) for name, key in TILE_STATS_KEYS.items()}
+
+
 class StandardResultSetPagination(PageNumberPagination):
     """Set the pagination parameters."""
 
@@ -45,6 +96,53 @@ class StandardResultSetPagination(PageNumberPagination):
     max_page_size = 1000
 
 
+class KeysetPagination(CursorPagination):
+    """Paginate by a unique key.
+
+    Each page is retrieved by filtering on the key of the last record of the
+    previous page, without COUNT(*) and OFFSET, so deep pages cost the same
+    as the first one. The total number of records is only counted when the
+    count parameter is true.
+    """
+
+    ordering = "feature_id"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    count_query_param = "count"
+
+    def is_requested(self, request):
+        """Return whether the client asked for a page."""
+        return (
+            self.cursor_query_param in request.query_params
+            or self.page_size_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Paginate the queryset and count it if requested."""
+        self.count = None
+        if request.query_params.get(self.count_query_param, "").lower() in (
+            "1",
+            "true",
+        ):
+            self.count = queryset.count()
+        return super(KeysetPagination, self).paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        """Get the paginated response."""
+        response = super(KeysetPagination, self).get_paginated_response(data)
+        if self.count is not None:
+            response.data["count"] = self.count
+        return response
+
+
+class HistoryPagination(KeysetPagination):
+    """Paginate the history by id."""
+
+    ordering = "-history_id"
+    page_size = 10
+
+
 class JBrowseGlobalViewSet(viewsets.GenericViewSet):
     """API endpoint to view JBrowse global settings."""
 
@@ -54,27 +152,191 @@ class JBrowseGlobalViewSet(viewsets.GenericViewSet):
         operation_summary="Retrieve global settings",
         operation_description="Retrieve global settings. https://jbrowse.org/docs/data_formats.html",
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, request):
         """List."""
         queryset = self.get_queryset()
-        serializer = readSerializers.JBrowseGlobalSerializer(queryset, many=True)
+        serializer = readSerializers.JBrowseGlobalSerializer(queryset)
         return Response(serializer.data)
 
     def get_queryset(self):
         """Get queryset."""
-        return [{"featureDensity": 0.02}]
+        organism = self.request.query_params.get("organism")
+        soType = self.request.query_params.get("soType")
+        stats = None
+        if organism is not None:
+            try:
+                stats = retrieve_feature_density(
+                    organism_id=retrieve_organism(organism).organism_id,
+                    type_id=retrieve_sotype_id(soType),
+                )
+            except ObjectDoesNotExist:
+                pass
+        # fallback when the densities were not computed
+        return stats or {"featureDensity": 0.02}
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(JBrowseGlobalViewSet, self).dispatch(*args, **kwargs)
 
 
+def retrieve_sotype_id(soType):
+    """Retrieve the cvterm_id of a sequence ontology term."""
+    if soType is None:
+        return None
+    return Cvterm.objects.get(cv__name="sequence", name=soType).cvterm_id
+
+
+def retrieve_refseq_id(refseq, organism):
+    """Retrieve the feature_id of a reference sequence."""
+    feature_id = (
+        Feature.objects.filter(uniquename=refseq, organism=retrieve_organism(organism))
+        .values_list("feature_id", flat=True)
+        .first()
+    )
+    if feature_id is None:
+        raise ObjectDoesNotExist("{} not registered.".format(refseq))
+    return feature_id
+
+
+class JBrowseRegionStatsViewSet(viewsets.GenericViewSet):
+    """API endpoint to JBrowse region stats."""
+
+    serializer_class = readSerializers.JBrowseGlobalSerializer
+
+    organism_param = openapi.Parameter(
+        "organism",
+        openapi.IN_QUERY,
+        description="Species name",
+        required=True,
+        type=openapi.TYPE_STRING,
+    )
+    start_param = openapi.Parameter(
+        "start",
+        openapi.IN_QUERY,
+        description="start",
+        required=True,
+        type=openapi.TYPE_INTEGER,
+    )
+    end_param = openapi.Parameter(
+        "end",
+        openapi.IN_QUERY,
+        description="end",
+        required=True,
+        type=openapi.TYPE_INTEGER,
+    )
+    sotype_param = openapi.Parameter(
+        "soType",
+        openapi.IN_QUERY,
+        description="Sequence Ontology term",
+        required=False,
+        type=openapi.TYPE_STRING,
+    )
+
+    @swagger_auto_schema(
+        manual_parameters=[sotype_param, start_param, end_param, organism_param],
+        operation_summary="Retrieve region stats",
+        operation_description="Retrieve the approximate number of features of a region, the sum of the precomputed density bins that overlap it. Features spanning several bins are counted once per bin. https://jbrowse.org/docs/data_formats.html",
+    )
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
+    def list(self, *args, **kwargs):
+        """List."""
+        try:
+            start = int(self.request.query_params.get("start"))
+            end = int(self.request.query_params.get("end"))
+            densities = retrieve_feature_densities(
+                srcfeature_id=retrieve_refseq_id(
+                    self.kwargs.get("refseq"),
+                    self.request.query_params.get("organism"),
+                ),
+                start=start,
+                end=end,
+                bases_per_bin=max(end - start, 1),
+                type_id=retrieve_sotype_id(self.request.query_params.get("soType")),
+            )
+        except (ObjectDoesNotExist, TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        if densities is None:
+            return Response(
+                {"error": "Feature densities not computed"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        # approximate: a feature is counted in every bin it overlaps
+        feature_count = sum(densities[0])
+        serializer = readSerializers.JBrowseGlobalSerializer(
+            {
+                "featureCount": feature_count,
+                "featureDensity": feature_count / max(end - start, 1),
+            }
+        )
+        return Response(serializer.data)
+
+
+class JBrowseRegionFeatureDensitiesViewSet(JBrowseRegionStatsViewSet):
+    """API endpoint to JBrowse region feature densities."""
+
+    serializer_class = readSerializers.JBrowseRegionFeatureDensitiesSerializer
+
+    basesperbin_param = openapi.Parameter(
+        "basesPerBin",
+        openapi.IN_QUERY,
+        description="Bases per bin",
+        required=True,
+        type=openapi.TYPE_INTEGER,
+    )
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            JBrowseRegionStatsViewSet.sotype_param,
+            JBrowseRegionStatsViewSet.start_param,
+            JBrowseRegionStatsViewSet.end_param,
+            basesperbin_param,
+            JBrowseRegionStatsViewSet.organism_param,
+        ],
+        operation_summary="Retrieve region feature densities",
+        operation_description="Retrieve the feature density histogram of a region. https://jbrowse.org/docs/data_formats.html",
+    )
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
+    def list(self, *args, **kwargs):
+        """List."""
+        try:
+            bases_per_bin = int(self.request.query_params.get("basesPerBin"))
+            if bases_per_bin < 1:
+                raise ValueError("basesPerBin must be a positive integer")
+            densities = retrieve_feature_densities(
+                srcfeature_id=retrieve_refseq_id(
+                    self.kwargs.get("refseq"),
+                    self.request.query_params.get("organism"),
+                ),
+                start=int(self.request.query_params.get("start")),
+                end=int(self.request.query_params.get("end")),
+                bases_per_bin=bases_per_bin,
+                type_id=retrieve_sotype_id(self.request.query_params.get("soType")),
+            )
+        except (ObjectDoesNotExist, TypeError, ValueError) as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        if densities is None:
+            return Response(
+                {"error": "Feature densities not computed"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        bins, bin_size = densities
+        serializer = readSerializers.JBrowseRegionFeatureDensitiesSerializer(
+            {
+                "bins": bins,
+                "stats": {"basesPerBin": bases_per_bin, "max": max(bins or [0])},
+            }
+        )
+        return Response(serializer.data)
+
+
 class JBrowseNamesViewSet(viewsets.GenericViewSet):
     """API endpoint to JBrowse names."""
 
     serializer_class = readSerializers.JBrowseNamesSerializer
+    pagination_class = KeysetPagination
+    renderer_classes = RENDERER_CLASSES
 
     organism_param = openapi.Parameter(
         "organism",
@@ -97,18 +359,83 @@ class JBrowseNamesViewSet(viewsets.GenericViewSet):
         required=False,
         type=openapi.TYPE_STRING,
     )
+    cursor_param = openapi.Parameter(
+        "cursor",
+        openapi.IN_QUERY,
+        description="pagination cursor, returned as next and previous",
+        required=False,
+        type=openapi.TYPE_STRING,
+    )
+    page_size_param = openapi.Parameter(
+        "page_size",
+        openapi.IN_QUERY,
+        description="number of names per page, enables the pagination",
+        required=False,
+        type=openapi.TYPE_INTEGER,
+    )
+    stream_param = openapi.Parameter(
+        "stream",
+        openapi.IN_QUERY,
+        description="stream the response",
+        required=False,
+        type=openapi.TYPE_BOOLEAN,
+    )
 
     @swagger_auto_schema(
-        manual_parameters=[organism_param, equals_param, startswith_param],
+        manual_parameters=[
+            organism_param,
+            equals_param,
+            startswith_param,
+            cursor_param,
+            page_size_param,
+            stream_param,
+        ],
         operation_summary="Retrieve feature names by accession",
         operation_description="Retrieve feature names by accession. https://jbrowse.org/docs/data_formats.html",
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, request):
         """List."""
-        queryset = self.get_queryset()
-        serializer = readSerializers.JBrowseNamesSerializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = self.get_queryset().values(
+            "feature_id", "name", "uniquename", "type__name"
+        )
+        # JBrowse expects a plain list, API clients may ask for pages
+        if self.paginator.is_requested(request):
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(self.serialize_names(page))
+        if is_streamed(request):
+            return StreamingHttpResponse(
+                stream_json(self.serialize_names(queryset)),
+                content_type="application/json",
+            )
+        return Response(self.serialize_names(queryset))
+
+    def serialize_names(self, rows):
+        """Serialize values() rows as JBrowseNamesSerializer does."""
+        rows = list(rows)
+        locations = dict()
+        for feature_id, ref, fmin, fmax in (
+            Featureloc.objects.filter(
+                feature_id__in=[row["feature_id"] for row in rows]
+            )
+            .order_by("-locgroup", "-rank")
+            .values_list("feature_id", "srcfeature__uniquename", "fmin", "fmax")
+        ):
+            locations[feature_id] = (ref, fmin, fmax)
+        result = list()
+        for row in rows:
+            location = locations.get(row["feature_id"])
+            if location is not None:
+                location = {
+                    "ref": location[0],
+                    "start": location[1],
+                    "end": location[2],
+                    "type": row["type__name"],
+                    "tracks": [],
+                    "objectName": row["uniquename"],
+                }
+            result.append({"name": row["name"], "location": location})
+        return result
 
     def get_queryset(self):
         """Get queryset."""
@@ -132,7 +459,7 @@ class JBrowseNamesViewSet(viewsets.GenericViewSet):
         else:
             return queryset
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(JBrowseNamesViewSet, self).dispatch(*args, **kwargs)
@@ -163,7 +490,7 @@ class JBrowseRefSeqsViewSet(viewsets.GenericViewSet):
         operation_summary="Retrieve reference sequences",
         operation_description="Retrieve reference sequences. https://jbrowse.org/docs/data_formats.html",
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -185,7 +512,7 @@ class JBrowseRefSeqsViewSet(viewsets.GenericViewSet):
 
         return queryset
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(JBrowseRefSeqsViewSet, self).dispatch(*args, **kwargs)
@@ -195,6 +522,7 @@ class JBrowseFeatureViewSet(viewsets.GenericViewSet):
     """API endpoint to view gene."""
 
     serializer_class = readSerializers.JBrowseFeatureSerializer
+    renderer_classes = RENDERER_CLASSES
 
     organism_param = openapi.Parameter(
         "organism",
@@ -226,19 +554,199 @@ class JBrowseFeatureViewSet(viewsets.GenericViewSet):
     )
 
     @swagger_auto_schema(
-        manual_parameters=[sotype_param, start_param, end_param, organism_param],
+        manual_parameters=[
+            sotype_param,
+            start_param,
+            end_param,
+            organism_param,
+            JBrowseNamesViewSet.stream_param,
+        ],
         operation_description="Retrieve features from reference sequence (refseq). https://jbrowse.org/docs/data_formats.html",
         operation_summary="Retrieve features from reference sequence",
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
-        queryset = self.get_queryset()
         context = self.get_serializer_context()
-        serializer = readSerializers.JBrowseFeatureSerializer(
-            queryset, context=context, many=True
+        refseq = context["refseq"]
+        end = self.request.query_params.get("end")
+        if (
+            context["soType"] is None
+            or refseq is None
+            or (end or refseq.seqlen) is None
+        ):
+            key = versioned_cache_key(
+                "jbrowse_features",
+                md5(self.request.get_full_path().encode()).hexdigest(),
+            )
+            features = cache.get(key)
+            if features is None:
+                features = self.serialize_features(self.get_queryset(), context)
+                cache.set(key, features, CACHE_TIMEOUT)
+            return self.get_features_response(features)
+
+        start = int(self.request.query_params.get("start", 1))
+        end = int(end or refseq.seqlen)
+        features, hits, misses = self.get_tiled_features(start, end, context)
+        response = self.get_features_response(features)
+        response["X-Tile-Hits"] = hits
+        response["X-Tile-Misses"] = misses
+        return response
+
+    def get_features_response(self, features):
+        """Return the features, streamed if requested."""
+        if is_streamed(self.request):
+            return StreamingHttpResponse(
+                stream_json(features, key="features"), content_type="application/json"
+            )
+        return Response({"features": features})
+
+    def serialize_features(self, queryset, context):
+        """Serialize values() rows as JBrowseFeatureSerializer does."""
+        if queryset is None:
+            return list()
+        rows = list(
+            queryset.values_list(
+                "feature_id", "uniquename", "name", "type__name", "seqlen", "residues"
+            )
         )
-        return Response({"features": serializer.data})
+        prefetched = self.get_prefetched_context(
+            [row[0] for row in rows], context["refseq"]
+        )
+        locations = prefetched["locations"]
+        subfeatures = prefetched["subfeatures"]
+        displays = prefetched["displays"]
+        result = list()
+        for feature_id, uniquename, name, type_name, seqlen, residues in rows:
+            location = locations.get(feature_id)
+            if context.get("soType"):
+                start, end = location.fmin, location.fmax
+            else:
+                start, end = 1, seqlen
+            result.append(
+                {
+                    "uniqueID": uniquename,
+                    "accession": uniquename,
+                    "name": name,
+                    "type": type_name,
+                    "start": start,
+                    "end": end,
+                    "strand": location.strand if location is not None else None,
+                    "subfeatures": subfeatures.get(feature_id, list()),
+                    "seq": residues,
+                    "display": displays.get(feature_id),
+                }
+            )
+        return result
+
+    def get_tiled_features(self, start, end, context):
+        """Assemble the features of start..end from cached tiles.
+
+        Tiles are TILE_SIZE bases wide and aligned to multiples of TILE_SIZE,
+        so requests for slightly different regions share most of their tiles.
+        Return the features, the number of tiles found in the cache and the
+        number of tiles computed.
+        """
+        keys = {
+            index: versioned_cache_key(
+                "jbrowse_tile",
+                context["refseq"].feature_id,
+                context["soType"],
+                TILE_SIZE,
+                index,
+            )
+            for index in range(max(start, 0) // TILE_SIZE, max(end, 0) // TILE_SIZE + 1)
+        }
+        tiles = cache.get_many(keys.values())
+        # consecutive missing tiles are computed by a single query
+        runs = list()
+        for index, key in sorted(keys.items()):
+            if key in tiles:
+                continue
+            if runs and runs[-1][-1] == index - 1:
+                runs[-1].append(index)
+            else:
+                runs.append([index])
+        misses = dict()
+        for run in runs:
+            for index in run:
+                misses[keys[index]] = list()
+            for feature in self.serialize_features(
+                self.get_queryset(
+                    start=run[0] * TILE_SIZE, end=(run[-1] + 1) * TILE_SIZE - 1
+                ),
+                context,
+            ):
+                first = max(feature["start"] // TILE_SIZE, run[0])
+                last = min(feature["end"] // TILE_SIZE, run[-1])
+                for index in range(first, last + 1):
+                    misses[keys[index]].append(feature)
+        if misses:
+            cache.set_many(misses, CACHE_TIMEOUT)
+            tiles.update(misses)
+        record_tile_stats(hits=len(keys) - len(misses), misses=len(misses))
+
+        features = dict()
+        for index, key in sorted(keys.items()):
+            for feature in tiles[key]:
+                # features spanning several tiles are in all of them
+                if feature["start"] <= end and feature["end"] >= start:
+                    features.setdefault(feature["uniqueID"], feature)
+        return list(features.values()), len(keys) - len(misses), len(misses)
+
+    def get_prefetched_context(self, feature_ids, refseq):
+        """Retrieve locations, subfeatures and displays in bulk.
+
+        The number of queries doesn't depend on the number of features.
+        """
+        refseq_id = refseq.feature_id if refseq is not None else None
+
+        locations = {
+            loc.feature_id: loc
+            for loc in Featureloc.objects.filter(
+                feature_id__in=feature_ids, srcfeature_id=refseq_id
+            ).only("feature_id", "fmin", "fmax", "strand", "phase")
+        }
+
+        children = dict()
+        for subject_id, object_id in FeatureRelationship.objects.filter(
+            subject_id__in=feature_ids,
+            type__name="part_of",
+            type__cv__name="sequence",
+        ).values_list("subject_id", "object_id"):
+            children.setdefault(subject_id, list()).append(object_id)
+        child_ids = [item for items in children.values() for item in items]
+        child_types = dict(
+            Feature.objects.filter(feature_id__in=child_ids).values_list(
+                "feature_id", "type__name"
+            )
+        )
+        child_locations = {
+            loc.feature_id: loc
+            for loc in Featureloc.objects.filter(
+                feature_id__in=child_ids, srcfeature_id=refseq_id
+            ).only("feature_id", "fmin", "fmax", "strand", "phase")
+        }
+        subfeatures = dict()
+        for feature_id, object_ids in children.items():
+            subfeatures[feature_id] = [
+                {
+                    "type": child_types.get(object_id),
+                    "start": child_locations[object_id].fmin,
+                    "end": child_locations[object_id].fmax,
+                    "strand": child_locations[object_id].strand,
+                    "phase": child_locations[object_id].phase,
+                }
+                for object_id in object_ids
+                if object_id in child_locations
+            ]
+
+        displays = retrieve_feature_displays(feature_ids)
+
+        return {
+            "locations": locations,
+            "subfeatures": subfeatures,
+            "displays": displays,
+        }
 
     def get_serializer_context(self):
         """Get the serializer context."""
@@ -252,7 +760,7 @@ class JBrowseFeatureViewSet(viewsets.GenericViewSet):
         soType = self.request.query_params.get("soType")
         return {"refseq": refseq_feature_obj, "soType": soType}
 
-    def get_queryset(self, *args, **kwargs):
+    def get_queryset(self, start=None, end=None, *args, **kwargs):
         """Get queryset."""
         try:
             refseq = self.kwargs.get("refseq")
@@ -266,14 +774,15 @@ class JBrowseFeatureViewSet(viewsets.GenericViewSet):
 
         try:
             soType = self.request.query_params.get("soType")
-            start = self.request.query_params.get("start", 1)
-            end = self.request.query_params.get("end")
+            if start is None:
+                start = self.request.query_params.get("start", 1)
+                end = self.request.query_params.get("end")
 
-            features_locs = Featureloc.objects.filter(srcfeature=refseq_feature_obj)
-            if end is not None:
-                features_locs = features_locs.filter(fmin__lte=end)
-            features_locs = features_locs.filter(fmax__gte=start)
-            features_ids = features_locs.values_list("feature_id", flat=True)
+            features_ids = retrieve_overlapping_featurelocs(
+                srcfeature_id=getattr(refseq_feature_obj, "feature_id", None),
+                start=start,
+                end=end,
+            ).values_list("feature_id", flat=True)
 
             features = Feature.objects.filter(
                 feature_id__in=features_ids, is_obsolete=0
@@ -285,11 +794,6 @@ class JBrowseFeatureViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return None
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
-    def dispatch(self, *args, **kwargs):
-        """Dispatch."""
-        return super(JBrowseFeatureViewSet, self).dispatch(*args, **kwargs)
-
 
 class autocompleteViewSet(viewsets.GenericViewSet):
     """API endpoint to provide autocomplete hits."""
@@ -316,7 +820,7 @@ class autocompleteViewSet(viewsets.GenericViewSet):
         operation_summary=operation_summary,
         operation_description=operation_description,
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, request):
         """Search the ElasticSearch index for matching strings."""
         queryset = self.get_queryset()
@@ -345,7 +849,7 @@ class autocompleteViewSet(viewsets.GenericViewSet):
         else:
             return None
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(autocompleteViewSet, self).dispatch(*args, **kwargs)
@@ -416,7 +920,7 @@ class OrganismIDViewSet(viewsets.GenericViewSet):
         operation_summary=operation_summary,
         operation_description=operation_description,
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, request):
         """List."""
         queryset = self.get_queryset()
@@ -456,7 +960,7 @@ class OrganismIDViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return None
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(OrganismIDViewSet, self).dispatch(*args, **kwargs)
@@ -478,12 +982,13 @@ class FeatureIDViewSet(viewsets.GenericViewSet):
     lookup_field = "feature_id"
     lookup_value_regex = r"^\d+$"
     serializer_class = readSerializers.FeatureIDSerializer
+    pagination_class = KeysetPagination
 
     accession_param = openapi.Parameter(
         "accession",
         openapi.IN_QUERY,
-        description="Feature name or accession",
-        required=True,
+        description="Feature name or accession, list all the feature IDs if not set",
+        required=False,
         type=openapi.TYPE_STRING,
     )
     sotype_param = openapi.Parameter(
@@ -510,15 +1015,40 @@ class FeatureIDViewSet(viewsets.GenericViewSet):
             settings.MACHADO_EXAMPLE_AA_ACC, settings.MACHADO_EXAMPLE_ORGANISM_ID
         )
 
+    cursor_param = openapi.Parameter(
+        "cursor",
+        openapi.IN_QUERY,
+        description="pagination cursor, returned as next and previous",
+        required=False,
+        type=openapi.TYPE_STRING,
+    )
+    count_param = openapi.Parameter(
+        "count",
+        openapi.IN_QUERY,
+        description="count the feature IDs (slower)",
+        required=False,
+        type=openapi.TYPE_BOOLEAN,
+    )
+
     @swagger_auto_schema(
-        manual_parameters=[accession_param, sotype_param, organism_id],
+        manual_parameters=[
+            accession_param,
+            sotype_param,
+            organism_id,
+            cursor_param,
+            count_param,
+        ],
         operation_summary=operation_summary,
         operation_description=operation_description,
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, request):
         """List."""
         queryset = self.get_queryset()
+        if self.request.query_params.get("accession") is None:
+            page = self.paginate_queryset(queryset)
+            serializer = readSerializers.FeatureIDSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
         serializer = readSerializers.FeatureIDSerializer(queryset, many=False)
         return Response(serializer.data)
 
@@ -527,6 +1057,13 @@ class FeatureIDViewSet(viewsets.GenericViewSet):
         accession = self.request.query_params.get("accession")
         soterm = self.request.query_params.get("soType")
         organism_id = self.request.query_params.get("organism_id")
+        if accession is None:
+            return Feature.objects.filter(
+                organism_id=organism_id,
+                type__cv__name="sequence",
+                type__name=soterm,
+                is_obsolete=False,
+            ).only("feature_id")
         organism_obj = Organism.objects.get(organism_id=organism_id)
         try:
             feature_id = retrieve_feature_id(accession, soterm, organism_obj)
@@ -534,7 +1071,7 @@ class FeatureIDViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return None
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureIDViewSet, self).dispatch(*args, **kwargs)
@@ -557,7 +1094,7 @@ class FeatureOrthologViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -581,14 +1118,16 @@ class FeatureOrthologViewSet(viewsets.GenericViewSet):
                 type__cv__name="feature_property",
                 feature_id=self.kwargs.get("feature_id"),
             )
-            return Feature.objects.filter(
-                type__name="polypeptide",
-                Featureprop_feature_Feature__value=ortholog_group.value,
+            return prefetch_feature_props(
+                Feature.objects.filter(
+                    type__name="polypeptide",
+                    Featureprop_feature_Feature__value=ortholog_group.value,
+                ).select_related("organism")
             )
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureOrthologViewSet, self).dispatch(*args, **kwargs)
@@ -611,7 +1150,7 @@ class FeatureCoexpressionViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -635,14 +1174,16 @@ class FeatureCoexpressionViewSet(viewsets.GenericViewSet):
                 type__cv__name="feature_property",
                 feature_id=self.kwargs.get("feature_id"),
             )
-            return Feature.objects.filter(
-                type__name="mRNA",
-                Featureprop_feature_Feature__value=coexpression_group.value,
+            return prefetch_feature_props(
+                Feature.objects.filter(
+                    type__name="mRNA",
+                    Featureprop_feature_Feature__value=coexpression_group.value,
+                ).select_related("organism")
             )
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureCoexpressionViewSet, self).dispatch(*args, **kwargs)
@@ -654,6 +1195,7 @@ class FeatureExpressionViewSet(viewsets.GenericViewSet):
     lookup_field = "feature_id"
     lookup_value_regex = r"^\d+$"
     serializer_class = readSerializers.FeatureExpressionSerializer
+    renderer_classes = RENDERER_CLASSES
 
     operation_summary = "Retrieve expression by feature ID"
     operation_description = operation_summary + "<br /><br />"
@@ -665,12 +1207,11 @@ class FeatureExpressionViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
-        queryset = self.get_queryset()
-        serializer = readSerializers.FeatureExpressionSerializer(queryset, many=True)
-        return Response(serializer.data)
+        # the values() rows already have the FeatureExpressionSerializer fields
+        return Response(self.get_queryset() or list())
 
     def get_queryset(self):
         """Get queryset."""
@@ -681,7 +1222,7 @@ class FeatureExpressionViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureExpressionViewSet, self).dispatch(*args, **kwargs)
@@ -704,7 +1245,7 @@ class FeatureInfoViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -718,7 +1259,7 @@ class FeatureInfoViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureInfoViewSet, self).dispatch(*args, **kwargs)
@@ -741,7 +1282,7 @@ class FeatureLocationViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -757,7 +1298,7 @@ class FeatureLocationViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureLocationViewSet, self).dispatch(*args, **kwargs)
@@ -780,7 +1321,7 @@ class FeatureSequenceViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -794,7 +1335,7 @@ class FeatureSequenceViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureSequenceViewSet, self).dispatch(*args, **kwargs)
@@ -817,7 +1358,7 @@ class FeaturePublicationViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -833,7 +1374,7 @@ class FeaturePublicationViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeaturePublicationViewSet, self).dispatch(*args, **kwargs)
@@ -856,7 +1397,7 @@ class FeatureOntologyViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -872,7 +1413,7 @@ class FeatureOntologyViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureOntologyViewSet, self).dispatch(*args, **kwargs)
@@ -895,7 +1436,7 @@ class FeatureProteinMatchesViewSet(viewsets.GenericViewSet):
     @swagger_auto_schema(
         operation_summary=operation_summary, operation_description=operation_description
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
         queryset = self.get_queryset()
@@ -915,7 +1456,7 @@ class FeatureProteinMatchesViewSet(viewsets.GenericViewSet):
         except ObjectDoesNotExist:
             return
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def dispatch(self, *args, **kwargs):
         """Dispatch."""
         return super(FeatureProteinMatchesViewSet, self).dispatch(*args, **kwargs)
@@ -928,90 +1469,447 @@ class FeatureSimilarityViewSet(viewsets.GenericViewSet):
     lookup_value_regex = r"^\d+$"
     serializer_class = readSerializers.FeatureSimilaritySerializer
 
+    # every match_part is located in the query (rank 0) and in the hit (rank 1)
+    SIMILARITY_SQL = (
+        "SELECT a.program, a.programversion, db.name, hit.uniquename, hit.name, "
+        "query_type.name, q.fmin, q.fmax, "
+        "coalesce(af.normscore, af.rawscore) AS score, af.significance, af.identity "
+        "FROM featureloc q "
+        "JOIN analysisfeature af ON af.feature_id = q.feature_id "
+        "JOIN analysis a ON a.analysis_id = af.analysis_id "
+        "JOIN featureloc h ON h.feature_id = q.feature_id "
+        "AND h.featureloc_id <> q.featureloc_id "
+        "AND h.srcfeature_id <> q.srcfeature_id "
+        "JOIN feature hit ON hit.feature_id = h.srcfeature_id "
+        "LEFT JOIN dbxref ON dbxref.dbxref_id = hit.dbxref_id "
+        "LEFT JOIN db ON db.db_id = dbxref.db_id "
+        "JOIN feature query ON query.feature_id = q.srcfeature_id "
+        "JOIN cvterm query_type ON query_type.cvterm_id = query.type_id "
+        "WHERE q.srcfeature_id = %s"
+    )
+    SIMILARITY_ORDER_SQL = (
+        " ORDER BY af.significance ASC NULLS LAST, score DESC NULLS LAST, "
+        "q.feature_id"
+    )
+    SIMILARITY_FIELDS = (
+        "program",
+        "programversion",
+        "db_name",
+        "unique",
+        "name",
+        "sotype",
+        "query_start",
+        "query_end",
+        "score",
+        "evalue",
+        "identity",
+    )
+
+    limit_param = openapi.Parameter(
+        "limit",
+        openapi.IN_QUERY,
+        description="Maximum number of matches, the best ones first",
+        required=False,
+        type=openapi.TYPE_INTEGER,
+    )
+    min_identity_param = openapi.Parameter(
+        "min_identity",
+        openapi.IN_QUERY,
+        description="Minimum identity",
+        required=False,
+        type=openapi.TYPE_NUMBER,
+    )
+    max_evalue_param = openapi.Parameter(
+        "max_evalue",
+        openapi.IN_QUERY,
+        description="Maximum e-value",
+        required=False,
+        type=openapi.TYPE_NUMBER,
+    )
+    program_param = openapi.Parameter(
+        "program",
+        openapi.IN_QUERY,
+        description="Program (eg. diamond, interproscan)",
+        required=False,
+        type=openapi.TYPE_STRING,
+    )
+
     operation_summary = "Retrieve similarity matches by feature ID"
     operation_description = operation_summary + "<br /><br />"
+    operation_description += "The matches are sorted by e-value and score.<br /><br />"
     if hasattr(settings, "MACHADO_EXAMPLE_AA"):
         operation_description += "<b>Example:</b><br />feature_id={}".format(
             settings.MACHADO_EXAMPLE_AA
         )
 
     @swagger_auto_schema(
-        operation_summary=operation_summary, operation_description=operation_description
+        manual_parameters=[
+            limit_param,
+            min_identity_param,
+            max_evalue_param,
+            program_param,
+        ],
+        operation_summary=operation_summary,
+        operation_description=operation_description,
     )
-    @method_decorator(cache_page(CACHE_TIMEOUT))
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
     def list(self, *args, **kwargs):
         """List."""
-        queryset = self.get_queryset()
+        try:
+            queryset = self.get_queryset()
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         serializer = readSerializers.FeatureSimilaritySerializer(queryset, many=True)
         return Response(serializer.data)
 
     def get_queryset(self):
         """Get queryset."""
-        result = list()
-        srcfeature_id = self.kwargs.get("feature_id")
+        params = self.request.query_params
+        sql = self.SIMILARITY_SQL
+        args = [self.kwargs.get("feature_id")]
+        for name, condition, cast in [
+            ("min_identity", " AND af.identity >= %s", float),
+            ("max_evalue", " AND af.significance <= %s", float),
+            ("program", " AND upper(a.program) = upper(%s)", str),
+        ]:
+            if params.get(name) is None:
+                continue
+            try:
+                args.append(cast(params.get(name)))
+            except ValueError:
+                raise ValueError("{} must be a number".format(name))
+            sql += condition
+        sql += self.SIMILARITY_ORDER_SQL
+        if params.get("limit") is not None:
+            try:
+                limit = int(params.get("limit"))
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                raise ValueError("limit must be a positive integer")
+            sql += " LIMIT %s"
+            args.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, args)
+            return [dict(zip(self.SIMILARITY_FIELDS, row)) for row in cursor.fetchall()]
+
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
+    def dispatch(self, *args, **kwargs):
+        """Dispatch."""
+        return super(FeatureSimilarityViewSet, self).dispatch(*args, **kwargs)
+
+
+class FeatureBatchViewSet(viewsets.GenericViewSet):
+    """Retrieve several sections of several features at once."""
+
+    SECTIONS = (
+        "info",
+        "location",
+        "sequence",
+        "ontology",
+        "proteinmatches",
+        "expression",
+        "publication",
+    )
+
+    feature_id_param = openapi.Parameter(
+        "feature_id",
+        openapi.IN_QUERY,
+        description="Comma separated feature IDs (max {})".format(BATCH_MAX_FEATURES),
+        required=True,
+        type=openapi.TYPE_STRING,
+    )
+    sections_param = openapi.Parameter(
+        "sections",
+        openapi.IN_QUERY,
+        description="Comma separated sections: {} (default: all)".format(
+            ", ".join(SECTIONS)
+        ),
+        required=False,
+        type=openapi.TYPE_STRING,
+    )
+
+    @swagger_auto_schema(
+        manual_parameters=[feature_id_param, sections_param],
+        operation_summary="Retrieve several sections of several features",
+        operation_description="Retrieve the info, location, sequence, ontology, "
+        "proteinmatches, expression and publication sections of up to {} features. "
+        "The same parameters can be sent as JSON by POST.".format(BATCH_MAX_FEATURES),
+    )
+    @method_decorator(versioned_cache_page(CACHE_TIMEOUT))
+    def list(self, request):
+        """List."""
+        return self.get_response(request.query_params)
+
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "feature_id": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                ),
+                "sections": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_STRING),
+                ),
+            },
+        ),
+        operation_summary="Retrieve several sections of several features",
+    )
+    def create(self, request):
+        """Create."""
+        return self.get_response(request.data)
+
+    def get_response(self, params):
+        """Stream the sections of the features."""
         try:
-            match_parts_ids = Featureloc.objects.filter(
-                srcfeature_id=srcfeature_id
-            ).values_list("feature_id")
-        except ObjectDoesNotExist:
-            return list()
+            feature_ids, sections = self.parse_params(params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(
+            stream_json(self.stream(feature_ids, sections)),
+            content_type="application/json",
+        )
 
-        for match_part_id in match_parts_ids:
-            analysis_feature = Analysisfeature.objects.get(feature_id=match_part_id)
-            analysis = Analysis.objects.get(analysis_id=analysis_feature.analysis_id)
-            if analysis_feature.normscore is not None:
-                score = analysis_feature.normscore
-            else:
-                score = analysis_feature.rawscore
-
-            # it should have 2 records (query and hit)
-            match_query = Featureloc.objects.filter(
-                feature_id=match_part_id, srcfeature_id=srcfeature_id
-            )[0]
-            match_hit = (
-                Featureloc.objects.filter(feature_id=match_part_id).exclude(
-                    srcfeature_id=srcfeature_id
+    def parse_params(self, params):
+        """Parse the feature IDs and the sections."""
+
+        def split(value):
+            if isinstance(value, str):
+                value = value.split(",")
+            return [str(item).strip() for item in value or [] if str(item).strip()]
+
+        try:
+            feature_ids = list(
+                dict.fromkeys(int(i) for i in split(params.get("feature_id")))
+            )
+        except ValueError:
+            raise ValueError("feature_id must be a list of integers")
+        if not feature_ids:
+            raise ValueError("feature_id is required")
+        if len(feature_ids) > BATCH_MAX_FEATURES:
+            raise ValueError(
+                "At most {} feature IDs per request".format(BATCH_MAX_FEATURES)
+            )
+        sections = split(params.get("sections")) or list(self.SECTIONS)
+        for section in sections:
+            if section not in self.SECTIONS:
+                raise ValueError("Invalid section: {}".format(section))
+        return feature_ids, sections
+
+    def stream(self, feature_ids, sections):
+        """Yield the features, one chunk of features at a time."""
+        chunks = [
+            feature_ids[i:i + BATCH_CHUNK_SIZE]
+            for i in range(0, len(feature_ids), BATCH_CHUNK_SIZE)
+        ]
+        for chunk in chunks:
+            found = set(
+                Feature.objects.filter(feature_id__in=chunk).values_list(
+                    "feature_id", flat=True
                 )
-            )[0]
+            )
+            results = {
+                section: getattr(self, "get_{}".format(section))(found)
+                for section in sections
+            }
+            for feature_id in chunk:
+                if feature_id not in found:
+                    continue
+                item = {"feature_id": feature_id}
+                for section in sections:
+                    item[section] = results[section].get(feature_id)
+                yield item
+
+    def get_displays(self, feature_ids):
+        """Get the display of the features, as in Feature.get_display."""
+        props = retrieve_display_props(feature_ids)
+        return retrieve_feature_displays(feature_ids, props=props), props
+
+    def get_info(self, feature_ids):
+        """Get the info section, as in FeatureInfoSerializer."""
+        if not hasattr(settings, "MACHADO_VALID_TYPES"):
+            raise AttributeError("The setting of MACHADO_VALID_TYPES is required.")
+        displays, props = self.get_displays(feature_ids)
+
+        relatives = dict()
+        for feature_id, relative_id in FeatureRelationship.objects.filter(
+            Q(type__name="part_of") | Q(type__name="translation_of"),
+            type__cv__name="sequence",
+            object_id__in=feature_ids,
+            subject__type__name__in=settings.MACHADO_VALID_TYPES,
+        ).values_list("object_id", "subject_id"):
+            relatives.setdefault(feature_id, list()).append(relative_id)
+        for feature_id, relative_id in FeatureRelationship.objects.filter(
+            Q(type__name="part_of") | Q(type__name="translation_of"),
+            type__cv__name="sequence",
+            subject_id__in=feature_ids,
+            object__type__name__in=settings.MACHADO_VALID_TYPES,
+        ).values_list("subject_id", "object_id"):
+            relatives.setdefault(feature_id, list()).append(relative_id)
+        relative_ids = set(i for ids in relatives.values() for i in ids)
+        relative_displays, _ = self.get_displays(relative_ids)
+        relative_features = Feature.objects.select_related("type").in_bulk(relative_ids)
+
+        dbxrefs = dict()
+        for feature_dbxref in FeatureDbxref.objects.filter(
+            feature_id__in=feature_ids
+        ).select_related("dbxref__db"):
+            dbxref = feature_dbxref.dbxref
+            if dbxref.db.url:
+                value = "<a href='{}://{}{}' target='_blank'>{}:{}</a>".format(
+                    dbxref.db.urlprefix,
+                    dbxref.db.url,
+                    dbxref.accession,
+                    dbxref.db.name,
+                    dbxref.accession,
+                )
+            else:
+                value = "{}:{}".format(dbxref.db.name, dbxref.accession)
+            dbxrefs.setdefault(feature_dbxref.feature_id, list()).append(value)
+
+        result = dict()
+        for feature in Feature.objects.filter(
+            feature_id__in=feature_ids
+        ).select_related("organism"):
+            organism = "{} {}".format(feature.organism.genus, feature.organism.species)
+            if feature.organism.infraspecific_name:
+                organism += " {}".format(feature.organism.infraspecific_name)
+            result[feature.feature_id] = {
+                "uniquename": feature.uniquename,
+                "display": displays.get(feature.feature_id),
+                "product": props.get(feature.feature_id, {}).get("product"),
+                "note": props.get(feature.feature_id, {}).get("note"),
+                "organism": organism,
+                "relationship": [
+                    {
+                        "relative_feature_id": relative_id,
+                        "relative_type": relative_features[relative_id].type.name,
+                        "relative_uniquename": relative_features[
+                            relative_id
+                        ].uniquename,
+                        "relative_display": relative_displays.get(relative_id),
+                    }
+                    for relative_id in relatives.get(feature.feature_id, [])
+                ],
+                "dbxref": dbxrefs.get(feature.feature_id, []),
+            }
+        return result
 
-            result.append(
-                {
-                    "program": analysis.program,
-                    "programversion": analysis.programversion,
-                    "db_name": match_hit.srcfeature.dbxref.db.name,
-                    "unique": match_hit.srcfeature.uniquename,
-                    "name": match_hit.srcfeature.name,
-                    "sotype": match_query.srcfeature.type.name,
-                    "query_start": match_query.fmin,
-                    "query_end": match_query.fmax,
-                    "score": score,
-                    "evalue": analysis_feature.significance,
-                }
+    def get_location(self, feature_ids):
+        """Get the location section, as in Feature.get_location."""
+        return get_feature_locations(feature_ids)
+
+    def get_sequence(self, feature_ids):
+        """Get the sequence section."""
+        return {
+            feature_id: {"sequence": residues}
+            for feature_id, residues in Feature.objects.filter(
+                feature_id__in=feature_ids
+            ).values_list("feature_id", "residues")
+        }
+
+    def get_ontology(self, feature_ids):
+        """Get the ontology section, as in FeatureOntologySerializer."""
+        result = {feature_id: list() for feature_id in feature_ids}
+        for feature_id, *values in FeatureCvterm.objects.filter(
+            feature_id__in=feature_ids
+        ).values_list(
+            "feature_id",
+            "cvterm__name",
+            "cvterm__definition",
+            "cvterm__cv__name",
+            "cvterm__dbxref__db__name",
+            "cvterm__dbxref__accession",
+        ):
+            result[feature_id].append(
+                dict(zip(("cvterm", "cvterm_definition", "cv", "db", "dbxref"), values))
             )
+        return result
 
+    def get_proteinmatches(self, feature_ids):
+        """Get the proteinmatches section, as in FeatureProteinMatchesSerializer."""
+        result = {feature_id: list() for feature_id in feature_ids}
+        for feature_id, *values in FeatureRelationship.objects.filter(
+            object_id__in=feature_ids,
+            subject__type__name="protein_match",
+            subject__type__cv__name="sequence",
+        ).values_list(
+            "object_id",
+            "subject__uniquename",
+            "subject__name",
+            "subject__dbxref__db__name",
+            "subject__dbxref__accession",
+        ):
+            result[feature_id].append(
+                dict(zip(("subject_id", "subject_desc", "db", "dbxref"), values))
+            )
         return result
 
-    @method_decorator(cache_page(CACHE_TIMEOUT))
-    def dispatch(self, *args, **kwargs):
-        """Dispatch."""
-        return super(FeatureSimilarityViewSet, self).dispatch(*args, **kwargs)
+    def get_expression(self, feature_ids):
+        """Get the expression section, as in Feature.get_expression_samples."""
+        result = {feature_id: list() for feature_id in feature_ids}
+        for feature_id, *values in (
+            FeatureExpressionSample.objects.filter(feature_id__in=feature_ids)
+            .order_by("feature_expression_sample_id")
+            .values_list("feature_id", *EXPRESSION_SAMPLE_FIELDS.values())
+        ):
+            result[feature_id].append(dict(zip(EXPRESSION_SAMPLE_FIELDS, values)))
+        return result
+
+    def get_publication(self, feature_ids):
+        """Get the publication section, as in FeaturePublicationSerializer."""
+        feature_pubs = FeaturePub.objects.filter(
+            feature_id__in=feature_ids
+        ).select_related("pub")
+        pub_ids = set(feature_pub.pub_id for feature_pub in feature_pubs)
+        authors = dict()
+        for pub_id, surname, givennames in (
+            Pubauthor.objects.filter(pub_id__in=pub_ids)
+            .order_by("rank")
+            .values_list("pub_id", "surname", "givennames")
+        ):
+            authors.setdefault(pub_id, list()).append(
+                "{} {}".format(surname, givennames or "")
+            )
+        dois = dict(
+            PubDbxref.objects.filter(pub_id__in=pub_ids, dbxref__db__name="DOI")
+            .order_by("-pub_dbxref_id")
+            .values_list("pub_id", "dbxref__accession")
+        )
+        result = {feature_id: list() for feature_id in feature_ids}
+        for feature_pub in feature_pubs:
+            pub = feature_pub.pub
+            result[feature_pub.feature_id].append(
+                {
+                    "doi": dois.get(pub.pub_id),
+                    "authors": ", ".join(authors.get(pub.pub_id, [])),
+                    "title": pub.title,
+                    "series_name": pub.series_name,
+                    "pyear": pub.pyear,
+                    "volume": pub.volume,
+                    "pages": pub.pages,
+                }
+            )
+        return result
 
 
-class HistoryListViewSet(viewsets.ViewSet):
+class HistoryListViewSet(viewsets.GenericViewSet):
     """Retrive all history of insertions."""
 
+    pagination_class = HistoryPagination
+
     def list(self, request):
         """List"""
-        paginate_by = 10
         order_by = request.GET.get("ordering", "-created_at")
-        allowed_ordering_fields = [
-            "created_at",
-            "-created_at",
-            "another_field",
-            "-another_field",
-        ]
-        if order_by not in allowed_ordering_fields:
-            order_by = "-created_at"
+        # history_id follows created_at and is unique
+        allowed_ordering_fields = {
+            "created_at": "history_id",
+            "-created_at": "-history_id",
+        }
+        self.paginator.ordering = allowed_ordering_fields.get(order_by, "-history_id")
 
         search_term = request.GET.get("search", None)
         history_list = History.objects.all()
@@ -1021,16 +1919,6 @@ class HistoryListViewSet(viewsets.ViewSet):
                 | Q(description__icontains=search_term)
             )
 
-        history_list = history_list.order_by(order_by)
-
-        paginator = Paginator(history_list, paginate_by)
-        page_number = request.GET.get("page", 1)
-        page_obj = paginator.get_page(page_number)
-
-        serializer = readSerializers.HistoryListSerializer(page_obj, many=True)
-        response_data = {
-            "total_pages": paginator.num_pages,
-            "current_page": page_obj.number,
-            "results": serializer.data,
-        }
-        return Response(data=response_data, status=status.HTTP_200_OK)
+        page = self.paginate_queryset(history_list)
+        serializer = readSerializers.HistoryListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
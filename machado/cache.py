@@ -0,0 +1,76 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Cache versioned by the last successful load."""
+
+from functools import wraps
+from hashlib import md5
+
+from django.utils.cache import cc_delim_re, get_conditional_response
+from django.utils.cache import patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_page
+
+from machado.models import History
+
+
+def versioned_cache_key(prefix: str, *parts) -> str:
+    """Return a cache key that changes after every successful load."""
+    generation, finished_at = History.get_cache_generation()
+    return ":".join([prefix, str(generation)] + [str(part) for part in parts])
+
+
+def versioned_cache_page(timeout: int):
+    """Cache a view until the next successful load.
+
+    Works like django's cache_page, but the cache generation is part of the
+    key prefix: pages cached before a load are never served after it, so the
+    timeout can be as long as desired. GET and HEAD responses carry an ETag,
+    which also depends on the Accept header and on the request headers
+    listed in their Vary header, and a Last-Modified header. Conditional requests are answered with 304
+    Not Modified.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            generation, finished_at = History.get_cache_generation()
+            cached_view = cache_page(
+                timeout, key_prefix="machado_page:{}".format(generation)
+            )(view_func)
+            if request.method not in ("GET", "HEAD"):
+                return cached_view(request, *args, **kwargs)
+
+            response = cached_view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            # representations of the same URL, eg. negotiated renderers, get
+            # different validators. DRF adds Vary: Accept after the viewset
+            # methods return, so Accept is always taken into account.
+            headers = ["Accept"]
+            if response.has_header("Vary"):
+                for header in cc_delim_re.split(response["Vary"]):
+                    if header.lower() not in [h.lower() for h in headers]:
+                        headers.append(header)
+            vary = [request.headers.get(header, "") for header in headers]
+            etag = quote_etag(
+                md5(
+                    ":".join([str(generation), request.get_full_path()] + vary).encode()
+                ).hexdigest()
+            )
+            last_modified = int(finished_at.timestamp()) if finished_at else None
+            response["ETag"] = etag
+            if last_modified is not None:
+                response["Last-Modified"] = http_date(last_modified)
+            # clients revalidate, the ETag changes after every load
+            patch_cache_control(response, no_cache=True)
+            return get_conditional_response(
+                request, etag=etag, last_modified=last_modified, response=response
+            )
+
+        return _wrapped_view
+
+    return decorator
@@ -5,9 +5,9 @@
 # have been included as part of this package for licensing information.
 
 """Decorators."""
+
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Value, F, Q
+from django.db.models import Prefetch, Value, F, Q
 from django.db.models.functions import Concat
 
 
@@ -34,104 +34,233 @@ def get_feature_dbxrefs(self):
     return result
 
 
+# feature_property types that are not listed by get_properties
+HIDDEN_PROPERTIES = ["coexpression group", "annotation"]
+
+# attribute of the props retrieved by prefetch_feature_props
+PREFETCHED_PROPS_ATTR = "_prefetched_feature_props"
+
+
+def prefetch_feature_props(queryset):
+    """Prefetch the feature_property props of the features of a queryset."""
+    # machado.models imports this module
+    from machado.models import Featureprop
+
+    return queryset.prefetch_related(
+        Prefetch(
+            "Featureprop_feature_Feature",
+            queryset=Featureprop.objects.filter(type__cv__name="feature_property")
+            .select_related("type")
+            .order_by("rank", "featureprop_id"),
+            to_attr=PREFETCHED_PROPS_ATTR,
+        )
+    )
+
+
+# feature_property types used as the display of a feature, by precedence
+DISPLAY_PROPERTIES = ["display", "product", "description", "note"]
+
+
+def select_display(props):
+    """Select the display among the props of a feature, by type name."""
+    for name in DISPLAY_PROPERTIES:
+        if props.get(name) is not None:
+            return props[name]
+    return None
+
+
+def retrieve_display_props(feature_ids):
+    """Retrieve the DISPLAY_PROPERTIES of several features, with one query."""
+    # machado.models imports this module
+    from machado.models import Featureprop
+
+    props = dict()
+    for feature_id, name, value in (
+        Featureprop.objects.filter(
+            feature_id__in=feature_ids,
+            type__cv__name="feature_property",
+            type__name__in=DISPLAY_PROPERTIES,
+        )
+        .order_by("rank", "featureprop_id")
+        .values_list("feature_id", "type__name", "value")
+    ):
+        props.setdefault(feature_id, dict()).setdefault(name, value)
+    return props
+
+
+def retrieve_feature_displays(feature_ids, props=None):
+    """Retrieve the display of several features, as in Feature.get_display."""
+    if props is None:
+        props = retrieve_display_props(feature_ids)
+    displays = dict()
+    for feature_id, values in props.items():
+        display = select_display(values)
+        if display is not None:
+            displays[feature_id] = display
+    return displays
+
+
+def load_feature_props(features):
+    """Memoize the feature_property props of several features, with one query."""
+    # machado.models imports this module
+    from machado.models import Featureprop
+
+    props = {feature.feature_id: dict() for feature in features}
+    for feature_id, featureprop_id, name, value in (
+        Featureprop.objects.filter(
+            feature_id__in=list(props), type__cv__name="feature_property"
+        )
+        .order_by("rank", "featureprop_id")
+        .values_list("feature_id", "featureprop_id", "type__name", "value")
+    ):
+        props[feature_id].setdefault(name, list()).append((featureprop_id, value))
+    for feature in features:
+        feature._feature_props = props[feature.feature_id]
+
+
+def get_feature_props(self):
+    """Get the feature_property props, by type name, with a single query.
+
+    The props are memoized on the instance: a feature retrieved before its
+    props are changed must be retrieved again to see the new values.
+    """
+    try:
+        return self._feature_props
+    except AttributeError:
+        pass
+    if hasattr(self, PREFETCHED_PROPS_ATTR):
+        self._feature_props = dict()
+        for fp in getattr(self, PREFETCHED_PROPS_ATTR):
+            self._feature_props.setdefault(fp.type.name, list()).append(
+                (fp.featureprop_id, fp.value)
+            )
+    else:
+        load_feature_props([self])
+    return self._feature_props
+
+
+def get_feature_prop(self, name):
+    """Get the value of a feature_property prop."""
+    values = self.get_props().get(name)
+    if values:
+        return values[0][1]
+    return None
+
+
 def get_feature_product(self):
     """Get the product feature prop."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__name="product", type__cv__name="feature_property"
-        ).value
-    except ObjectDoesNotExist:
-        return None
+    return self.get_prop("product")
 
 
 def get_feature_description(self):
     """Get the description feature prop."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__name="description", type__cv__name="feature_property"
-        ).value
-    except ObjectDoesNotExist:
-        return None
+    return self.get_prop("description")
 
 
 def get_feature_note(self):
     """Get the note feature prop."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__name="note", type__cv__name="feature_property"
-        ).value
-    except ObjectDoesNotExist:
-        return None
+    return self.get_prop("note")
+
+
+def load_feature_annotation_dois(features):
+    """Memoize the annotations of several features, with one query."""
+    # machado.models imports this module
+    from machado.models import PubDbxref
+
+    annotations = {
+        feature.feature_id: feature.get_props().get("annotation", list())
+        for feature in features
+    }
+    featureprop_ids = [
+        featureprop_id
+        for values in annotations.values()
+        for featureprop_id, value in values
+    ]
+    dois = dict()
+    if featureprop_ids:
+        for featureprop_id, accession in (
+            PubDbxref.objects.filter(
+                pub__FeaturepropPub_pub_Pub__featureprop_id__in=featureprop_ids,
+                dbxref__db__name="DOI",
+            )
+            .order_by("pub_dbxref_id")
+            .values_list(
+                "pub__FeaturepropPub_pub_Pub__featureprop_id", "dbxref__accession"
+            )
+        ):
+            dois.setdefault(featureprop_id, accession)
+    for feature in features:
+        feature._feature_annotation_dois = [
+            (value, dois.get(featureprop_id))
+            for featureprop_id, value in annotations[feature.feature_id]
+        ]
+
+
+def get_feature_annotation_dois(self):
+    """Get the annotation feature props and the DOIs of their pubs."""
+    if not hasattr(self, "_feature_annotation_dois"):
+        load_feature_annotation_dois([self])
+    return self._feature_annotation_dois
 
 
 def get_feature_annotation(self):
     """Get the annotation feature prop."""
-    try:
-        fps = self.Featureprop_feature_Feature.filter(
-            type__name="annotation", type__cv__name="feature_property"
+    annotations = list()
+    for value, doi in self.get_annotation_dois():
+        if doi is not None:
+            annotations.append("{} (DOI:{})".format(value, doi))
+        else:
+            annotations.append(value)
+    return annotations
+
+
+def load_feature_dois(features):
+    """Memoize the DOIs of several features, with one query."""
+    # machado.models imports this module
+    from machado.models import PubDbxref
+
+    pub_dois = dict()
+    feature_pubs = {feature.feature_id: set() for feature in features}
+    for feature_id, pub_id, accession in (
+        PubDbxref.objects.filter(
+            pub__FeaturePub_pub_Pub__feature_id__in=list(feature_pubs),
+            dbxref__db__name="DOI",
         )
-        annotations = list()
-        for fp in fps:
-            try:
-                doi = fp.FeaturepropPub_featureprop_Featureprop.get().pub.get_doi()
-                annotations.append("{} (DOI:{})".format(fp.value, doi))
-            except ObjectDoesNotExist:
-                annotations.append(fp.value)
-        return annotations
-    except ObjectDoesNotExist:
-        return None
+        .order_by("pub_dbxref_id")
+        .values_list(
+            "pub__FeaturePub_pub_Pub__feature_id", "pub_id", "dbxref__accession"
+        )
+    ):
+        pub_dois.setdefault(pub_id, accession)
+        feature_pubs[feature_id].add(pub_id)
+    for feature in features:
+        feature._feature_dois = set(
+            pub_dois[pub_id] for pub_id in feature_pubs[feature.feature_id]
+        )
+        for value, doi in feature.get_annotation_dois():
+            if doi is not None:
+                feature._feature_dois.add(doi)
 
 
 def get_feature_doi(self):
     """Get the DOI feature."""
-    dois = set()
-    pubs = self.FeaturePub_feature_Feature.filter()
-    for featurepub in pubs:
-        dois.add(featurepub.pub.get_doi())
-    try:
-        fps = self.Featureprop_feature_Feature.filter(
-            type__name="annotation", type__cv__name="feature_property"
-        )
-        for fp in fps:
-            try:
-                doi = fp.FeaturepropPub_featureprop_Featureprop.get().pub.get_doi()
-                dois.add(doi)
-            except ObjectDoesNotExist:
-                pass
-        return dois
-    except ObjectDoesNotExist:
-        return None
+    if not hasattr(self, "_feature_dois"):
+        load_feature_dois([self])
+    return set(self._feature_dois)
 
 
 def get_feature_display(self):
     """Get the display feature prop."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__name="display", type__cv__name="feature_property"
-        ).value
-    except ObjectDoesNotExist:
-        if self.get_product() is not None:
-            return self.get_product()
-        elif self.get_description() is not None:
-            return self.get_description()
-        elif self.get_note() is not None:
-            return self.get_note()
-        else:
-            return None
+    return select_display({name: self.get_prop(name) for name in DISPLAY_PROPERTIES})
 
 
 def get_feature_properties(self):
     """Get all the feature properties."""
-    attrs_bl = ["coexpression group", "coexpression group", "annotation"]
-    try:
-        return (
-            self.Featureprop_feature_Feature.filter(type__cv__name="feature_property")
-            .exclude(type__name__in=attrs_bl)
-            .order_by("type__name")
-            .values_list("type__name", "value")
-        )
-    except ObjectDoesNotExist:
-        return list()
+    result = list()
+    for name, values in sorted(self.get_props().items()):
+        if name not in HIDDEN_PROPERTIES:
+            result += [(name, value) for featureprop_id, value in values]
+    return result
 
 
 def get_feature_synonyms(self):
@@ -144,67 +273,47 @@ def get_feature_synonyms(self):
 
 def get_feature_orthologous_group(self):
     """Get the orthologous group id."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__cv__name="feature_property", type__name="orthologous group"
-        ).value
-    except ObjectDoesNotExist:
-        return None
+    return self.get_prop("orthologous group")
 
 
 def get_feature_coexpression_group(self):
     """Get the coexpression group id."""
-    try:
-        return self.Featureprop_feature_Feature.get(
-            type__cv__name="feature_property", type__name="coexpression group"
-        ).value
-    except ObjectDoesNotExist:
-        return None
+    return self.get_prop("coexpression group")
+
+
+# expression sample fields and FeatureExpressionSample columns
+EXPRESSION_SAMPLE_FIELDS = {
+    "analysis__sourcename": "analysis_sourcename",
+    "normscore": "normscore",
+    "assay_name": "assay_name",
+    "assay_description": "assay_description",
+    "biomaterial_name": "biomaterial_name",
+    "biomaterial_description": "biomaterial_description",
+    "treatment_name": "treatment_name",
+}
+
+
+def load_feature_expression_samples(features):
+    """Memoize the expression samples of several features, with one query."""
+    # machado.models imports this module
+    from machado.models import FeatureExpressionSample
+
+    samples = {feature.feature_id: list() for feature in features}
+    for feature_id, *values in (
+        FeatureExpressionSample.objects.filter(feature_id__in=list(samples))
+        .order_by("feature_expression_sample_id")
+        .values_list("feature_id", *EXPRESSION_SAMPLE_FIELDS.values())
+    ):
+        samples[feature_id].append(dict(zip(EXPRESSION_SAMPLE_FIELDS, values)))
+    for feature in features:
+        feature._feature_expression_samples = samples[feature.feature_id]
 
 
 def get_feature_expression_samples(self):
     """Get the expression samples and treatments."""
-    try:
-        return list(
-            self.Analysisfeature_feature_Feature.annotate(
-                assay_name=F(
-                    "analysis__Quantification_analysis_Analysis__acquisition__assay__name"
-                )
-            )
-            .annotate(
-                assay_description=F(
-                    "analysis__Quantification_analysis_Analysis__acquisition__assay__description"
-                )
-            )
-            .annotate(
-                biomaterial_name=F(
-                    "analysis__Quantification_analysis_Analysis__acquisition__assay__AssayBiomaterial_assay_Assay__biomaterial__name"
-                )
-            )
-            .annotate(
-                biomaterial_description=F(
-                    "analysis__Quantification_analysis_Analysis__acquisition__assay__AssayBiomaterial_assay_Assay__biomaterial__description"
-                )
-            )
-            .annotate(
-                treatment_name=F(
-                    "analysis__Quantification_analysis_Analysis__acquisition__assay__AssayBiomaterial_assay_Assay__biomaterial__Treatment_biomaterial_Biomaterial__name"
-                )
-            )
-            .filter(normscore__gt=0)
-            .exclude(assay_name__isnull=True)
-            .values(
-                "analysis__sourcename",
-                "normscore",
-                "assay_name",
-                "assay_description",
-                "biomaterial_name",
-                "biomaterial_description",
-                "treatment_name",
-            )
-        )
-    except ObjectDoesNotExist:
-        return None
+    if not hasattr(self, "_feature_expression_samples"):
+        load_feature_expression_samples([self])
+    return self._feature_expression_samples
 
 
 def get_feature_relationship(self):
@@ -243,51 +352,95 @@ def get_feature_cvterm(self):
     )
 
 
+def get_jbrowse_url_template():
+    """Get the JBrowse URL template of the locations, from the settings."""
+    if not hasattr(settings, "MACHADO_JBROWSE_URL"):
+        return None
+    if hasattr(settings, "MACHADO_JBROWSE_TRACKS"):
+        tracks = settings.MACHADO_JBROWSE_TRACKS
+    else:
+        tracks = "ref_seq,gene,transcripts,CDS"
+    return (
+        settings.MACHADO_JBROWSE_URL
+        + "/?data=data/{organism}&loc={ref}:{start}..{end}"
+        + "&tracklist=0&nav=0&overview=0&tracks="
+        + tracks
+    )
+
+
+def get_jbrowse_offset():
+    """Get the number of bases shown around the locations, from the settings."""
+    if hasattr(settings, "MACHADO_JBROWSE_OFFSET"):
+        return settings.MACHADO_JBROWSE_OFFSET
+    return 1000
+
+
+def get_feature_locations(feature_ids):
+    """Get the locations of several features, as in Feature.get_location."""
+    # machado.models imports this module
+    from machado.models import Featureloc
+
+    result = {feature_id: list() for feature_id in feature_ids}
+    url_template = get_jbrowse_url_template()
+    if url_template is None:
+        return result
+    offset = get_jbrowse_offset()
+    organisms = dict()
+    for (
+        feature_id,
+        fmin,
+        fmax,
+        strand,
+        ref,
+        organism_id,
+        genus,
+        species,
+        infraspecific_name,
+    ) in (
+        Featureloc.objects.filter(feature_id__in=feature_ids, srcfeature__isnull=False)
+        .order_by("feature_id", "locgroup", "rank")
+        .values_list(
+            "feature_id",
+            "fmin",
+            "fmax",
+            "strand",
+            "srcfeature__uniquename",
+            "srcfeature__organism_id",
+            "srcfeature__organism__genus",
+            "srcfeature__organism__species",
+            "srcfeature__organism__infraspecific_name",
+        )
+    ):
+        if organism_id not in organisms:
+            organism = "{} {}".format(genus, species)
+            if infraspecific_name is not None:
+                organism += " {}".format(infraspecific_name)
+            organisms[organism_id] = organism
+        result[feature_id].append(
+            {
+                "start": fmin,
+                "end": fmax,
+                "strand": strand,
+                "ref": ref,
+                "jbrowse_url": url_template.format(
+                    organism=organisms[organism_id],
+                    ref=ref,
+                    start=fmin - offset,
+                    end=fmax + offset,
+                ),
+            }
+        )
+    return result
+
+
 def get_feature_location(self):
     """Get the feature location."""
-    result = list()
-    for location in self.Featureloc_feature_Feature.all():
-        jbrowse_url = None
-        if hasattr(settings, "MACHADO_JBROWSE_URL"):
-            if hasattr(settings, "MACHADO_JBROWSE_TRACKS"):
-                tracks = settings.MACHADO_JBROWSE_TRACKS
-            else:
-                tracks = "ref_seq,gene,transcripts,CDS"
-            if hasattr(settings, "MACHADO_JBROWSE_OFFSET"):
-                offset = settings.MACHADO_JBROWSE_OFFSET
-            else:
-                offset = 1000
-            if location.srcfeature is not None:
-                loc = "{}:{}..{}".format(
-                    location.srcfeature.uniquename,
-                    location.fmin - offset,
-                    location.fmax + offset,
-                )
-                organism = "{} {}".format(
-                    location.srcfeature.organism.genus,
-                    location.srcfeature.organism.species,
-                )
-                if location.srcfeature.organism.infraspecific_name is not None:
-                    organism += " {}".format(
-                        location.srcfeature.organism.infraspecific_name
-                    )
-                jbrowse_url = (
-                    "{}/?data=data/{}&loc={}"
-                    "&tracklist=0&nav=0&overview=0"
-                    "&tracks={}".format(
-                        settings.MACHADO_JBROWSE_URL, organism, loc, tracks
-                    )
-                )
-                result.append(
-                    {
-                        "start": location.fmin,
-                        "end": location.fmax,
-                        "strand": location.strand,
-                        "ref": location.srcfeature.uniquename,
-                        "jbrowse_url": jbrowse_url,
-                    }
-                )
-    return result
+    try:
+        return self._feature_locations
+    except AttributeError:
+        pass
+    self._feature_locations = get_feature_locations([self.feature_id])[self.feature_id]
+    return self._feature_locations
 
 
 def machado_feature_methods():
@@ -295,10 +448,13 @@ def machado_feature_methods():
 
     def wrapper(cls):
         setattr(cls, "get_dbxrefs", get_feature_dbxrefs)
+        setattr(cls, "get_props", get_feature_props)
+        setattr(cls, "get_prop", get_feature_prop)
         setattr(cls, "get_display", get_feature_display)
         setattr(cls, "get_product", get_feature_product)
         setattr(cls, "get_description", get_feature_description)
         setattr(cls, "get_note", get_feature_note)
+        setattr(cls, "get_annotation_dois", get_feature_annotation_dois)
         setattr(cls, "get_annotation", get_feature_annotation)
         setattr(cls, "get_doi", get_feature_doi)
         setattr(cls, "get_orthologous_group", get_feature_orthologous_group)
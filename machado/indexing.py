@@ -0,0 +1,709 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Search index preparation."""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Max, Q, QuerySet
+from django.db.models.query import ModelIterable
+from haystack import connections
+
+from machado.cache import versioned_cache_key
+from machado.decorators import load_feature_annotation_dois, load_feature_dois
+from machado.decorators import load_feature_expression_samples, load_feature_props
+from machado.loaders.common import overlaps_featureloc
+from machado.models import Analysis, Feature, FeatureCvterm, FeatureDbxref
+from machado.models import FeatureExpressionSample, Featureloc, Featureprop
+from machado.models import FeatureRelationship, History, IndexUpdate
+
+try:
+    INDEX_CHUNK_SIZE = settings.MACHADO_INDEX_CHUNK_SIZE
+except AttributeError:
+    INDEX_CHUNK_SIZE = 1000
+
+OVERLAPPING_FEATURES = ["SNV", "QTL", "copy_number_variation"]
+
+# programs of the similarity analyses faceted in the search
+SIMILARITY_PROGRAMS = ["interproscan", "diamond", "blast"]
+
+# tables whose new rows change the search documents of the features they refer
+# to, and their primary keys
+INDEX_UPDATE_TABLES = {
+    "feature": "feature_id",
+    "featureprop": "featureprop_id",
+    "feature_dbxref": "feature_dbxref_id",
+    "feature_cvterm": "feature_cvterm_id",
+    "feature_pub": "feature_pub_id",
+    "feature_relationship": "feature_relationship_id",
+    "featureloc": "featureloc_id",
+    "analysisfeature": "analysisfeature_id",
+}
+
+# the features referred to by the rows created since the snapshot, the
+# features overlapping the new variants and the members of the orthologous
+# groups whose members or coexpression changed, as runs of consecutive IDs
+INDEX_UPDATE_SQL = (
+    "WITH changed AS ("
+    "SELECT feature_id FROM feature WHERE feature_id > %(feature)s "
+    "UNION SELECT feature_id FROM featureprop "
+    "WHERE featureprop_id > %(featureprop)s "
+    "UNION SELECT feature_id FROM feature_dbxref "
+    "WHERE feature_dbxref_id > %(feature_dbxref)s "
+    "UNION SELECT feature_id FROM feature_cvterm "
+    "WHERE feature_cvterm_id > %(feature_cvterm)s "
+    "UNION SELECT feature_id FROM feature_pub "
+    "WHERE feature_pub_id > %(feature_pub)s "
+    "UNION SELECT subject_id FROM feature_relationship "
+    "WHERE feature_relationship_id > %(feature_relationship)s "
+    "UNION SELECT object_id FROM feature_relationship "
+    "WHERE feature_relationship_id > %(feature_relationship)s "
+    "UNION SELECT feature_id FROM featureloc "
+    "WHERE featureloc_id > %(featureloc)s "
+    "UNION SELECT srcfeature_id FROM featureloc "
+    "WHERE featureloc_id > %(featureloc)s AND srcfeature_id IS NOT NULL "
+    "UNION SELECT feature_id FROM analysisfeature "
+    "WHERE analysisfeature_id > %(analysisfeature)s "
+    "UNION SELECT unnest(%(feature_ids)s::bigint[])), "
+    "variants AS MATERIALIZED ("
+    "SELECT b.srcfeature_id, b.fmin, b.fmax FROM featureloc b "
+    "JOIN feature v ON v.feature_id = b.feature_id "
+    "JOIN cvterm t ON t.cvterm_id = v.type_id "
+    "WHERE b.featureloc_id > %(featureloc)s AND t.name = ANY(%(overlapping)s)), "
+    "overlapping AS ("
+    "SELECT a.feature_id FROM variants JOIN featureloc a "
+    "ON boxquery(variants.srcfeature_id, variants.fmin, variants.fmax) "
+    "&& boxrange(a.srcfeature_id, a.fmin, a.fmax)), "
+    "groups AS ("
+    "SELECT p.value FROM featureprop p JOIN cvterm t ON t.cvterm_id = p.type_id "
+    "WHERE p.featureprop_id > %(featureprop)s AND t.name = 'orthologous group' "
+    "UNION SELECT g.value FROM featureprop p "
+    "JOIN cvterm t ON t.cvterm_id = p.type_id "
+    "JOIN feature_relationship r ON r.subject_id = p.feature_id "
+    "JOIN cvterm rt ON rt.cvterm_id = r.type_id "
+    "JOIN featureprop g ON g.feature_id = r.object_id "
+    "JOIN cvterm gt ON gt.cvterm_id = g.type_id "
+    "WHERE p.featureprop_id > %(featureprop)s AND t.name = 'coexpression group' "
+    "AND rt.name = 'translation_of' AND gt.name = 'orthologous group'), "
+    "members AS ("
+    "SELECT m.feature_id FROM featureprop m "
+    "JOIN cvterm t ON t.cvterm_id = m.type_id "
+    "WHERE t.name = 'orthologous group' AND m.value IN (SELECT value FROM groups)), "
+    "affected AS ("
+    "SELECT feature_id FROM changed UNION SELECT feature_id FROM overlapping "
+    "UNION SELECT feature_id FROM members) "
+    "INSERT INTO index_update (history_id, min_id, max_id) "
+    "SELECT %(history)s, min(feature_id), max(feature_id) FROM ("
+    "SELECT feature_id, feature_id - row_number() OVER (ORDER BY feature_id) AS run "
+    "FROM affected) AS runs GROUP BY run"
+)
+
+# the features returned by a query (formatted in) as runs of consecutive IDs,
+# see IndexUpdateRecorder.add_selected
+INDEX_UPDATE_SELECT_SQL = (
+    "INSERT INTO index_update (history_id, min_id, max_id) "
+    "SELECT %s, min(feature_id), max(feature_id) FROM ("
+    "SELECT feature_id, feature_id - row_number() OVER (ORDER BY feature_id) AS run "
+    "FROM (SELECT DISTINCT feature_id FROM ({}) AS selected(feature_id) "
+    "WHERE feature_id IS NOT NULL) AS affected) AS runs GROUP BY run"
+)
+
+# the features about to be removed, returned by a query (formatted in), the
+# features that refer to, or are referred to by, them, the features
+# overlapping them and the members of their orthologous groups
+REMOVED_INDEX_UPDATE_SQL = (
+    "WITH removed(feature_id) AS MATERIALIZED ({}) "
+    "SELECT feature_id FROM removed "
+    "UNION SELECT r.object_id FROM feature_relationship r "
+    "JOIN removed ON removed.feature_id = r.subject_id "
+    "UNION SELECT r.subject_id FROM feature_relationship r "
+    "JOIN removed ON removed.feature_id = r.object_id "
+    "UNION SELECT l.feature_id FROM featureloc l "
+    "JOIN removed ON removed.feature_id = l.srcfeature_id "
+    "UNION SELECT l.srcfeature_id FROM featureloc l "
+    "JOIN removed ON removed.feature_id = l.feature_id "
+    "WHERE l.srcfeature_id IS NOT NULL "
+    "UNION SELECT a.feature_id FROM removed "
+    "JOIN feature v ON v.feature_id = removed.feature_id "
+    "JOIN cvterm t ON t.cvterm_id = v.type_id "
+    "JOIN featureloc b ON b.feature_id = v.feature_id "
+    "JOIN featureloc a ON boxquery(b.srcfeature_id, b.fmin, b.fmax) "
+    "&& boxrange(a.srcfeature_id, a.fmin, a.fmax) "
+    "WHERE t.name = ANY(%s) "
+    "UNION SELECT m.feature_id FROM featureprop p "
+    "JOIN removed ON removed.feature_id = p.feature_id "
+    "JOIN cvterm t ON t.cvterm_id = p.type_id "
+    "JOIN featureprop m ON m.type_id = p.type_id AND m.value = p.value "
+    "WHERE t.name = 'orthologous group'"
+)
+
+
+def get_search_schema() -> Dict:
+    """Get the data that shapes the search documents and facets.
+
+    Whether there are orthologous groups, coexpression groups and features
+    of OVERLAPPING_FEATURES types, and the similarity programs. It is
+    retrieved when first needed, instead of when the search index is
+    imported, and cached until the next successful load.
+    """
+    key = versioned_cache_key("machado_search_schema")
+    schema = cache.get(key)
+    if schema is None:
+        schema = {
+            "orthology": Featureprop.objects.filter(
+                type__name="orthologous group", type__cv__name="feature_property"
+            ).exists(),
+            "coexpression": Featureprop.objects.filter(
+                type__name="coexpression group", type__cv__name="feature_property"
+            ).exists(),
+            "overlapping_features": Feature.objects.filter(
+                type__name__in=OVERLAPPING_FEATURES
+            ).exists(),
+            "programs": list(
+                Analysis.objects.filter(program__in=SIMILARITY_PROGRAMS)
+                .order_by("program")
+                .distinct("program")
+                .values_list("program", flat=True)
+            ),
+        }
+        cache.set(key, schema, None)
+    return schema
+
+
+def overlapping_pairs(
+    query_fmin: np.ndarray,
+    query_fmax: np.ndarray,
+    fmin: np.ndarray,
+    fmax: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Return the indexes of the query and target intervals that overlap.
+
+    The intervals are closed, as in overlaps_featureloc. The
+    targets are grouped by the bit length of their lengths and each group is
+    sorted by fmin, so the candidates of every query are found by binary
+    search and a long QTL doesn't widen the search of the short SNVs.
+    """
+    query_index = [np.empty(0, dtype=np.int64)]
+    target_index = [np.empty(0, dtype=np.int64)]
+    lengths = fmax - fmin
+    length_classes = np.frexp(lengths + 1)[1]
+    for length_class in np.unique(length_classes):
+        members = np.flatnonzero(length_classes == length_class)
+        members = members[np.argsort(fmin[members], kind="stable")]
+        starts = fmin[members]
+        first = np.searchsorted(starts, query_fmin - lengths[members].max(), "left")
+        last = np.searchsorted(starts, query_fmax, "right")
+        counts = last - first
+        total = counts.sum()
+        if not total:
+            continue
+        queries = np.repeat(np.arange(len(query_fmin)), counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        targets = members[np.repeat(first, counts) + offsets]
+        hits = fmax[targets] >= query_fmin[queries]
+        query_index.append(queries[hits])
+        target_index.append(targets[hits])
+    queries = np.concatenate(query_index)
+    targets = np.concatenate(target_index)
+    order = np.lexsort((targets, queries))
+    return queries[order], targets[order]
+
+
+def get_overlapping_features(
+    features: List[Feature], schema: Dict = None
+) -> Dict[int, List[int]]:
+    """Get the IDs of the features of OVERLAPPING_FEATURES types overlapping each feature.
+
+    The candidates are retrieved by a single query, restricted to the window
+    between the lowest fmin and the highest fmax of the features on each
+    reference sequence, so its cost depends on the chunk of features instead
+    of the size of the reference sequences. schema is the search schema, it's
+    retrieved if not set.
+    """
+    overlapping: Dict[int, List[int]] = {
+        feature.feature_id: list() for feature in features
+    }
+    if schema is None:
+        schema = get_search_schema()
+    if not features or not schema["overlapping_features"]:
+        return overlapping
+    locations: Dict[int, List] = dict()
+    for srcfeature_id, *location in (
+        Featureloc.objects.filter(
+            feature_id__in=list(overlapping),
+            srcfeature_id__isnull=False,
+            fmin__isnull=False,
+            fmax__isnull=False,
+        )
+        .order_by("featureloc_id")
+        .values_list("srcfeature_id", "fmin", "fmax", "feature_id")
+    ):
+        locations.setdefault(srcfeature_id, list()).append(location)
+    if not locations:
+        return overlapping
+
+    windows = Q()
+    for srcfeature_id, values in locations.items():
+        windows |= Q(
+            overlaps_featureloc(
+                srcfeature_id, min(i[0] for i in values), max(i[1] for i in values)
+            )
+        )
+    targets: Dict[int, List] = dict()
+    for srcfeature_id, *location in (
+        Featureloc.objects.filter(
+            windows,
+            fmin__isnull=False,
+            fmax__isnull=False,
+            feature__type__name__in=OVERLAPPING_FEATURES,
+        )
+        .order_by("featureloc_id")
+        .values_list("srcfeature_id", "fmin", "fmax", "feature_id", "feature__type_id")
+    ):
+        targets.setdefault(srcfeature_id, list()).append(location)
+
+    types = {feature.feature_id: feature.type_id for feature in features}
+    for srcfeature_id, values in locations.items():
+        if srcfeature_id not in targets:
+            continue
+        queries = np.array(values, dtype=np.int64)
+        target_array = np.array(targets[srcfeature_id], dtype=np.int64)
+        query_index, target_index = overlapping_pairs(
+            queries[:, 0], queries[:, 1], target_array[:, 0], target_array[:, 1]
+        )
+        for feature_id, overlapping_id, type_id in zip(
+            queries[query_index, 2].tolist(),
+            target_array[target_index, 2].tolist(),
+            target_array[target_index, 3].tolist(),
+        ):
+            if type_id != types[feature_id]:
+                overlapping[feature_id].append(overlapping_id)
+    return {
+        feature_id: list(dict.fromkeys(ids)) for feature_id, ids in overlapping.items()
+    }
+
+
+def load_orthologous_groups(groups: Dict[str, Dict], names: Set[str]) -> None:
+    """Load the data of several orthologous groups into groups.
+
+    The members are retrieved once per group, for all the groups, and the
+    data is shared by the proteins of each group: the IDs of the mRNAs they
+    are translated from and whether any of these mRNAs has a coexpression
+    group.
+    """
+    names = names - set(groups)
+    if not names:
+        return
+    proteins: Dict[int, List[str]] = dict()
+    for name, feature_id in Featureprop.objects.filter(
+        type__cv__name="feature_property",
+        type__name="orthologous group",
+        value__in=names,
+    ).values_list("value", "feature_id"):
+        proteins.setdefault(feature_id, list()).append(name)
+
+    mrnas: Dict[str, List[int]] = {name: list() for name in names}
+    for protein_id, mrna_id in (
+        FeatureRelationship.objects.filter(
+            type__name="translation_of", object_id__in=list(proteins)
+        )
+        .order_by("feature_relationship_id")
+        .values_list("object_id", "subject_id")
+    ):
+        for name in proteins[protein_id]:
+            mrnas[name].append(mrna_id)
+
+    coexpression = set(
+        Featureprop.objects.filter(
+            type__cv__name="feature_property",
+            type__name="coexpression group",
+            feature_id__in={i for ids in mrnas.values() for i in ids},
+        ).values_list("feature_id", flat=True)
+    )
+    for name, ids in mrnas.items():
+        groups[name] = {
+            "mrnas": ids,
+            "coexpression": any(i in coexpression for i in ids),
+        }
+
+
+def get_orthologs_biomaterials(group: Dict) -> List[str]:
+    """Get the biomaterials of the expression samples of an orthologous group.
+
+    They are retrieved the first time they are requested for the group.
+    """
+    if "biomaterials" not in group:
+        samples: Dict[int, List[str]] = {i: list() for i in group["mrnas"]}
+        for feature_id, biomaterial in (
+            FeatureExpressionSample.objects.filter(feature_id__in=list(samples))
+            .order_by("feature_expression_sample_id")
+            .values_list("feature_id", "biomaterial_description")
+        ):
+            samples[feature_id].append(biomaterial)
+        group["biomaterials"] = list(
+            dict.fromkeys(i for mrna_id in group["mrnas"] for i in samples[mrna_id])
+        )
+    return group["biomaterials"]
+
+
+def load_index_data(
+    features: List[Feature], orthologous_groups: Dict[str, Dict] = None
+) -> None:
+    """Load the data of the search documents of several features.
+
+    Every related dataset is retrieved by a single query for all the features.
+    The feature props, annotations, DOIs and expression samples are memoized
+    by the Feature methods; the remaining data is kept on each feature, along
+    with the search schema, retrieved once for all the features. The
+    orthologous groups can be kept across calls.
+    """
+    if not features:
+        return
+    if not hasattr(settings, "MACHADO_VALID_TYPES"):
+        raise AttributeError("The setting of MACHADO_VALID_TYPES is required.")
+    schema = get_search_schema()
+    data: Dict[int, Dict] = {
+        feature.feature_id: {
+            "schema": schema,
+            "dbxrefs": list(),
+            "cvterms": list(),
+            "protein_matches": list(),
+            "programs": set(),
+            "relationships": list(),
+            "overlapping": list(),
+            "orthologous_group": None,
+        }
+        for feature in features
+    }
+    feature_ids = list(data)
+
+    load_feature_props([f for f in features if not hasattr(f, "_feature_props")])
+    load_feature_annotation_dois(features)
+    load_feature_dois(features)
+    load_feature_expression_samples(features)
+
+    for feature_id, accession in FeatureDbxref.objects.filter(
+        feature_id__in=feature_ids
+    ).values_list("feature_id", "dbxref__accession"):
+        data[feature_id]["dbxrefs"].append(accession)
+
+    for feature_id, *values in FeatureCvterm.objects.filter(
+        feature_id__in=feature_ids
+    ).values_list(
+        "feature_id",
+        "cvterm__dbxref__db__name",
+        "cvterm__dbxref__accession",
+        "cvterm__name",
+    ):
+        data[feature_id]["cvterms"].append(values)
+
+    for feature_id, *values in FeatureRelationship.objects.filter(
+        object_id__in=feature_ids,
+        subject__type__name="protein_match",
+        subject__type__cv__name="sequence",
+    ).values_list("object_id", "subject__uniquename", "subject__name"):
+        data[feature_id]["protein_matches"].append(values)
+
+    # similarity analyses
+    organisms = {feature.feature_id: feature.organism_id for feature in features}
+    for srcfeature_id, organism_id, program in (
+        Featureloc.objects.filter(
+            srcfeature_id__in=feature_ids,
+            feature__type__name="match_part",
+            feature__type__cv__name="sequence",
+        )
+        .values_list(
+            "srcfeature_id",
+            "feature__organism_id",
+            "feature__Analysisfeature_feature_Feature__analysis__program",
+        )
+        .distinct()
+    ):
+        if organism_id == organisms[srcfeature_id] and program is not None:
+            data[srcfeature_id]["programs"].add(program)
+
+    # as in Feature.get_relationship
+    relationship_types = Q(type__name="part_of") | Q(type__name="translation_of")
+    for feature_id, relative_id, relative_type in (
+        FeatureRelationship.objects.filter(
+            relationship_types,
+            type__cv__name="sequence",
+            object_id__in=feature_ids,
+            subject__type__name__in=settings.MACHADO_VALID_TYPES,
+        )
+        .order_by("feature_relationship_id")
+        .values_list("object_id", "subject_id", "subject__type__name")
+    ):
+        data[feature_id]["relationships"].append((relative_id, relative_type))
+    for feature_id, relative_id, relative_type in (
+        FeatureRelationship.objects.filter(
+            relationship_types,
+            type__cv__name="sequence",
+            subject_id__in=feature_ids,
+            object__type__name__in=settings.MACHADO_VALID_TYPES,
+        )
+        .order_by("feature_relationship_id")
+        .values_list("subject_id", "object_id", "object__type__name")
+    ):
+        data[feature_id]["relationships"].append((relative_id, relative_type))
+
+    overlapping = get_overlapping_features(features, schema)
+    names = {
+        feature_id: (uniquename, name)
+        for feature_id, uniquename, name in Feature.objects.filter(
+            feature_id__in={i for ids in overlapping.values() for i in ids}
+        ).values_list("feature_id", "uniquename", "name")
+    }
+    for feature_id, ids in overlapping.items():
+        data[feature_id]["overlapping"] = [names[i] for i in ids]
+
+    if orthologous_groups is None:
+        orthologous_groups = dict()
+    group_names = {feature.get_orthologous_group() for feature in features}
+    group_names.discard(None)
+    load_orthologous_groups(orthologous_groups, group_names)
+
+    for feature in features:
+        data[feature.feature_id]["orthologous_group"] = orthologous_groups.get(
+            feature.get_orthologous_group()
+        )
+        feature._index_data = data[feature.feature_id]
+
+
+def get_index_data(feature: Feature) -> Dict:
+    """Get the data of the search document of a feature."""
+    if not hasattr(feature, "_index_data"):
+        load_index_data([feature])
+    return feature._index_data
+
+
+class IndexUpdateRecorder(object):
+    """Record the features whose search documents are changed by a command.
+
+    The highest primary keys of INDEX_UPDATE_TABLES are kept when the
+    command starts; when it finishes successfully, the features referred to
+    by the rows created since then, and the features affected by them, are
+    stored as IndexUpdate ID ranges. Changes that create no rows are recorded
+    with add, like flagging features as obsolete, or stored right away with
+    add_selected, add_queryset and add_removed, like removing rows. See
+    start_index_update.
+    """
+
+    def __init__(self, history: History) -> None:
+        """Keep the highest primary keys."""
+        self.history = history
+        self.feature_ids: Set[int] = set()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT "
+                + ", ".join(
+                    "(SELECT coalesce(max({}), 0) FROM {})".format(pk, table)
+                    for table, pk in INDEX_UPDATE_TABLES.items()
+                )
+            )
+            self.snapshot = dict(zip(INDEX_UPDATE_TABLES, cursor.fetchone()))
+
+    def add(self, feature_id: int) -> None:
+        """Record a changed feature."""
+        self.feature_ids.add(feature_id)
+
+    def add_selected(self, select_sql: str, params: List = None) -> None:
+        """Store the features returned by select_sql, without retrieving them."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                INDEX_UPDATE_SELECT_SQL.format(select_sql),
+                [self.history.history_id] + list(params or []),
+            )
+
+    def add_queryset(self, queryset: QuerySet) -> None:
+        """Store the features of a values_list("feature_id") queryset."""
+        self.add_selected(*queryset.query.sql_with_params())
+
+    def add_removed(self, select_sql: str, params: List = None) -> None:
+        """Store the features about to be removed and the features they affect.
+
+        The features are returned by select_sql. It must be called before
+        the features, or the related rows whose removal changes their
+        documents, are removed.
+        """
+        self.add_selected(
+            REMOVED_INDEX_UPDATE_SQL.format(select_sql),
+            list(params or []) + [OVERLAPPING_FEATURES],
+        )
+
+    def record(self) -> None:
+        """Store the features changed since the snapshot."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                INDEX_UPDATE_SQL,
+                dict(
+                    self.snapshot,
+                    feature_ids=sorted(self.feature_ids),
+                    overlapping=OVERLAPPING_FEATURES,
+                    history=self.history.history_id,
+                ),
+            )
+
+
+def start_index_update(history: History) -> Optional[IndexUpdateRecorder]:
+    """Start recording the features changed by a command, if enabled.
+
+    The recording is enabled by MACHADO_INDEX_UPDATE in the settings. It
+    adds work to the commands and the index_update table is only emptied by
+    update_search_index. Return history.index_update.
+    """
+    try:
+        enabled = settings.MACHADO_INDEX_UPDATE
+    except AttributeError:
+        enabled = False
+    if enabled:
+        history.index_update = IndexUpdateRecorder(history)
+    return history.index_update
+
+
+def get_index_updates() -> Tuple[List[int], int]:
+    """Get the IDs of the features changed since the last index update.
+
+    Return the IDs and the highest IndexUpdate ID, to be passed to
+    clear_index_updates once they are indexed.
+    """
+    last_id = IndexUpdate.objects.aggregate(Max("index_update_id")).get(
+        "index_update_id__max"
+    )
+    feature_ids: Set[int] = set()
+    for min_id, max_id in IndexUpdate.objects.filter(
+        index_update_id__lte=last_id or 0
+    ).values_list("min_id", "max_id"):
+        feature_ids.update(range(min_id, max_id + 1))
+    return sorted(feature_ids), last_id or 0
+
+
+def clear_index_updates(last_id: int) -> int:
+    """Remove the index updates up to last_id."""
+    return IndexUpdate.objects.filter(index_update_id__lte=last_id).delete()[0]
+
+
+def update_search_documents(
+    feature_ids: List[int],
+    using: str = "default",
+    commit: bool = True,
+    queryset: QuerySet = None,
+) -> Tuple[int, int]:
+    """Update the search documents of the features.
+
+    The documents of the features that were removed or flagged as obsolete
+    are removed. queryset is the index queryset, it can be shared by several
+    calls to share the orthologous groups loaded by prepare_in_chunks.
+    Return the number of documents updated and removed.
+    """
+    backend = connections[using].get_backend()
+    index = connections[using].get_unified_index().get_index(Feature)
+    if queryset is None:
+        queryset = index.index_queryset(using=using)
+    features = list(queryset.filter(feature_id__in=feature_ids))
+    if features:
+        backend.update(index, features, commit=commit)
+
+    existing = Feature.objects.filter(feature_id__in=feature_ids)
+    removed = set(feature_ids) - set(existing.values_list("feature_id", flat=True))
+    removed.update(
+        existing.filter(
+            type__name__in=settings.MACHADO_VALID_TYPES,
+            type__cv__name="sequence",
+            is_obsolete=True,
+        ).values_list("feature_id", flat=True)
+    )
+    for feature_id in sorted(removed):
+        backend.remove(
+            "{}.{}.{}".format(
+                Feature._meta.app_label, Feature._meta.model_name, feature_id
+            )
+        )
+    return len(features), len(removed)
+
+
+def get_index_partitions(queryset: QuerySet, partitions: int) -> List[List[int]]:
+    """Split the IDs of the features of queryset in partitions of similar size."""
+    feature_ids = np.array(
+        list(queryset.values_list("feature_id", flat=True)), dtype=np.int64
+    )
+    return [
+        partition.tolist()
+        for partition in np.array_split(feature_ids, max(partitions, 1))
+        if len(partition)
+    ]
+
+
+def init_index_worker(using: str = "default") -> None:
+    """Reset the search backend sessions inherited by a worker process."""
+    connections[using].reset_sessions()
+
+
+def build_search_partition(
+    feature_ids: List[int], batch_size: int = INDEX_CHUNK_SIZE, using: str = "default"
+) -> int:
+    """Index the features of a partition in batches.
+
+    The batches share the index queryset, so the orthologous groups are
+    loaded once per partition. They are not committed one by one; the search
+    engine makes them visible on its next refresh. Return the number of
+    documents indexed.
+    """
+    index = connections[using].get_unified_index().get_index(Feature)
+    queryset = index.index_queryset(using=using)
+    indexed = 0
+    for start in range(0, len(feature_ids), batch_size):
+        end = start + batch_size
+        indexed += update_search_documents(
+            feature_ids[start:end], using, False, queryset
+        )[0]
+    return indexed
+
+
+class FeatureIndexIterable(ModelIterable):
+    """Yield features with their search document data, a chunk at a time."""
+
+    # shared by the evaluations of the queryset and its clones, see
+    # prepare_in_chunks
+    orthologous_groups: Dict[str, Dict] = None
+
+    def __iter__(self):
+        """Load the data of each chunk of features before yielding it."""
+        orthologous_groups = self.orthologous_groups
+        if orthologous_groups is None:
+            orthologous_groups = dict()
+        chunk: List[Feature] = list()
+        for feature in super().__iter__():
+            chunk.append(feature)
+            if len(chunk) == INDEX_CHUNK_SIZE:
+                load_index_data(chunk, orthologous_groups)
+                yield from chunk
+                chunk = list()
+        load_index_data(chunk, orthologous_groups)
+        yield from chunk
+
+
+def prepare_in_chunks(
+    queryset: QuerySet, orthologous_groups: Dict[str, Dict] = None
+) -> QuerySet:
+    """Return a queryset whose features come with their search document data.
+
+    The orthologous groups are loaded once for the queryset and the querysets
+    derived from it, eg. the slices haystack's update_index indexes in batches.
+    """
+    if orthologous_groups is None:
+        orthologous_groups = dict()
+    queryset = queryset.select_related("organism", "type")
+    queryset._iterable_class = type(
+        "FeatureIndexIterable",
+        (FeatureIndexIterable,),
+        {"orthologous_groups": orthologous_groups},
+    )
+    return queryset
@@ -0,0 +1,89 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Checkpoint long-running loads."""
+
+import json
+from typing import Dict
+
+from django.db import transaction
+from django.db.models import Max
+
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.provenance import ProvenanceRecorder
+from machado.models import Checkpoint, Feature, History
+
+
+class CheckpointRecorder(object):
+    """Record the progress of a load so it can be resumed.
+
+    A checkpoint must only be saved when every record before it has been
+    committed. Besides the number of records loaded it keeps the highest
+    feature_id at that moment: on resume, the features of the file with a
+    greater feature_id were created after the checkpoint and are removed
+    before the remaining records are loaded again. The pending provenance of
+    the load is written in the same transaction as the checkpoint, so every
+    feature kept on resume has its provenance recorded.
+    """
+
+    def __init__(
+        self,
+        history: History,
+        command: str,
+        filename: str,
+        interval: int = 10000,
+        resume: bool = False,
+        provenance: ProvenanceRecorder = None,
+    ) -> None:
+        """Execute the init function."""
+        if interval < 1:
+            raise ImportingError("The checkpoint interval must be a positive integer")
+        self.interval = interval
+        self.provenance = provenance
+        self.start = 0
+        self.last_id = None
+        self.counters: Dict[str, int] = dict()
+        if resume:
+            previous = (
+                Checkpoint.objects.filter(command=command, filename=filename)
+                .select_related("history")
+                .order_by("-updated_at")
+                .first()
+            )
+            if previous is None or previous.history.exit_code == 0:
+                raise ImportingError(
+                    "No interrupted {} of {} to resume".format(command, filename)
+                )
+            self.start = previous.record
+            self.last_id = previous.last_id
+            self.counters = json.loads(previous.counters or "{}")
+        self.checkpoint = Checkpoint.objects.create(
+            history=history,
+            command=command,
+            filename=filename,
+            record=self.start,
+            last_id=self.last_id,
+            counters=json.dumps(self.counters),
+        )
+
+    def count(self, counter: str, value: int = 1) -> None:
+        """Increment a counter."""
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def save(self, record: int, contig: str = None, force: bool = False) -> None:
+        """Save a checkpoint, at most once every interval records."""
+        if not force and record - self.checkpoint.record < self.interval:
+            return
+        self.checkpoint.record = record
+        self.checkpoint.contig = contig
+        self.checkpoint.last_id = Feature.objects.aggregate(Max("feature_id")).get(
+            "feature_id__max"
+        )
+        self.checkpoint.counters = json.dumps(self.counters)
+        with transaction.atomic():
+            if self.provenance is not None:
+                self.provenance.flush()
+            self.checkpoint.save()
@@ -15,9 +15,11 @@ import gzip
 import os
 
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db.models import BooleanField, F, Func, QuerySet, Value
 
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cvterm, Cvtermsynonym, Feature, FeatureDbxref, Organism
+from machado.models import Cvterm, Cvtermsynonym, Feature, FeatureDbxref, Featureloc
+from machado.models import Organism
 
 from typing import Union
 
@@ -248,3 +250,35 @@ def retrieve_cvterm(cv: str, term: str) -> Cvterm:
 
     except ObjectDoesNotExist:
         raise ImportingError("{} is not a {} ontology term.".format(term, cv))
+
+
+# Largest coordinate accepted by the featureloc integer columns.
+MAX_FEATURELOC_COORD = 2147483647
+
+
+def overlaps_featureloc(srcfeature_id: int, start: int = 1, end: int = None) -> Func:
+    """Return the condition of the featurelocs on srcfeature_id overlapping start..end.
+
+    The overlap is written against the chado boxrange functions so that it is
+    answered by the binloc_boxrange_src GiST index instead of a btree scan on
+    fmin/fmax. The interval is closed, as in fmin <= end AND fmax >= start.
+    """
+    return Func(
+        Func(
+            Value(srcfeature_id),
+            Value(int(start)),
+            Value(MAX_FEATURELOC_COORD if end is None else int(end)),
+            function="boxquery",
+        ),
+        Func(F("srcfeature_id"), F("fmin"), F("fmax"), function="boxrange"),
+        arg_joiner=" && ",
+        template="%(expressions)s",
+        output_field=BooleanField(),
+    )
+
+
+def retrieve_overlapping_featurelocs(
+    srcfeature_id: int, start: int = 1, end: int = None
+) -> QuerySet:
+    """Retrieve the featurelocs on srcfeature_id overlapping start..end."""
+    return Featureloc.objects.filter(overlaps_featureloc(srcfeature_id, start, end))
@@ -0,0 +1,166 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Feature density histograms."""
+
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from machado.models import Feature, FeatureDensity, Organism
+
+# zoom levels, in bases per bin
+BIN_SIZES = [1000, 10000, 100000, 1000000]
+
+# a feature is counted in every bin it overlaps
+DENSITY_SQL = (
+    "SELECT fl.srcfeature_id, f.type_id, b.bin, count(*) "
+    "FROM featureloc fl JOIN feature f ON f.feature_id = fl.feature_id "
+    "CROSS JOIN LATERAL generate_series("
+    "fl.fmin / %s, greatest(fl.fmax - 1, fl.fmin) / %s) AS b(bin) "
+    "WHERE f.organism_id = %s AND NOT f.is_obsolete "
+    "AND fl.srcfeature_id IS NOT NULL "
+    "GROUP BY fl.srcfeature_id, f.type_id, b.bin"
+)
+FEATURE_COUNT_SQL = (
+    "SELECT fl.srcfeature_id, f.type_id, count(*) "
+    "FROM featureloc fl JOIN feature f ON f.feature_id = fl.feature_id "
+    "WHERE f.organism_id = %s AND NOT f.is_obsolete "
+    "AND fl.srcfeature_id IS NOT NULL "
+    "GROUP BY fl.srcfeature_id, f.type_id"
+)
+
+
+def pack_counts(counts: List[int]) -> bytes:
+    """Pack bin counts as unsigned 32-bit integers."""
+    return array("I", counts).tobytes()
+
+
+def unpack_counts(data: bytes) -> array:
+    """Unpack bin counts."""
+    counts = array("I")
+    counts.frombytes(bytes(data))
+    return counts
+
+
+def store_feature_densities(
+    organism: Organism, bin_sizes: List[int] = BIN_SIZES
+) -> int:
+    """Compute and store the feature densities of an organism.
+
+    The counts of every reference sequence, feature type and bin size are
+    computed by set-based queries and replace the previous ones. Return the
+    number of density rows stored.
+    """
+    stored = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        FeatureDensity.objects.filter(organism_id=organism.organism_id).delete()
+        cursor.execute(FEATURE_COUNT_SQL, [organism.organism_id])
+        feature_counts = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+        for bin_size in bin_sizes:
+            cursor.execute(DENSITY_SQL, [bin_size, bin_size, organism.organism_id])
+            bins: Dict[Tuple[int, int], Dict[int, int]] = dict()
+            for srcfeature_id, type_id, bin_index, count in cursor.fetchall():
+                bins.setdefault((srcfeature_id, type_id), dict())[bin_index] = count
+            densities = list()
+            for (srcfeature_id, type_id), values in bins.items():
+                counts = [0] * (max(values) + 1)
+                for bin_index, count in values.items():
+                    counts[bin_index] = count
+                densities.append(
+                    FeatureDensity(
+                        organism_id=organism.organism_id,
+                        srcfeature_id=srcfeature_id,
+                        type_id=type_id,
+                        bin_size=bin_size,
+                        feature_count=feature_counts[(srcfeature_id, type_id)],
+                        counts=pack_counts(counts),
+                    )
+                )
+            FeatureDensity.objects.bulk_create(densities, batch_size=1000)
+            stored += len(densities)
+    return stored
+
+
+def refresh_feature_densities(organism_ids: Iterable[int]) -> int:
+    """Recompute the feature densities of organisms whose features changed.
+
+    It must be called after features or locations are loaded or removed. The
+    bin sizes already stored for an organism are kept, BIN_SIZES otherwise.
+    Return the number of density rows stored.
+    """
+    stored = 0
+    for organism in Organism.objects.filter(organism_id__in=set(organism_ids)):
+        bin_sizes = sorted(
+            set(
+                FeatureDensity.objects.filter(
+                    organism_id=organism.organism_id
+                ).values_list("bin_size", flat=True)
+            )
+        )
+        stored += store_feature_densities(organism, bin_sizes=bin_sizes or BIN_SIZES)
+    return stored
+
+
+def retrieve_feature_densities(
+    srcfeature_id: int,
+    start: int,
+    end: int,
+    bases_per_bin: int,
+    type_id: int = None,
+) -> Optional[Tuple[List[int], int]]:
+    """Retrieve the feature counts of start..end in bins of bases_per_bin.
+
+    The stored zoom level closest to, and not larger than, bases_per_bin is
+    used. Features spanning several stored bins are counted once per bin, so
+    the counts of coarse requests are approximate. Return the bins and the
+    bin size used, or None if the densities were not computed.
+    """
+    densities = FeatureDensity.objects.filter(srcfeature_id=srcfeature_id)
+    if type_id is not None:
+        densities = densities.filter(type_id=type_id)
+    bin_sizes = sorted(set(densities.values_list("bin_size", flat=True)))
+    if not bin_sizes:
+        return None
+    bin_size = max([size for size in bin_sizes if size <= bases_per_bin] or [0])
+    bin_size = bin_size or bin_sizes[0]
+
+    num_bins = max((end - start + bases_per_bin - 1) // bases_per_bin, 0)
+    bins = [0] * num_bins
+    for data in densities.filter(bin_size=bin_size).values_list("counts", flat=True):
+        counts = unpack_counts(data)
+        if bin_size <= bases_per_bin:
+            first = max(start // bin_size, 0)
+            last = min((end - 1) // bin_size + 1, len(counts))
+            for stored_index in range(first, last):
+                position = max(stored_index * bin_size - start, 0)
+                bins[position // bases_per_bin] += counts[stored_index]
+        else:
+            for i in range(num_bins):
+                stored_index = (start + i * bases_per_bin) // bin_size
+                if stored_index < len(counts):
+                    bins[i] += counts[stored_index]
+    return bins, bin_size
+
+
+def retrieve_feature_density(organism_id: int, type_id: int = None) -> Optional[Dict]:
+    """Retrieve the number of features and features per base of an organism."""
+    densities = FeatureDensity.objects.filter(organism_id=organism_id)
+    if type_id is not None:
+        densities = densities.filter(type_id=type_id)
+    bin_size = densities.order_by("bin_size").values_list("bin_size", flat=True).first()
+    if bin_size is None:
+        return None
+    densities = densities.filter(bin_size=bin_size)
+    feature_count = densities.aggregate(Sum("feature_count"))["feature_count__sum"]
+    seqlen = Feature.objects.filter(
+        feature_id__in=densities.values("srcfeature_id")
+    ).aggregate(Sum("seqlen"))["seqlen__sum"]
+    if not seqlen:
+        return None
+    return {"featureCount": feature_count, "featureDensity": feature_count / seqlen}
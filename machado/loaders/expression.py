@@ -0,0 +1,24 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Feature expression samples."""
+
+from django.db import connection
+
+
+def refresh_feature_expression_samples() -> None:
+    """Refresh the feature_expression_sample materialized view.
+
+    It has the expression samples of every feature, joining analysisfeature
+    to the assays, biomaterials and treatments. It must be refreshed after
+    the expression data, or the samples information, is loaded or removed.
+    The refresh is concurrent, using the unique feature_expression_sample_id
+    index, so the view can be read while it runs.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "REFRESH MATERIALIZED VIEW CONCURRENTLY feature_expression_sample"
+        )
@@ -7,28 +7,40 @@
 """Load feature file."""
 
 from datetime import datetime, timezone
+from hashlib import md5
 from time import time
-from typing import Dict, List, Union, Set
+from typing import Dict, List, Union, Set, Tuple
+from urllib.parse import unquote
 
 from Bio.SearchIO._model import Hit
 from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
+from django.db import connection, transaction
 from django.db.utils import IntegrityError
 from pysam.libctabixproxies import GTFProxy, VCFProxy
 
 from machado.loaders.common import retrieve_feature_id, retrieve_cvterm
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.featureattributes import ATTRIBUTE_TABLES
 from machado.loaders.featureattributes import FeatureAttributesLoader
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.models import Cv, Db, Cvterm, Dbxref, Dbxrefprop, Organism
 from machado.models import Feature, FeatureCvterm, FeatureDbxref, Featureloc
 from machado.models import FeatureRelationship, FeatureRelationshipprop
-from machado.models import Featureprop, FeaturePub, Pub, PubDbxref
+from machado.models import Featureprop, FeaturePub, Fingerprint, Pub, PubDbxref
 
 
 class FeatureLoaderBase(object):
     """Shared base for loading feature records."""
 
-    def __init__(self, source: str, filename: str, doi: str = None) -> None:
+    def __init__(
+        self,
+        source: str,
+        filename: str,
+        doi: str = None,
+        provenance: ProvenanceRecorder = None,
+    ) -> None:
         """Execute the init function."""
+        self.provenance = provenance
         # initialization of lists/sets to store ignored attributes,
         # ignored goterms, and relationships
         self.cache: Dict[str, str] = dict()
@@ -90,7 +102,12 @@ class FeatureLoader(FeatureLoaderBase):
     help = "Load single-organism feature records."
 
     def __init__(
-        self, source: str, filename: str, organism: Organism, doi: str = None
+        self,
+        source: str,
+        filename: str,
+        organism: Organism,
+        doi: str = None,
+        provenance: ProvenanceRecorder = None,
     ) -> None:
         """Execute the init function."""
 
@@ -99,30 +116,138 @@ class FeatureLoader(FeatureLoaderBase):
         else:
             raise ImportingError("FeatureLoader requires an organism parameter")
 
-        super(FeatureLoader, self).__init__(source, filename, doi)
+        super(FeatureLoader, self).__init__(source, filename, doi, provenance)
+        # (feature_id, action) pairs, only tracked by delta loads
+        self.changes: List[Tuple[int, str]] = None
+
+    def record_provenance(self, table: str, row_id: int) -> None:
+        """Record a row created from the file being loaded."""
+        if self.provenance is not None:
+            self.provenance.add(table, row_id)
+
+    def record_change(self, feature_id: int, action: str) -> None:
+        """Record a feature changed by a delta load."""
+        if self.changes is not None:
+            self.changes.append((feature_id, action))
+
+    def retrieve_tabix_GFF_cvterm(
+        self, tabix_feature: GTFProxy, qtl: bool, attrs_dict: Dict[str, str]
+    ) -> Cvterm:
+        """Retrieve the sequence ontology term of a tabix feature."""
+        if qtl:
+            attrs_dict["qtl_type"] = tabix_feature.feature
+            return Cvterm.objects.get(name="QTL", cv__name="sequence")
+        try:
+            return Cvterm.objects.get(name=tabix_feature.feature, cv__name="sequence")
+        except ObjectDoesNotExist:
+            raise ImportingError(
+                "{} is not a sequence ontology term.".format(tabix_feature.feature)
+            )
+
+    def get_tabix_GFF_fingerprint(self, tabix_feature: GTFProxy) -> Tuple[str, str]:
+        """Retrieve the key and the fingerprint of a tabix feature.
 
+        The key is the ID attribute, or the fingerprint itself for features
+        that lack it.
+        """
+        try:
+            phase = tabix_feature.frame
+        except ValueError:
+            phase = "."
+        fingerprint = md5(
+            "\t".join(
+                [
+                    tabix_feature.contig,
+                    tabix_feature.feature,
+                    str(tabix_feature.start),
+                    str(tabix_feature.end),
+                    tabix_feature.strand,
+                    str(phase),
+                    tabix_feature.attributes,
+                ]
+            ).encode()
+        ).hexdigest()
+        for field in tabix_feature.attributes.split(";"):
+            key, sep, value = field.strip().partition("=")
+            if sep and key.lower() in ["id", "qtl_id"]:
+                return unquote(value), fingerprint
+        return "auto:{}".format(fingerprint), fingerprint
+
+    def retrieve_srcfeature_id(self, contig: str) -> int:
+        """Retrieve the reference sequence of a tabix feature."""
+        srcdb = Db.objects.get(name="FASTA_SOURCE")
+        try:
+            srcdbxref = Dbxref.objects.get(accession=contig, db=srcdb)
+        except ObjectDoesNotExist as e:
+            raise ImportingError("{} {} ({})".format(srcdb.name, contig, e))
+        srcfeature = Feature.objects.filter(
+            dbxref=srcdbxref, organism=self.organism
+        ).values_list("feature_id", flat=True)
+        if len(srcfeature) == 1:
+            return srcfeature.first()
+        else:
+            raise ImportingError(
+                "Parent not found: {}. It's required to load "
+                "a reference FASTA file before loading features.".format(contig)
+            )
+
+    def store_tabix_GFF_featureloc(
+        self, feature_id: int, tabix_feature: GTFProxy
+    ) -> None:
+        """Store the location of a tabix feature."""
+        srcfeature_id = self.retrieve_srcfeature_id(tabix_feature.contig)
+
+        # the database requires -1, 0, and +1 for strand
+        if tabix_feature.strand == "+":
+            strand = +1
+        elif tabix_feature.strand == "-":
+            strand = -1
+        else:
+            strand = 0
+
+        # if row.frame is . phase = None
+        # some versions of pysam throws ValueError
+        try:
+            phase = tabix_feature.frame
+            if tabix_feature.frame == ".":
+                phase = None
+        except ValueError:
+            phase = None
+
+        try:
+            Featureloc.objects.get_or_create(
+                feature_id=feature_id,
+                srcfeature_id=srcfeature_id,
+                fmin=tabix_feature.start,
+                is_fmin_partial=False,
+                fmax=tabix_feature.end,
+                is_fmax_partial=False,
+                strand=strand,
+                phase=phase,
+                locgroup=0,
+                rank=0,
+            )
+        except IntegrityError as e:
+            raise ImportingError(
+                "{} {} {}: {}".format(
+                    feature_id, tabix_feature.start, tabix_feature.end, e
+                )
+            )
+
+    @transaction.atomic
     def store_tabix_GFF_feature(self, tabix_feature: GTFProxy, qtl: bool) -> None:
         """Store tabix feature."""
 
         filecontent = "qtl" if qtl else "genome"
 
-        attrs_loader = FeatureAttributesLoader(filecontent=filecontent)
+        attrs_loader = FeatureAttributesLoader(
+            filecontent=filecontent, provenance=self.provenance
+        )
         attrs_dict = attrs_loader.get_attributes(tabix_feature.attributes)
         self.ignored_attrs = attrs_loader.ignored_attrs
         self.ignored_goterms = attrs_loader.ignored_goterms
 
-        if qtl:
-            cvterm = Cvterm.objects.get(name="QTL", cv__name="sequence")
-            attrs_dict["qtl_type"] = tabix_feature.feature
-        else:
-            try:
-                cvterm = Cvterm.objects.get(
-                    name=tabix_feature.feature, cv__name="sequence"
-                )
-            except ObjectDoesNotExist:
-                raise ImportingError(
-                    "{} is not a sequence ontology term.".format(tabix_feature.feature)
-                )
+        cvterm = self.retrieve_tabix_GFF_cvterm(tabix_feature, qtl, attrs_dict)
 
         attrs_id = attrs_dict.get("id")
         attrs_name = attrs_dict.get("name")
@@ -139,12 +264,14 @@ class FeatureLoader(FeatureLoaderBase):
             dbxref, created = Dbxref.objects.get_or_create(
                 db=self.db, accession=attrs_id, version=self.filename
             )
-            Dbxrefprop.objects.get_or_create(
+            dbxrefprop, created = Dbxrefprop.objects.get_or_create(
                 dbxref=dbxref,
                 type_id=self.cvterm_contained_in.cvterm_id,
                 value=self.filename,
                 rank=0,
             )
+            if created:
+                self.record_provenance("dbxrefprop", dbxrefprop.dbxrefprop_id)
             feature_id = Feature.objects.create(
                 organism=self.organism,
                 uniquename=attrs_id,
@@ -158,6 +285,15 @@ class FeatureLoader(FeatureLoaderBase):
             ).feature_id
         except IntegrityError as e:
             raise ImportingError("ID {} already registered. {}".format(attrs_id, e))
+        self.record_provenance("feature", feature_id)
+        self.record_change(feature_id, "inserted")
+        key, fingerprint = self.get_tabix_GFF_fingerprint(tabix_feature)
+        Fingerprint.objects.create(
+            filename=self.filename,
+            key=key,
+            feature_id=feature_id,
+            fingerprint=fingerprint,
+        )
 
         # DOI: try to link feature to publication's DOI
         if feature_id and self.pub_dbxref_doi:
@@ -168,66 +304,7 @@ class FeatureLoader(FeatureLoaderBase):
             except IntegrityError as e:
                 raise ImportingError(e)
 
-        srcdb = Db.objects.get(name="FASTA_SOURCE")
-        try:
-            srcdbxref = Dbxref.objects.get(accession=tabix_feature.contig, db=srcdb)
-        except ObjectDoesNotExist as e:
-            raise ImportingError(
-                "{} {} ({})".format(srcdb.name, tabix_feature.contig, e)
-            )
-        srcfeature = Feature.objects.filter(
-            dbxref=srcdbxref, organism=self.organism
-        ).values_list("feature_id", flat=True)
-        if len(srcfeature) == 1:
-            srcfeature_id = srcfeature.first()
-        else:
-            raise ImportingError(
-                "Parent not found: {}. It's required to load "
-                "a reference FASTA file before loading features.".format(
-                    tabix_feature.contig
-                )
-            )
-
-        # the database requires -1, 0, and +1 for strand
-        if tabix_feature.strand == "+":
-            strand = +1
-        elif tabix_feature.strand == "-":
-            strand = -1
-        else:
-            strand = 0
-
-        # if row.frame is . phase = None
-        # some versions of pysam throws ValueError
-        try:
-            phase = tabix_feature.frame
-            if tabix_feature.frame == ".":
-                phase = None
-        except ValueError:
-            phase = None
-
-        try:
-            Featureloc.objects.get_or_create(
-                feature_id=feature_id,
-                srcfeature_id=srcfeature_id,
-                fmin=tabix_feature.start,
-                is_fmin_partial=False,
-                fmax=tabix_feature.end,
-                is_fmax_partial=False,
-                strand=strand,
-                phase=phase,
-                locgroup=0,
-                rank=0,
-            )
-        except IntegrityError as e:
-            print(
-                attrs_id,
-                srcdbxref,
-                tabix_feature.start,
-                tabix_feature.end,
-                strand,
-                phase,
-            )
-            raise ImportingError(e)
+        self.store_tabix_GFF_featureloc(feature_id, tabix_feature)
 
         # Process attrs_dict after the creation of the feature
         attrs_loader.process_attributes(feature_id, attrs_dict)
@@ -252,6 +329,8 @@ class FeatureLoader(FeatureLoaderBase):
                 timeaccessioned=datetime.now(timezone.utc),
                 timelastmodified=datetime.now(timezone.utc),
             ).feature_id
+            self.record_provenance("feature", feature_mRNA_translation_id)
+            self.record_change(feature_mRNA_translation_id, "inserted")
             FeatureRelationship.objects.create(
                 object_id=feature_mRNA_translation_id,
                 subject_id=feature_id,
@@ -259,6 +338,130 @@ class FeatureLoader(FeatureLoaderBase):
                 rank=0,
             )
 
+    @transaction.atomic
+    def update_tabix_GFF_feature(
+        self, feature_id: int, tabix_feature: GTFProxy, qtl: bool
+    ) -> None:
+        """Update a feature whose tabix record changed.
+
+        The feature keeps its feature_id. Its location and parents are
+        replaced. The attribute rows previously created by the file, as
+        recorded in its provenance, are removed before the attributes are
+        stored again, while the rows loaded from other files are kept.
+        """
+        filecontent = "qtl" if qtl else "genome"
+
+        attrs_loader = FeatureAttributesLoader(
+            filecontent=filecontent, provenance=self.provenance
+        )
+        attrs_dict = attrs_loader.get_attributes(tabix_feature.attributes)
+        self.ignored_attrs = attrs_loader.ignored_attrs
+        self.ignored_goterms = attrs_loader.ignored_goterms
+
+        cvterm = self.retrieve_tabix_GFF_cvterm(tabix_feature, qtl, attrs_dict)
+        try:
+            attrs_parent = attrs_dict.get("parent").split(",")
+        except AttributeError:
+            attrs_parent = list()
+
+        try:
+            feature_obj = Feature.objects.get(feature_id=feature_id)
+        except ObjectDoesNotExist as e:
+            raise ImportingError("Feature {}: {}".format(feature_id, e))
+
+        # the feature and its translation share the dbxref
+        features = Feature.objects.filter(
+            dbxref_id=feature_obj.dbxref_id, organism=self.organism
+        )
+        features.update(
+            name=attrs_dict.get("name"),
+            is_obsolete=False,
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        Feature.objects.filter(feature_id=feature_id).update(type_id=cvterm.cvterm_id)
+        for changed_id in features.values_list("feature_id", flat=True):
+            self.record_change(changed_id, "updated")
+
+        Featureloc.objects.filter(feature_id=feature_id).delete()
+        self.store_tabix_GFF_featureloc(feature_id, tabix_feature)
+
+        self.remove_tabix_GFF_attributes(feature_id)
+        attrs_loader.process_attributes(feature_id, attrs_dict)
+
+        FeatureRelationship.objects.filter(
+            object_id=feature_id, type__name="part_of", type__cv__name="sequence"
+        ).delete()
+        for parent in attrs_parent:
+            self.relationships.append(
+                {"object_id": feature_obj.uniquename, "subject_id": parent}
+            )
+
+        key, fingerprint = self.get_tabix_GFF_fingerprint(tabix_feature)
+        Fingerprint.objects.filter(filename=self.filename, key=key).update(
+            fingerprint=fingerprint
+        )
+
+    def remove_tabix_GFF_attributes(self, feature_id: int) -> None:
+        """Remove the attribute rows of a feature created by the file."""
+        with connection.cursor() as cursor:
+            for table, pk in ATTRIBUTE_TABLES:
+                cursor.execute(
+                    "DELETE FROM {0} t USING provenance p "
+                    "WHERE t.feature_id = %s AND p.filename = %s "
+                    "AND p.table_name = '{0}' "
+                    "AND t.{1} BETWEEN p.min_id AND p.max_id".format(table, pk),
+                    [feature_id, self.filename],
+                )
+
+    def obsolete_tabix_GFF_features(self, feature_ids: List[int]) -> None:
+        """Flag as obsolete the features removed from the file."""
+        dbxref_ids = Feature.objects.filter(feature_id__in=feature_ids).values(
+            "dbxref_id"
+        )
+        features = Feature.objects.filter(
+            dbxref_id__in=dbxref_ids, organism=self.organism
+        )
+        for changed_id in features.values_list("feature_id", flat=True):
+            self.record_change(changed_id, "obsoleted")
+        features.update(is_obsolete=True, timelastmodified=datetime.now(timezone.utc))
+        # an empty fingerprint never matches, so the feature is updated, and
+        # no longer obsolete, if it comes back in a later release
+        Fingerprint.objects.filter(
+            filename=self.filename, feature_id__in=feature_ids
+        ).update(fingerprint="")
+
+    def retrieve_tabix_GFF_uniquenames(self) -> Dict[str, str]:
+        """Retrieve the uniquenames of the features loaded from the file."""
+        feature_ids = dict(
+            Fingerprint.objects.filter(filename=self.filename).values_list(
+                "feature_id", "key"
+            )
+        )
+        return {
+            feature_ids[feature_id]: uniquename
+            for feature_id, uniquename in Feature.objects.filter(
+                feature_id__in=Fingerprint.objects.filter(
+                    filename=self.filename
+                ).values("feature_id")
+            ).values_list("feature_id", "uniquename")
+        }
+
+    def restore_tabix_GFF_relationships(
+        self, tabix_feature: GTFProxy, uniquenames: Dict[str, str]
+    ) -> None:
+        """Restore the relationships of a feature loaded before a checkpoint."""
+        key, fingerprint = self.get_tabix_GFF_fingerprint(tabix_feature)
+        uniquename = uniquenames.get(key)
+        if uniquename is None:
+            return
+        for field in tabix_feature.attributes.split(";"):
+            attr, sep, value = field.strip().partition("=")
+            if sep and attr.lower() == "parent":
+                for parent in unquote(value).split(","):
+                    self.relationships.append(
+                        {"object_id": uniquename, "subject_id": parent}
+                    )
+
     def store_relationship(
         self, subject_id: int, object_id: int
     ) -> FeatureRelationship:
@@ -266,7 +469,7 @@ class FeatureLoader(FeatureLoaderBase):
         part_of = Cvterm.objects.get(name="part_of", cv__name="sequence")
 
         try:
-            fr = FeatureRelationship(
+            FeatureRelationship.objects.get_or_create(
                 subject_id=Feature.objects.exclude(type=self.aa_cvterm)
                 .get(uniquename=subject_id, organism=self.organism)
                 .feature_id,
@@ -276,7 +479,6 @@ class FeatureLoader(FeatureLoaderBase):
                 type_id=part_of.cvterm_id,
                 rank=0,
             )
-            fr.save()
         except ObjectDoesNotExist:
             print(
                 "Parent/Feature ({}/{}) not registered.".format(object_id, subject_id)
@@ -312,11 +514,13 @@ class FeatureLoader(FeatureLoaderBase):
             dbxref, created = Dbxref.objects.get_or_create(
                 db=self.db, accession=tabix_feature.id
             )
-            Dbxrefprop.objects.get_or_create(
+            dbxrefprop, created = Dbxrefprop.objects.get_or_create(
                 dbxref=dbxref,
                 type_id=self.cvterm_contained_in.cvterm_id,
                 rank=0,
             )
+            if created:
+                self.record_provenance("dbxrefprop", dbxrefprop.dbxrefprop_id)
             name = "{}->{}".format(tabix_feature.ref, tabix_feature.alt)
             feature_id = Feature.objects.create(
                 organism=self.organism,
@@ -333,6 +537,7 @@ class FeatureLoader(FeatureLoaderBase):
             raise ImportingError(
                 "ID {} already registered. {}".format(tabix_feature.id, e)
             )
+        self.record_provenance("feature", feature_id)
 
         if tabix_feature.qual != ".":
             cvterm_qual = Cvterm.objects.get(name="quality_value", cv__name="sequence")
@@ -13,12 +13,12 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db.models import Max
 
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.models import Cv, Db, Cvterm, Dbxref
 from machado.models import FeatureCvterm, FeatureDbxref, FeaturePub
 from machado.models import Featureprop, FeaturepropPub, FeatureSynonym
 from machado.models import Pub, PubDbxref, Synonym
 
-
 # The following attributes are handled in a specific manner and should not
 # be included in VALID_GFF_ATTRS: id, name, and parent
 VALID_GENOME_ATTRS = [
@@ -60,14 +60,29 @@ VALID_QTL_ATTRS = [
     "doi",
 ]
 
+# Tables of the rows created from the attributes, as (table, primary key)
+ATTRIBUTE_TABLES = [
+    ("featureprop", "featureprop_id"),
+    ("feature_cvterm", "feature_cvterm_id"),
+    ("feature_dbxref", "feature_dbxref_id"),
+    ("feature_synonym", "feature_synonym_id"),
+    ("feature_pub", "feature_pub_id"),
+]
+
 
 class FeatureAttributesLoader(object):
     """Load feature attributes."""
 
     help = "Load feature attributes."
 
-    def __init__(self, filecontent: str, doi: str = None) -> None:
+    def __init__(
+        self,
+        filecontent: str,
+        doi: str = None,
+        provenance: ProvenanceRecorder = None,
+    ) -> None:
         """Execute the init function."""
+        self.provenance = provenance
         # initialization of lists/sets to store ignored attributes, and
         # ignored goterms
         self.db_null, created = Db.objects.get_or_create(name="null")
@@ -144,6 +159,11 @@ class FeatureAttributesLoader(object):
 
         return result
 
+    def record_provenance(self, table: str, row_id: int, created: bool) -> None:
+        """Record a row created from the attributes."""
+        if created and self.provenance is not None:
+            self.provenance.add(table, row_id)
+
     def process_attributes(self, feature_id: int, attrs: Dict[str, str]) -> None:
         """Process the valid attributes."""
         try:
@@ -164,12 +184,15 @@ class FeatureAttributesLoader(object):
                         term_db = Db.objects.get(name=aux_db.upper())
                         dbxref = Dbxref.objects.get(db=term_db, accession=aux_term)
                         cvterm = Cvterm.objects.get(dbxref=dbxref)
-                        FeatureCvterm.objects.create(
+                        feature_cvterm, created = FeatureCvterm.objects.get_or_create(
                             feature_id=feature_id,
                             cvterm=cvterm,
                             pub=self.pub,
-                            is_not=False,
                             rank=0,
+                            defaults={"is_not": False},
+                        )
+                        self.record_provenance(
+                            "feature_cvterm", feature_cvterm.feature_cvterm_id, created
                         )
                     except ObjectDoesNotExist:
                         self.ignored_goterms.add(term)
@@ -188,16 +211,24 @@ class FeatureAttributesLoader(object):
                     dbxref, created = Dbxref.objects.get_or_create(
                         db=db, accession=aux_dbxref
                     )
-                    FeatureDbxref.objects.create(
-                        feature_id=feature_id, dbxref=dbxref, is_current=1
+                    feature_dbxref, created = FeatureDbxref.objects.get_or_create(
+                        feature_id=feature_id,
+                        dbxref=dbxref,
+                        defaults={"is_current": 1},
+                    )
+                    self.record_provenance(
+                        "feature_dbxref", feature_dbxref.feature_dbxref_id, created
                     )
             elif key in ["pacid"]:
                 db, created = Db.objects.get_or_create(name="PACID")
                 dbxref, created = Dbxref.objects.get_or_create(
                     db=db, accession=attrs[key]
                 )
-                FeatureDbxref.objects.create(
-                    feature_id=feature_id, dbxref=dbxref, is_current=1
+                feature_dbxref, created = FeatureDbxref.objects.get_or_create(
+                    feature_id=feature_id, dbxref=dbxref, defaults={"is_current": 1}
+                )
+                self.record_provenance(
+                    "feature_dbxref", feature_dbxref.feature_dbxref_id, created
                 )
             elif key in ["doi"]:
                 try:
@@ -208,7 +239,12 @@ class FeatureAttributesLoader(object):
                 except ObjectDoesNotExist:
                     raise ImportingError("{} not registered.".format(attrs[key]))
 
-                FeaturePub.objects.get_or_create(feature_id=feature_id, pub=pub_obj)
+                feature_pub, created = FeaturePub.objects.get_or_create(
+                    feature_id=feature_id, pub=pub_obj
+                )
+                self.record_provenance(
+                    "feature_pub", feature_pub.feature_pub_id, created
+                )
 
             elif key in ["alias", "gene_synonym", "synonym", "abbrev"]:
                 synonym, created = Synonym.objects.get_or_create(
@@ -218,12 +254,14 @@ class FeatureAttributesLoader(object):
                         "synonym_sgml": attrs.get(key),
                     },
                 )
-                FeatureSynonym.objects.create(
+                feature_synonym, created = FeatureSynonym.objects.get_or_create(
                     synonym=synonym,
                     feature_id=feature_id,
                     pub=self.pub,
-                    is_current=True,
-                    is_internal=False,
+                    defaults={"is_current": True, "is_internal": False},
+                )
+                self.record_provenance(
+                    "feature_synonym", feature_synonym.feature_synonym_id, created
                 )
             elif key in ["annotation"]:
                 annotation_dbxref, created = Dbxref.objects.get_or_create(
@@ -266,6 +304,9 @@ class FeatureAttributesLoader(object):
                         value=attrs.get(key),
                         rank=max_rank,
                     )
+                    self.record_provenance(
+                        "featureprop", featureprop_obj.featureprop_id, created
+                    )
                 if self.pub.uniquename != "null":
                     FeaturepropPub.objects.get_or_create(
                         featureprop=featureprop_obj, pub=self.pub
@@ -296,6 +337,9 @@ class FeatureAttributesLoader(object):
                     rank=0,
                     defaults={"value": attrs.get(key)},
                 )
+                self.record_provenance(
+                    "featureprop", featureprop_obj.featureprop_id, created
+                )
                 if self.pub.uniquename != "null":
                     FeaturepropPub.objects.get_or_create(
                         featureprop=featureprop_obj, pub=self.pub
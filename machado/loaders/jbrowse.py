@@ -0,0 +1,481 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Export static JBrowse data."""
+
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from textwrap import wrap
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from django.db import connection
+
+from machado.decorators import retrieve_feature_displays
+from machado.loaders.exceptions import ImportingError
+from machado.models import Feature, Featureloc, FeatureRelationship
+from machado.models import Organism
+
+# Same layout as extras/trackList.json.sample, so the labels set in
+# MACHADO_JBROWSE_TRACKS keep working with the static tracks.
+DEFAULT_TRACKS = {
+    "gene": {
+        "label": "gene",
+        "key": "Gene",
+        "category": "2. Genes",
+        "type": "JBrowse/View/Track/CanvasFeatures",
+        "style": {"label": "name,id", "description": "display"},
+    },
+    "mRNA": {
+        "label": "transcripts",
+        "key": "Transcript",
+        "category": "2. Genes",
+        "type": "JBrowse/View/Track/CanvasFeatures",
+        "style": {"label": "name,id", "description": "display"},
+    },
+    "CDS": {
+        "label": "CDS",
+        "key": "CDS",
+        "category": "2. Genes",
+        "type": "JBrowse/View/Track/CanvasFeatures",
+    },
+    "SNV": {
+        "label": "SNV",
+        "key": "SNV",
+        "category": "3. Variation",
+        "type": "JBrowse/View/Track/HTMLFeatures",
+    },
+}
+
+# NCList array representation: the first item of every feature array is the
+# index of its class. Attributes missing from a class, such as the Sublist of
+# nested features, go into an extra object right after the class attributes.
+FEATURE_CLASS = 0
+SUBFEATURE_CLASS = 1
+LAZY_CLASS = 2
+NCLIST_CLASSES = [
+    {
+        "attributes": [
+            "Start",
+            "End",
+            "Strand",
+            "Id",
+            "Name",
+            "Type",
+            "Display",
+            "Subfeatures",
+        ],
+        "isArrayAttr": {"Subfeatures": 1},
+    },
+    {"attributes": ["Start", "End", "Strand", "Type", "Phase"], "isArrayAttr": {}},
+    {"attributes": ["Start", "End", "Chunk"], "isArrayAttr": {"Sublist": 1}},
+]
+LAZY_URL_TEMPLATE = "lf-{Chunk}.json"
+
+
+def write_json(path: str, data) -> None:
+    """Write data as compact JSON, creating the directory if needed."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as handle:
+        json.dump(data, handle, separators=(",", ":"))
+
+
+def track_config(soterm: str) -> Dict:
+    """Return the trackList.json settings of a feature track."""
+    config = DEFAULT_TRACKS.get(
+        soterm,
+        {
+            "label": soterm,
+            "key": soterm,
+            "category": "4. Features",
+            "type": "JBrowse/View/Track/CanvasFeatures",
+        },
+    )
+    return dict(config)
+
+
+class NCListBuilder(object):
+    """Build a nested containment list from features sorted by location.
+
+    Features must be added ordered by start and, for the same start, by end
+    descending, so a feature is either contained by one on the stack or
+    starts a new top level entry. Top level entries are written to lazy
+    chunk files of chunk_size entries as soon as they can no longer change,
+    hence only the current chunk, with the features nested in its entries,
+    is held in memory.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 2000) -> None:
+        """Execute the init function."""
+        if chunk_size < 1:
+            raise ImportingError("The chunk size must be a positive integer")
+        self.path = path
+        self.chunk_size = chunk_size
+        self.stack: List[List] = list()
+        self.chunk: List[List] = list()
+        self.lazy: List[List] = list()
+        self.count = 0
+        self.last_start = None
+        self.min_start = None
+        self.max_end = None
+
+    def _sublist(self, feature: List) -> List:
+        """Return the sublist of a feature, creating it if needed."""
+        extra_index = len(NCLIST_CLASSES[feature[0]]["attributes"]) + 1
+        if len(feature) <= extra_index:
+            feature.append({"Sublist": list()})
+        return feature[extra_index]["Sublist"]
+
+    def _flush(self) -> None:
+        """Write the current chunk and keep a lazy reference to it."""
+        chunk_id = len(self.lazy)
+        write_json(
+            os.path.join(self.path, LAZY_URL_TEMPLATE.format(Chunk=chunk_id)),
+            self.chunk,
+        )
+        self.lazy.append([LAZY_CLASS, self.chunk[0][1], self.chunk[-1][2], chunk_id])
+        self.chunk = list()
+
+    def add(self, feature: List) -> None:
+        """Add a feature array."""
+        start, end = feature[1], feature[2]
+        if self.last_start is not None and start < self.last_start:
+            raise ImportingError("Features must be added sorted by start")
+        self.last_start = start
+        while self.stack and self.stack[-1][2] < end:
+            self.stack.pop()
+        if self.stack:
+            self._sublist(self.stack[-1]).append(feature)
+        else:
+            # the previous top level entries are final from now on
+            if len(self.chunk) >= self.chunk_size:
+                self._flush()
+            self.chunk.append(feature)
+        self.stack.append(feature)
+        self.count += 1
+        if self.min_start is None:
+            self.min_start = start
+        if self.max_end is None or end > self.max_end:
+            self.max_end = end
+
+    def finish(self) -> Dict:
+        """Return the intervals of the trackData.json."""
+        if self.lazy and self.chunk:
+            self._flush()
+        intervals = {
+            "classes": NCLIST_CLASSES,
+            "count": self.count,
+            "minStart": self.min_start or 0,
+            "maxEnd": self.max_end or 0,
+            "nclist": self.lazy or self.chunk,
+        }
+        if self.lazy:
+            intervals["lazyClass"] = LAZY_CLASS
+            intervals["urlTemplate"] = LAZY_URL_TEMPLATE
+        return intervals
+
+
+class JBrowseExporter(object):
+    """Export an organism as static JBrowse data.
+
+    The output directory gets seq/refSeqs.json, the reference sequence
+    chunks, one NCList feature track per SO term and reference sequence,
+    a Hash names index and a trackList.json. Features are streamed from the
+    database with server-side cursors, and their subfeatures and displays
+    are retrieved for chunk_size features at a time. The names are spilled
+    to temporary files, partitioned by the last hex digit of their hash, and
+    the index is written one partition at a time. export_refseq handles a
+    single reference sequence, so reference sequences can be exported in
+    parallel.
+    """
+
+    def __init__(
+        self,
+        organism: Organism,
+        path: str,
+        soterms: List[str],
+        chunk_size: int = 2000,
+        seq_chunk_size: int = 20000,
+    ) -> None:
+        """Execute the init function."""
+        self.organism = organism
+        self.path = path
+        self.soterms = soterms
+        self.chunk_size = chunk_size
+        self.seq_chunk_size = seq_chunk_size
+        self.labels = [track_config(soterm)["label"] for soterm in soterms]
+        self.names_path = None
+        self.names_count = 0
+        self.names_lock = Lock()
+
+    def retrieve_refseqs(self, soterm: str) -> List[Tuple[int, str, int]]:
+        """Retrieve the feature_id, name and length of the reference sequences."""
+        refseqs = list(
+            Feature.objects.filter(
+                organism=self.organism,
+                type__cv__name="sequence",
+                type__name=soterm,
+                is_obsolete=False,
+            )
+            .order_by("uniquename")
+            .values_list("feature_id", "uniquename", "seqlen")
+        )
+        if not refseqs:
+            raise ImportingError(
+                "No {} registered for {}".format(soterm, self.organism)
+            )
+        return refseqs
+
+    def export_refseqs(self, refseqs: List[Tuple[int, str, int]]) -> None:
+        """Write seq/refSeqs.json."""
+        write_json(
+            os.path.join(self.path, "seq", "refSeqs.json"),
+            [
+                {
+                    "name": name,
+                    "start": 0,
+                    "end": seqlen or 0,
+                    "length": seqlen or 0,
+                    "seqChunkSize": self.seq_chunk_size,
+                }
+                for feature_id, name, seqlen in refseqs
+            ],
+        )
+
+    def export_sequence(self, feature_id: int, name: str, seqlen: int) -> None:
+        """Write the chunks of a reference sequence."""
+        # fetch several chunks per query without loading the whole residues
+        block_size = self.seq_chunk_size * 50
+        chunk_id = 0
+        with connection.cursor() as cursor:
+            for offset in range(0, seqlen or 0, block_size):
+                cursor.execute(
+                    "SELECT substring(residues FROM %s FOR %s) "
+                    "FROM feature WHERE feature_id = %s",
+                    [offset + 1, block_size, feature_id],
+                )
+                block = cursor.fetchone()[0]
+                if not block:
+                    return
+                os.makedirs(os.path.join(self.path, "seq"), exist_ok=True)
+                for start in range(0, len(block), self.seq_chunk_size):
+                    end = start + self.seq_chunk_size
+                    chunk_path = os.path.join(
+                        self.path, "seq", "{}-{}.txt".format(name, chunk_id)
+                    )
+                    with open(chunk_path, "w") as handle:
+                        handle.write(block[start:end])
+                    chunk_id += 1
+
+    def retrieve_subfeatures(
+        self, refseq_id: int, feature_ids: List[int]
+    ) -> Dict[int, List]:
+        """Retrieve the NCList subfeatures of features on a refseq."""
+        subfeatures: Dict[int, List] = dict()
+        for subject_id, type_name, fmin, fmax, strand, phase in (
+            FeatureRelationship.objects.filter(
+                subject_id__in=feature_ids,
+                type__name="part_of",
+                type__cv__name="sequence",
+                object__Featureloc_feature_Feature__srcfeature_id=refseq_id,
+            )
+            .order_by("object__Featureloc_feature_Feature__fmin")
+            .values_list(
+                "subject_id",
+                "object__type__name",
+                "object__Featureloc_feature_Feature__fmin",
+                "object__Featureloc_feature_Feature__fmax",
+                "object__Featureloc_feature_Feature__strand",
+                "object__Featureloc_feature_Feature__phase",
+            )
+        ):
+            subfeatures.setdefault(subject_id, list()).append(
+                [SUBFEATURE_CLASS, fmin, fmax, strand, type_name, phase]
+            )
+        return subfeatures
+
+    def retrieve_displays(self, feature_ids: List[int]) -> Dict[int, str]:
+        """Retrieve the display of features."""
+        return retrieve_feature_displays(feature_ids)
+
+    def add_features(
+        self,
+        builder: NCListBuilder,
+        refseq_id: int,
+        refseq_name: str,
+        soterm: str,
+        rows: List[Tuple],
+    ) -> None:
+        """Add a chunk of features to a track and to the names index."""
+        feature_ids = [row[0] for row in rows]
+        subfeatures = self.retrieve_subfeatures(refseq_id, feature_ids)
+        displays = self.retrieve_displays(feature_ids)
+        label_index = self.labels.index(track_config(soterm)["label"])
+        names = list()
+        for feature_id, fmin, fmax, strand, uniquename, name in rows:
+            builder.add(
+                [
+                    FEATURE_CLASS,
+                    fmin,
+                    fmax,
+                    strand,
+                    uniquename,
+                    name,
+                    soterm,
+                    displays.get(feature_id),
+                    subfeatures.get(feature_id),
+                ]
+            )
+            names.append([uniquename, label_index, refseq_name, fmin, fmax])
+            if name and name != uniquename:
+                names.append([name, label_index, refseq_name, fmin, fmax])
+        self.add_names(names)
+
+    def export_track(self, refseq_id: int, refseq_name: str, soterm: str) -> int:
+        """Write the NCList track of a SO term on a refseq.
+
+        Return the number of features.
+        """
+        label = track_config(soterm)["label"]
+        path = os.path.join(self.path, "tracks", label, refseq_name)
+        builder = NCListBuilder(path=path, chunk_size=self.chunk_size)
+        rows = list()
+        for row in (
+            Featureloc.objects.filter(
+                srcfeature_id=refseq_id,
+                feature__type__cv__name="sequence",
+                feature__type__name=soterm,
+                feature__organism=self.organism,
+                feature__is_obsolete=False,
+            )
+            .order_by("fmin", "-fmax")
+            .values_list(
+                "feature_id",
+                "fmin",
+                "fmax",
+                "strand",
+                "feature__uniquename",
+                "feature__name",
+            )
+            .iterator(chunk_size=self.chunk_size)
+        ):
+            rows.append(row)
+            if len(rows) >= self.chunk_size:
+                self.add_features(builder, refseq_id, refseq_name, soterm, rows)
+                rows = list()
+        if rows:
+            self.add_features(builder, refseq_id, refseq_name, soterm, rows)
+        intervals = builder.finish()
+        write_json(
+            os.path.join(path, "trackData.json"),
+            {
+                "featureCount": intervals["count"],
+                "formatVersion": 1,
+                "intervals": intervals,
+            },
+        )
+        return intervals["count"]
+
+    def export_refseq(self, refseq: Tuple[int, str, int]) -> int:
+        """Write the sequence and every track of a refseq.
+
+        Return the number of features.
+        """
+        feature_id, name, seqlen = refseq
+        self.export_sequence(feature_id, name, seqlen)
+        count = 0
+        for soterm in self.soterms:
+            count += self.export_track(feature_id, name, soterm)
+        return count
+
+    def add_names(self, names: List[List]) -> None:
+        """Spill [name, track index, refseq, start, end] entries to disk."""
+        partitions: Dict[str, List[str]] = dict()
+        for entry in names:
+            crc = "{:08x}".format(zlib.crc32(entry[0].lower().encode()))
+            partitions.setdefault(crc[-1], list()).append(
+                json.dumps([crc] + entry) + "\n"
+            )
+        with self.names_lock:
+            if self.names_path is None:
+                self.names_path = tempfile.mkdtemp(prefix="names", dir=self.path)
+            for partition, lines in partitions.items():
+                with open(os.path.join(self.names_path, partition), "a") as handle:
+                    handle.writelines(lines)
+            self.names_count += len(names)
+
+    def export_names(self) -> None:
+        """Write the names index as a JBrowse Hash store.
+
+        Only exact matches are indexed, names are not expanded to prefixes.
+        Every bucket of the index belongs to a single partition, so only one
+        partition is held in memory at a time.
+        """
+        hash_bits = 4
+        while hash_bits < 32 and (1 << hash_bits) * 1000 < self.names_count:
+            hash_bits += 4
+        hex_characters = hash_bits // 4
+        if self.names_path is not None:
+            for partition in sorted(os.listdir(self.names_path)):
+                buckets: Dict[str, Dict] = dict()
+                with open(os.path.join(self.names_path, partition)) as handle:
+                    for line in handle:
+                        crc, name, label_index, refseq, start, end = json.loads(line)
+                        buckets.setdefault(crc[-hex_characters:], dict()).setdefault(
+                            name.lower(), {"exact": []}
+                        )["exact"].append([name, label_index, name, refseq, start, end])
+                for crc, bucket in buckets.items():
+                    dirs = wrap(crc, 3)
+                    write_json(
+                        os.path.join(
+                            self.path, "names", *dirs[:-1], dirs[-1] + ".json"
+                        ),
+                        bucket,
+                    )
+            shutil.rmtree(self.names_path)
+            self.names_path = None
+        write_json(
+            os.path.join(self.path, "names", "meta.json"),
+            {
+                "compress": 0,
+                "format": "json",
+                "hash_bits": hash_bits,
+                "track_names": self.labels,
+            },
+        )
+
+    def export_tracklist(self) -> None:
+        """Write trackList.json."""
+        tracks = [
+            {
+                "category": "1. Reference sequence",
+                "label": "ref_seq",
+                "key": "Reference sequence",
+                "type": "SequenceTrack",
+                "storeClass": "JBrowse/Store/Sequence/StaticChunked",
+                "chunkSize": self.seq_chunk_size,
+                "urlTemplate": "seq/{refseq}-",
+                "useAsRefSeqStore": True,
+            }
+        ]
+        for soterm in self.soterms:
+            config = track_config(soterm)
+            config["storeClass"] = "JBrowse/Store/SeqFeature/NCList"
+            config["urlTemplate"] = "tracks/{}/{{refseq}}/trackData.json".format(
+                config["label"]
+            )
+            tracks.append(config)
+        write_json(
+            os.path.join(self.path, "trackList.json"),
+            {
+                "formatVersion": 1,
+                "names": {"type": "Hash", "url": "names/"},
+                "tracks": tracks,
+            },
+        )
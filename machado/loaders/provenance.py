@@ -0,0 +1,115 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Record the rows created by each file load."""
+
+from threading import Lock
+from typing import Dict, List
+
+from django.db import connection
+
+from machado.models import History, Provenance
+
+
+def provenance_sql(table: str, pk: str) -> str:
+    """Return a select of the pks of table created by the file in %s.
+
+    The select is meant to be used as the select_sql of ChunkedRemover and
+    takes the file name as its single parameter.
+    """
+    return (
+        "SELECT t.{1} FROM {0} t JOIN provenance p "
+        "ON t.{1} BETWEEN p.min_id AND p.max_id "
+        "WHERE p.filename = %s AND p.table_name = '{0}'".format(table, pk)
+    )
+
+
+def has_provenance(filename: str, table: str) -> bool:
+    """Check whether the provenance of a file is recorded for table."""
+    return Provenance.objects.filter(filename=filename, table_name=table).exists()
+
+
+def provenance_summary(filename: str) -> List[Dict]:
+    """Summarize the rows recorded for a file, per table and load."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT p.table_name, p.history_id, count(*), "
+            "sum(p.max_id - p.min_id + 1), min(p.min_id), max(p.max_id) "
+            "FROM provenance p WHERE p.filename = %s "
+            "GROUP BY p.table_name, p.history_id "
+            "ORDER BY p.history_id, p.table_name",
+            [filename],
+        )
+        keys = ["table", "history", "ranges", "rows", "min_id", "max_id"]
+        return [dict(zip(keys, row)) for row in cursor.fetchall()]
+
+
+class ProvenanceRecorder(object):
+    """Record, as compact id ranges, the rows created by a file load.
+
+    Rows created in a bulk load mostly get consecutive ids from their
+    sequence, so the ids are kept as (min_id, max_id) runs that are extended
+    in place and written with a single bulk_create. The runs are flushed
+    every flush_size recorded rows, so at most flush_size rows are lost if
+    the load is killed. Loaders share one recorder between threads, hence the
+    lock.
+    """
+
+    def __init__(self, history: History, filename: str, flush_size: int = 1000) -> None:
+        """Execute the init function."""
+        self.history = history
+        self.filename = filename
+        self.flush_size = flush_size
+        self.runs: Dict[str, List[List[int]]] = dict()
+        self.pending = 0
+        self.lock = Lock()
+
+    def add(self, table: str, row_id: int) -> None:
+        """Record a row of table created by the file."""
+        with self.lock:
+            runs = self.runs.setdefault(table, list())
+            if runs and runs[-1][0] <= row_id <= runs[-1][1]:
+                return
+            if runs and row_id == runs[-1][1] + 1:
+                runs[-1][1] = row_id
+            elif runs and row_id == runs[-1][0] - 1:
+                runs[-1][0] = row_id
+            else:
+                runs.append([row_id, row_id])
+            self.pending += 1
+            pending = self.pending
+        if pending >= self.flush_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Store the pending runs.
+
+        The runs are only discarded once they are stored, so they are kept if
+        the flush fails.
+        """
+        with self.lock:
+            provenances = list()
+            for table, runs in self.runs.items():
+                merged: List[List[int]] = list()
+                for min_id, max_id in sorted(runs):
+                    if merged and min_id <= merged[-1][1] + 1:
+                        merged[-1][1] = max(merged[-1][1], max_id)
+                    else:
+                        merged.append([min_id, max_id])
+                provenances += [
+                    Provenance(
+                        history=self.history,
+                        filename=self.filename,
+                        table_name=table,
+                        min_id=min_id,
+                        max_id=max_id,
+                    )
+                    for min_id, max_id in merged
+                ]
+            if provenances:
+                Provenance.objects.bulk_create(provenances)
+            self.runs = dict()
+            self.pending = 0
@@ -0,0 +1,172 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Remove records using chunked set-based deletes."""
+
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+from tqdm import tqdm
+
+from machado.loaders.exceptions import ImportingError
+
+# Tables that reference feature.feature_id and usually hold many rows per
+# feature. They are emptied explicitly, one chunk at a time, before the
+# features themselves, so the remaining ON DELETE CASCADE work is small.
+FEATURE_DEPENDENTS = [
+    ("featureloc", "feature_id"),
+    ("featureprop", "feature_id"),
+    ("feature_cvterm", "feature_id"),
+    ("feature_dbxref", "feature_id"),
+    ("feature_synonym", "feature_id"),
+    ("feature_pub", "feature_id"),
+    ("feature_relationship", "subject_id"),
+    ("feature_relationship", "object_id"),
+    ("analysisfeature", "feature_id"),
+    ("fingerprint", "feature_id"),
+    ("feature_density", "srcfeature_id"),
+]
+
+# Columns that reference feature.feature_id with ON DELETE SET NULL. Locations
+# of other features, eg. the subject location of a similarity match of another
+# organism, may be placed on the removed features: they are kept and their
+# reference is set to NULL explicitly, one chunk at a time.
+FEATURE_NULLIFIED = [("featureloc", "srcfeature_id")]
+
+# Features referred to by a chunk of removed rows, whose search documents are
+# recorded as changed when there's an index_update, see ChunkedRemover.remove
+REMOVED_FEATURES_SQL = {
+    "feature": "SELECT unnest(%s::bigint[])",
+    "analysisfeature": (
+        "SELECT feature_id FROM analysisfeature WHERE analysisfeature_id = ANY(%s)"
+    ),
+}
+
+
+class ChunkedRemover(object):
+    """Remove large sets of rows without loading them into memory.
+
+    The primary keys of the rows to be removed are first staged, server side,
+    in a temporary table. They are then consumed in chunks of chunk_size: for
+    every chunk the dependent rows are deleted followed by the rows
+    themselves, and the chunk is committed. Memory stays bounded by the chunk
+    size. The ON DELETE CASCADE and SET NULL actions run within each delete
+    statement, and the INITIALLY DEFERRED foreign key checks of a chunk run
+    when it is committed, so each transaction only carries a single chunk.
+
+    If index_update (see machado.indexing.start_index_update) is set, the
+    features whose search documents are changed by each chunk of
+    REMOVED_FEATURES_SQL tables are stored, server side, before the chunk is
+    removed.
+    """
+
+    def __init__(
+        self, chunk_size: int = 10000, verbosity: int = 1, index_update=None
+    ) -> None:
+        """Execute the init function."""
+        if chunk_size < 1:
+            raise ImportingError("The chunk size must be a positive integer")
+        self.chunk_size = chunk_size
+        self.verbosity = verbosity
+        self.index_update = index_update
+        self.counts: Dict[str, int] = dict()
+
+    def _count(self, table: str, rowcount: int) -> None:
+        """Update the number of rows removed from a table."""
+        self.counts[table] = self.counts.get(table, 0) + max(rowcount, 0)
+
+    def remove(
+        self,
+        table: str,
+        pk: str,
+        select_sql: str,
+        params: List = None,
+        dependents: List[Tuple[str, str]] = None,
+        nullified: List[Tuple[str, str]] = None,
+        desc: str = None,
+    ) -> int:
+        """Remove the rows of table whose pk is returned by select_sql.
+
+        select_sql must return a single column of primary keys. dependents is
+        a list of (table, column) pairs, in dependency order, whose column
+        references the primary key being removed. The columns of nullified,
+        in the same format, are set to NULL instead.
+        """
+        staging = "machado_remove_{}".format(table)
+        pop_sql = (
+            "DELETE FROM {0} WHERE id IN "
+            "(SELECT id FROM {0} ORDER BY id LIMIT %s) RETURNING id".format(staging)
+        )
+        removed = 0
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TABLE IF EXISTS {}".format(staging))
+            cursor.execute(
+                "CREATE TEMPORARY TABLE {} (id bigint PRIMARY KEY)".format(staging)
+            )
+            cursor.execute(
+                "INSERT INTO {} (id) SELECT DISTINCT ids.id "
+                "FROM ({}) AS ids(id) WHERE ids.id IS NOT NULL".format(
+                    staging, select_sql
+                ),
+                params or [],
+            )
+            total = cursor.rowcount
+            with tqdm(
+                total=total, desc=desc or table, disable=self.verbosity < 1
+            ) as progress:
+                while True:
+                    with transaction.atomic():
+                        cursor.execute(pop_sql, [self.chunk_size])
+                        ids = [row[0] for row in cursor.fetchall()]
+                        if not ids:
+                            break
+                        if (
+                            self.index_update is not None
+                            and table in REMOVED_FEATURES_SQL
+                        ):
+                            self.index_update.add_removed(
+                                REMOVED_FEATURES_SQL[table], [ids]
+                            )
+                        for dep_table, dep_column in dependents or list():
+                            cursor.execute(
+                                "DELETE FROM {} WHERE {} = ANY(%s)".format(
+                                    dep_table, dep_column
+                                ),
+                                [ids],
+                            )
+                            self._count(dep_table, cursor.rowcount)
+                        for dep_table, dep_column in nullified or list():
+                            cursor.execute(
+                                "UPDATE {0} SET {1} = NULL WHERE {1} = ANY(%s)".format(
+                                    dep_table, dep_column
+                                ),
+                                [ids],
+                            )
+                        cursor.execute(
+                            "DELETE FROM {} WHERE {} = ANY(%s)".format(table, pk),
+                            [ids],
+                        )
+                        self._count(table, cursor.rowcount)
+                        removed += cursor.rowcount
+                    progress.update(len(ids))
+            cursor.execute("DROP TABLE IF EXISTS {}".format(staging))
+        return removed
+
+    def remove_organism(self, organism_id: int) -> int:
+        """Remove an organism, its features and every child record."""
+        removed = self.remove(
+            table="feature",
+            pk="feature_id",
+            select_sql="SELECT feature_id FROM feature WHERE organism_id = %s",
+            params=[organism_id],
+            dependents=FEATURE_DEPENDENTS,
+            nullified=FEATURE_NULLIFIED,
+            desc="Features",
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("DELETE FROM organism WHERE organism_id = %s", [organism_id])
+            self._count("organism", cursor.rowcount)
+        return removed
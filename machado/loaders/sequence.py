@@ -15,6 +15,7 @@ from django.db.utils import IntegrityError
 
 from machado.loaders.common import retrieve_feature_id
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.models import Cvterm, Db, Dbxref, Dbxrefprop, Feature, FeaturePub, Organism
 from machado.models import PubDbxref
 
@@ -29,8 +30,10 @@ class SequenceLoader(object):
         doi: str = None,
         description: str = None,
         url: str = None,
+        provenance: ProvenanceRecorder = None,
     ) -> None:
         """Execute the init function."""
+        self.provenance = provenance
         # Save DB file info
         self.db, created = Db.objects.get_or_create(
             name="FASTA_SOURCE", description=description, url=url
@@ -74,11 +77,13 @@ class SequenceLoader(object):
             dbxref, created = Dbxref.objects.get_or_create(
                 db=self.db, accession=seq_obj.id
             )
-            Dbxrefprop.objects.get_or_create(
+            dbxrefprop, created = Dbxrefprop.objects.get_or_create(
                 dbxref=dbxref,
                 type_id=self.cvterm_contained_in.cvterm_id,
                 rank=0,
             )
+            if created and self.provenance is not None:
+                self.provenance.add("dbxrefprop", dbxrefprop.dbxrefprop_id)
             retrieve_feature_id(
                 accession=seq_obj.id, soterm=soterm, organism=self.organism
             )
@@ -112,6 +117,8 @@ class SequenceLoader(object):
                 timelastmodified=datetime.now(timezone.utc),
             )
             feature.save()
+            if self.provenance is not None:
+                self.provenance.add("feature", feature.feature_id)
 
             # DOI: try to link sequence to publication's DOI
             if feature and self.pub_dbxref_doi:
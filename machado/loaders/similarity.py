@@ -13,13 +13,15 @@ from typing import Optional
 
 from Bio import BiopythonWarning
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
 from django.db.models import Max
 from django.db.utils import IntegrityError
 
 from machado.loaders.analysis import AnalysisLoader
 from machado.loaders.common import retrieve_feature_id, retrieve_organism
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cvterm, Feature, Featureloc
+from machado.loaders.provenance import ProvenanceRecorder
+from machado.models import Analysis, Cvterm, Feature, Featureloc
 from machado.models import FeatureCvterm, FeatureCvtermprop
 from machado.models import FeatureRelationship, FeatureRelationshipprop
 
@@ -46,8 +48,11 @@ class SimilarityLoader(object):
         algorithm: str = None,
         name: str = None,
         description: str = None,
+        provenance: ProvenanceRecorder = None,
+        resume: bool = False,
     ) -> None:
         """Execute the init function."""
+        self.provenance = provenance
         try:
             self.org_query = retrieve_organism(org_query)
             self.org_subject = retrieve_organism(org_subject)
@@ -64,20 +69,28 @@ class SimilarityLoader(object):
                 name="located in", cv__name="relationship"
             )
             self.analysis_loader = AnalysisLoader()
-            self.analysis = self.analysis_loader.store_analysis(
-                algorithm=algorithm,
-                name=name,
-                description=description,
-                sourcename=filename,
-                filename=filename,
-                program=program,
-                programversion=programversion,
-                timeexecuted=datetime.now(),
-            )
+            if resume:
+                # keep loading into the analysis of the interrupted load
+                self.analysis = Analysis.objects.get(
+                    program=program, programversion=programversion, sourcename=filename
+                )
+            else:
+                self.analysis = self.analysis_loader.store_analysis(
+                    algorithm=algorithm,
+                    name=name,
+                    description=description,
+                    sourcename=filename,
+                    filename=filename,
+                    program=program,
+                    programversion=programversion,
+                    timeexecuted=datetime.now(),
+                )
         except IntegrityError as e:
             raise ImportingError(e)
         except ObjectDoesNotExist as e:
             raise ImportingError(e)
+        if self.provenance is not None and not resume:
+            self.provenance.add("analysis", self.analysis.analysis_id)
 
     def retrieve_id_from_description(self, description: str) -> Optional[str]:
         """Retrieve ID from description."""
@@ -168,6 +181,8 @@ class SimilarityLoader(object):
             )
         except IntegrityError as e:
             raise ImportingError(e)
+        if self.provenance is not None:
+            self.provenance.add("feature", match_part_feature.feature_id)
 
         Featureloc.objects.create(
             feature=match_part_feature,
@@ -263,6 +278,7 @@ class SimilarityLoader(object):
                     defaults={"rank": rank},
                 )
 
+    @transaction.atomic
     def store_bio_searchio_query_result(self, query_result: query.QueryResult) -> None:
         """Store bio_searchio_query_result."""
         for hsp_item in query_result.hsps:
@@ -0,0 +1,146 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Build search index."""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from haystack import connections as haystack_connections
+from tqdm import tqdm
+
+from machado.indexing import INDEX_CHUNK_SIZE, build_search_partition
+from machado.indexing import get_index_partitions, init_index_worker
+from machado.loaders.common import retrieve_organism
+from machado.models import Feature, History
+
+
+class Command(BaseCommand):
+    """Build search index."""
+
+    help = "Index the features in partitions of feature IDs, by parallel processes"
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument("--cpu", help="Number of processes", default=1, type=int)
+        parser.add_argument(
+            "--partitions",
+            help="Number of partitions (default: 8 per process)",
+            type=int,
+        )
+        parser.add_argument(
+            "--batchsize",
+            help="Number of features per batch",
+            default=INDEX_CHUNK_SIZE,
+            type=int,
+        )
+        parser.add_argument(
+            "--retries",
+            help="Number of times a failed partition is retried",
+            default=2,
+            type=int,
+        )
+        parser.add_argument(
+            "--organism",
+            help="Index only the features of this species (eg. Homo sapiens)",
+            type=str,
+        )
+        parser.add_argument(
+            "--clear",
+            help="Remove every feature document before indexing",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--using", help="Haystack connection", default="default", type=str
+        )
+
+    def handle(
+        self,
+        cpu: int = 1,
+        partitions: int = None,
+        batchsize: int = INDEX_CHUNK_SIZE,
+        retries: int = 2,
+        organism: str = None,
+        clear: bool = False,
+        using: str = "default",
+        verbosity: int = 1,
+        **options
+    ):
+        """Execute the main function."""
+        history_obj = History()
+        history_obj.start(command="build_search_index", params=locals())
+        if cpu < 1 or batchsize < 1 or retries < 0:
+            history_obj.failure(description="Invalid arguments")
+            raise CommandError(
+                "The cpu and batch size must be positive, and the retries not negative"
+            )
+
+        organism_id = None
+        if organism is not None:
+            try:
+                organism_id = retrieve_organism(organism).organism_id
+            except ObjectDoesNotExist:
+                history_obj.failure(description="Organism does not exist")
+                raise CommandError("Organism does not exist in database!")
+
+        index = haystack_connections[using].get_unified_index().get_index(Feature)
+        queryset = index.index_queryset(using=using)
+        if organism_id is not None:
+            queryset = queryset.filter(organism_id=organism_id)
+        feature_partitions = get_index_partitions(queryset, partitions or cpu * 8)
+        total = sum(len(partition) for partition in feature_partitions)
+        if verbosity > 0:
+            self.stdout.write(
+                "{} features in {} partitions".format(total, len(feature_partitions))
+            )
+        if clear:
+            haystack_connections[using].get_backend().clear(models=[Feature])
+
+        # the workers are forked, so they must not share the database connection
+        connections.close_all()
+        pool = ProcessPoolExecutor(
+            max_workers=cpu,
+            mp_context=get_context("fork"),
+            initializer=init_index_worker,
+            initargs=(using,),
+        )
+        tasks = dict()
+        for i, partition in enumerate(feature_partitions):
+            task = pool.submit(build_search_partition, partition, batchsize, using)
+            tasks[task] = (i, 0)
+        indexed = 0
+        failed = list()
+        progress = tqdm(total=total, disable=verbosity < 1)
+        while tasks:
+            for task in as_completed(list(tasks)):
+                i, tries = tasks.pop(task)
+                # the exceptions of the search backends are not known here
+                try:
+                    indexed += task.result()
+                    progress.update(len(feature_partitions[i]))
+                except Exception as e:
+                    if tries < retries:
+                        retry = pool.submit(
+                            build_search_partition,
+                            feature_partitions[i],
+                            batchsize,
+                            using,
+                        )
+                        tasks[retry] = (i, tries + 1)
+                    else:
+                        failed.append("partition {}: {}".format(i, e))
+        progress.close()
+        pool.shutdown()
+
+        if failed:
+            history_obj.failure(description="; ".join(failed))
+            raise CommandError("Failed partitions: {}".format("; ".join(failed)))
+        history_obj.success(description="{} documents indexed".format(indexed))
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,39 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Check file."""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from machado.loaders.provenance import provenance_summary
+
+import os
+
+
+class Command(BaseCommand):
+    """Check file."""
+
+    help = "List the records created by a file load"
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument("--name", help="File name", required=True, type=str)
+
+    def handle(self, name: str, verbosity: int = 1, **options) -> None:
+        """Execute the main function."""
+        filename = os.path.basename(name)
+        summary = provenance_summary(filename)
+        if not summary:
+            raise CommandError("No provenance registered for {}".format(filename))
+
+        for item in summary:
+            self.stdout.write(
+                "history {history}: {table} {rows} rows in {ranges} ranges "
+                "({min_id}-{max_id})".format(**item)
+            )
+
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("Done"))
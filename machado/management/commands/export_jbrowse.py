@@ -0,0 +1,112 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Export JBrowse data."""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from tqdm import tqdm
+
+from machado.loaders.common import retrieve_organism
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.jbrowse import JBrowseExporter
+from machado.models import History
+
+
+class Command(BaseCommand):
+    """Export JBrowse data."""
+
+    help = "Export static JBrowse data (refSeqs, names and NCList tracks)"
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument(
+            "--organism",
+            help="Species name (eg. Homo sapiens, Mus musculus)",
+            required=True,
+            type=str,
+        )
+        parser.add_argument(
+            "--output",
+            help="JBrowse data directory (eg. /var/www/html/jbrowse/data/Mus musculus)",
+            required=True,
+            type=str,
+        )
+        parser.add_argument(
+            "--soterm",
+            help="SO Sequence Ontology Term of the reference sequences "
+            "(eg. chromosome, assembly)",
+            required=True,
+            type=str,
+        )
+        parser.add_argument(
+            "--tracks",
+            help="Comma separated SO terms of the feature tracks",
+            default="gene,mRNA,CDS,SNV",
+            type=str,
+        )
+        parser.add_argument(
+            "--chunksize",
+            help="Number of top level features per NCList chunk",
+            default=2000,
+            type=int,
+        )
+        parser.add_argument("--cpu", help="Number of threads", default=1, type=int)
+
+    def handle(
+        self,
+        organism: str,
+        output: str,
+        soterm: str,
+        tracks: str = "gene,mRNA,CDS,SNV",
+        chunksize: int = 2000,
+        cpu: int = 1,
+        verbosity: int = 1,
+        **options
+    ) -> None:
+        """Execute the main function."""
+        history_obj = History()
+        history_obj.start(command="export_jbrowse", params=locals())
+
+        try:
+            organism_obj = retrieve_organism(organism)
+            exporter = JBrowseExporter(
+                organism=organism_obj,
+                path=output,
+                soterms=[item.strip() for item in tracks.split(",") if item.strip()],
+                chunk_size=chunksize,
+            )
+            refseqs = exporter.retrieve_refseqs(soterm)
+            exporter.export_refseqs(refseqs)
+        except ObjectDoesNotExist as e:
+            history_obj.failure(description=str(e))
+            raise CommandError("Organism does not exist in database!")
+        except ImportingError as e:
+            history_obj.failure(description=str(e))
+            raise CommandError(e)
+
+        pool = ThreadPoolExecutor(max_workers=cpu)
+        tasks = list()
+        for refseq in refseqs:
+            tasks.append(pool.submit(exporter.export_refseq, refseq))
+        if verbosity > 0:
+            self.stdout.write("Exporting")
+        for task in tqdm(as_completed(tasks), total=len(tasks)):
+            try:
+                task.result()
+            except ImportingError as e:
+                history_obj.failure(description=str(e))
+                raise CommandError(e)
+        pool.shutdown()
+
+        exporter.export_names()
+        exporter.export_tracklist()
+
+        history_obj.success(description="Done")
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -14,6 +14,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, FieldsValidator
 from machado.loaders.common import get_num_lines
 from machado.loaders.common import retrieve_organism
@@ -67,6 +68,7 @@ The features need to be loaded previously or won't be registered."""
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_coexpression_clusters", params=locals())
+        start_index_update(history_obj)
         filename = os.path.basename(file)
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
@@ -14,6 +14,7 @@ from django.db.utils import IntegrityError
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, FieldsValidator, retrieve_organism
 from machado.loaders.common import get_num_lines
 from machado.loaders.exceptions import ImportingError
@@ -67,6 +68,7 @@ The feature pairs from columns 1 and 2 need to be loaded previously."""
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_relations_coexpression_pairs", params=locals())
+        start_index_update(history_obj)
 
         filename = os.path.basename(file)
         if verbosity > 0:
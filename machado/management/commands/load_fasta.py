@@ -14,8 +14,10 @@ from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
 from machado.models import History
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.loaders.sequence import SequenceLoader
 
 
@@ -74,6 +76,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_fasta", params=locals())
+        start_index_update(history_obj)
 
         if verbosity > 0:
             self.stdout.write("Preprocessing")
@@ -87,6 +90,7 @@ class Command(BaseCommand):
 
         # retrieve only the file name
         filename = os.path.basename(file)
+        provenance = ProvenanceRecorder(history=history_obj, filename=filename)
         try:
             sequence_file = SequenceLoader(
                 filename=filename,
@@ -94,29 +98,36 @@ class Command(BaseCommand):
                 description=description,
                 url=url,
                 doi=doi,
+                provenance=provenance,
             )
         except ImportingError as e:
             raise CommandError(e)
 
-        fasta_sequences = SeqIO.parse(open(file), "fasta")
+        try:
+            fasta_sequences = SeqIO.parse(open(file), "fasta")
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        for fasta in fasta_sequences:
-            tasks.append(
-                pool.submit(
-                    sequence_file.store_biopython_seq_record,
-                    fasta,
-                    soterm,
-                    nosequence,
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
+            for fasta in fasta_sequences:
+                tasks.append(
+                    pool.submit(
+                        sequence_file.store_biopython_seq_record,
+                        fasta,
+                        soterm,
+                        nosequence,
+                    )
                 )
-            )
-        if verbosity > 0:
-            self.stdout.write("Loading")
-        for task in tqdm(as_completed(tasks), total=len(tasks)):
-            if task.result():
-                raise (task.result())
-        pool.shutdown()
+            if verbosity > 0:
+                self.stdout.write("Loading")
+            for task in tqdm(as_completed(tasks), total=len(tasks)):
+                try:
+                    task.result()
+                except ImportingError as e:
+                    history_obj.failure(description=str(e))
+                    raise CommandError(e)
+            pool.shutdown()
+        finally:
+            provenance.flush()
 
         history_obj.success(description="Done")
         if verbosity > 0:
@@ -15,6 +15,7 @@ from django.db.utils import IntegrityError
 from tqdm import tqdm
 
 from machado.models import History
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
@@ -84,6 +85,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_feature_annotation", params=locals())
+        start_index_update(history_obj)
         if verbosity > 0:
             self.stdout.write("Preprocessing")
 
@@ -13,6 +13,7 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
@@ -59,6 +60,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_feature_publication", params=locals())
+        start_index_update(history_obj)
         if verbosity > 0:
             self.stdout.write("Preprocessing")
 
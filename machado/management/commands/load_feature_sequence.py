@@ -13,6 +13,7 @@ from Bio import SeqIO
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, retrieve_organism
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.sequence import SequenceLoader
@@ -53,6 +54,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_feature_sequence", params=locals())
+        start_index_update(history_obj)
         try:
             FileValidator().validate(file)
             organism = retrieve_organism(organism)
@@ -14,10 +14,15 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
+from machado.loaders.checkpoint import CheckpointRecorder
 from machado.loaders.common import FileValidator, get_num_lines, retrieve_organism
+from machado.loaders.density import refresh_feature_densities
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
-from machado.models import History
+from machado.loaders.provenance import ProvenanceRecorder
+from machado.loaders.remove import ChunkedRemover, FEATURE_DEPENDENTS
+from machado.models import Fingerprint, History
 
 
 class Command(BaseCommand):
@@ -59,6 +64,29 @@ class Command(BaseCommand):
             required=False,
             type=str,
         )
+        parser.add_argument(
+            "--delta",
+            help="Set this flag to apply only the changes of a new release of "
+            "a file that was already loaded",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--changes",
+            help="Output file listing the feature_ids changed by --delta",
+            required=False,
+            type=str,
+        )
+        parser.add_argument(
+            "--resume",
+            help="Set this flag to resume an interrupted load of the file",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Number of records between checkpoints",
+            default=10000,
+            type=int,
+        )
         parser.add_argument("--cpu", help="Number of threads", default=1, type=int)
 
     def handle(
@@ -68,6 +96,10 @@ class Command(BaseCommand):
         doi: str = None,
         ignore: str = None,
         qtl: bool = False,
+        delta: bool = False,
+        changes: str = None,
+        resume: bool = False,
+        checkpoint: int = 10000,
         cpu: int = 1,
         verbosity: int = 1,
         **options
@@ -76,10 +108,15 @@ class Command(BaseCommand):
         # retrieve only the file name
         history_obj = History()
         history_obj.start(command="load_gff", params=locals())
+        index_update = start_index_update(history_obj)
         filename = os.path.basename(file)
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
 
+        if delta and resume:
+            history_obj.failure(description="--resume cannot be used with --delta")
+            raise CommandError("--resume cannot be used with --delta")
+
         try:
             FileValidator().validate(file)
             organism = retrieve_organism(organism)
@@ -101,30 +138,116 @@ class Command(BaseCommand):
                 history_obj.failure(description="No index found (.tbi/.csi)")
                 raise CommandError("No index found (.tbi/.csi)")
 
+        provenance = ProvenanceRecorder(history=history_obj, filename=filename)
         try:
             feature_file = FeatureLoader(
-                filename=filename, source="GFF_SOURCE", organism=organism, doi=doi
+                filename=filename,
+                source="GFF_SOURCE",
+                organism=organism,
+                doi=doi,
+                provenance=provenance,
             )
         except ImportingError as e:
             history_obj.failure(description=str(e))
             raise CommandError(e)
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-
-        chunk_size = cpu * 2
+        try:
+            checkpoint_obj = CheckpointRecorder(
+                history=history_obj,
+                command="load_gff",
+                filename=filename,
+                interval=checkpoint,
+                resume=resume,
+                provenance=provenance,
+            )
+        except ImportingError as e:
+            history_obj.failure(description=str(e))
+            raise CommandError(e)
 
-        # Load the GFF3 file
-        with open(file) as tbx_file:
-            tbx = pysam.TabixFile(filename=tbx_file.name, index=index_file)
-            for row in tqdm(tbx.fetch(parser=pysam.asGTF()), total=get_num_lines(file)):
-                if ignore is not None and row.feature in ignore:
-                    continue
-                tasks.append(
-                    pool.submit(feature_file.store_tabix_GFF_feature, row, qtl)
+        try:
+            # Resume: roll back the features created after the last checkpoint
+            uniquenames = dict()
+            if resume:
+                if verbosity > 0:
+                    self.stdout.write(
+                        "Resuming from record {}".format(checkpoint_obj.start)
+                    )
+                ChunkedRemover(verbosity=verbosity).remove(
+                    table="feature",
+                    pk="feature_id",
+                    select_sql="SELECT f.feature_id FROM feature f "
+                    "JOIN dbxrefprop dp ON dp.dbxref_id = f.dbxref_id "
+                    "WHERE dp.value = %s AND f.feature_id > %s",
+                    params=[filename, checkpoint_obj.last_id or 0],
+                    dependents=FEATURE_DEPENDENTS,
+                    desc="Rolling back",
                 )
+                uniquenames = feature_file.retrieve_tabix_GFF_uniquenames()
+
+            # Delta: key -> (feature_id, fingerprint) of the records already loaded
+            stored = dict()
+            seen = set()
+            if delta:
+                for key, feature_id, fingerprint in Fingerprint.objects.filter(
+                    filename=filename
+                ).values_list("key", "feature_id", "fingerprint"):
+                    stored[key] = (feature_id, fingerprint)
+                if not stored:
+                    history_obj.failure(description="No fingerprints registered")
+                    raise CommandError(
+                        "No fingerprints registered for {}. It must be loaded "
+                        "without --delta".format(filename)
+                    )
+                feature_file.changes = list()
+
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
 
-                if len(tasks) >= chunk_size:
+            chunk_size = cpu * 2
+
+            # Load the GFF3 file
+            with open(file) as tbx_file:
+                tbx = pysam.TabixFile(filename=tbx_file.name, index=index_file)
+                record = 0
+                for row in tqdm(
+                    tbx.fetch(parser=pysam.asGTF()), total=get_num_lines(file)
+                ):
+                    record += 1
+                    if ignore is not None and row.feature in ignore:
+                        continue
+                    if record <= checkpoint_obj.start:
+                        feature_file.restore_tabix_GFF_relationships(row, uniquenames)
+                        continue
+                    checkpoint_obj.count("features")
+                    if delta:
+                        key, fingerprint = feature_file.get_tabix_GFF_fingerprint(row)
+                        seen.add(key)
+                        if key in stored:
+                            feature_id, stored_fingerprint = stored[key]
+                            if fingerprint != stored_fingerprint:
+                                tasks.append(
+                                    pool.submit(
+                                        feature_file.update_tabix_GFF_feature,
+                                        feature_id,
+                                        row,
+                                        qtl,
+                                    )
+                                )
+                            continue
+                    tasks.append(
+                        pool.submit(feature_file.store_tabix_GFF_feature, row, qtl)
+                    )
+
+                    if len(tasks) >= chunk_size:
+                        for task in as_completed(tasks):
+                            try:
+                                task.result()
+                            except ImportingError as e:
+                                history_obj.failure(description=str(e))
+                                raise CommandError(e)
+                        tasks.clear()
+                        checkpoint_obj.save(record, contig=row.contig)
+                else:
                     for task in as_completed(tasks):
                         try:
                             task.result()
@@ -132,47 +255,73 @@ class Command(BaseCommand):
                             history_obj.failure(description=str(e))
                             raise CommandError(e)
                     tasks.clear()
-            else:
-                for task in as_completed(tasks):
-                    try:
-                        task.result()
-                    except ImportingError as e:
-                        history_obj.failure(description=str(e))
-                        raise CommandError(e)
-                tasks.clear()
+                    checkpoint_obj.save(record, force=True)
 
-        pool.shutdown()
+            pool.shutdown()
 
-        if verbosity > 0:
-            self.stdout.write("Loading relationships")
+            if delta:
+                feature_file.obsolete_tabix_GFF_features(
+                    [
+                        feature_id
+                        for key, (feature_id, fingerprint) in stored.items()
+                        if key not in seen and fingerprint
+                    ]
+                )
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
+            if verbosity > 0:
+                self.stdout.write("Loading relationships")
 
-        for item in feature_file.relationships:
-            tasks.append(
-                pool.submit(
-                    feature_file.store_relationship,
-                    item["subject_id"],
-                    item["object_id"],
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
+
+            for item in feature_file.relationships:
+                tasks.append(
+                    pool.submit(
+                        feature_file.store_relationship,
+                        item["subject_id"],
+                        item["object_id"],
+                    )
                 )
-            )
 
-        for task in tqdm(as_completed(tasks), total=len(tasks)):
-            try:
-                task.result()
-            except ImportingError as e:
-                history_obj.failure(description=str(e))
-                raise CommandError(e)
-        pool.shutdown()
-
-        if feature_file.ignored_attrs is not None:
-            self.stdout.write(
-                self.style.WARNING(
-                    "Ignored attrs: {}".format(feature_file.ignored_attrs)
+            for task in tqdm(as_completed(tasks), total=len(tasks)):
+                try:
+                    task.result()
+                except ImportingError as e:
+                    history_obj.failure(description=str(e))
+                    raise CommandError(e)
+            pool.shutdown()
+
+            if feature_file.ignored_attrs is not None:
+                self.stdout.write(
+                    self.style.WARNING(
+                        "Ignored attrs: {}".format(feature_file.ignored_attrs)
+                    )
                 )
-            )
+        finally:
+            provenance.flush()
 
-        history_obj.success(description="Done")
+        description = "Done"
+        if delta:
+            counts = dict()
+            for feature_id, action in feature_file.changes:
+                counts[action] = counts.get(action, 0) + 1
+                # the obsoleted features have no new rows
+                if index_update is not None:
+                    index_update.add(feature_id)
+            description = "Done: {}".format(
+                ", ".join(
+                    "{} {}".format(counts[action], action) for action in sorted(counts)
+                )
+                or "no changes"
+            )
+            if changes is not None:
+                with open(changes, "w") as changes_file:
+                    for feature_id, action in feature_file.changes:
+                        changes_file.write("{}\t{}\n".format(feature_id, action))
+            if verbosity > 0:
+                self.stdout.write(description)
+        if not delta or feature_file.changes:
+            refresh_feature_densities([organism.organism_id])
+        history_obj.success(description=description)
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Done with {}".format(filename)))
@@ -13,6 +13,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import MultispeciesFeatureLoader
@@ -38,6 +39,7 @@ The feature members need to be loaded previously."""
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_orthomcl", params=locals())
+        start_index_update(history_obj)
         try:
             FileValidator().validate(file)
         except ImportingError as e:
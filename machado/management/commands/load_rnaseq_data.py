@@ -15,9 +15,11 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.analysis import AnalysisLoader
 from machado.loaders.common import FileValidator, FieldsValidator
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.expression import refresh_feature_expression_samples
 from machado.models import History
 
 
@@ -111,6 +113,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_rnaseq_data", params=locals())
+        start_index_update(history_obj)
         filename = os.path.basename(file)
         if verbosity > 0:
             self.stdout.write("Processing file: {}".format(filename))
@@ -227,6 +230,7 @@ class Command(BaseCommand):
             for item in not_found:
                 self.stdout.write(f"{item}\n")
 
+        refresh_feature_expression_samples()
         history_obj.success(description="Done")
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Done."))
@@ -17,6 +17,7 @@ from machado.loaders.biomaterial import BiomaterialLoader
 from machado.loaders.common import FileValidator, FieldsValidator
 from machado.loaders.common import retrieve_organism
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.expression import refresh_feature_expression_samples
 from machado.loaders.project import ProjectLoader
 from machado.loaders.treatment import TreatmentLoader
 from machado.models import History
@@ -166,6 +167,7 @@ class Command(BaseCommand):
                 history_obj.failure(description=str(e))
                 raise CommandError(e)
 
+        refresh_feature_expression_samples()
         history_obj.success(description="Done")
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Done with {}".format(filename)))
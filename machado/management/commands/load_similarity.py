@@ -13,8 +13,13 @@ from Bio import SearchIO
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
+from machado.loaders.checkpoint import CheckpointRecorder
 from machado.loaders.common import FileValidator
+from machado.loaders.density import refresh_feature_densities
 from machado.loaders.exceptions import ImportingError
+from machado.loaders.provenance import ProvenanceRecorder
+from machado.loaders.remove import ChunkedRemover, FEATURE_DEPENDENTS
 from machado.loaders.similarity import SimilarityLoader
 from machado.models import History
 
@@ -74,6 +79,17 @@ class Command(BaseCommand):
             "--description", help="Description", required=False, type=str
         )
         parser.add_argument("--algorithm", help="Algorithm", required=False, type=str)
+        parser.add_argument(
+            "--resume",
+            help="Set this flag to resume an interrupted load of the file",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Number of records between checkpoints",
+            default=10000,
+            type=int,
+        )
         parser.add_argument("--cpu", help="Number of threads", default=1, type=int)
 
     def handle(
@@ -89,6 +105,8 @@ class Command(BaseCommand):
         name: str = None,
         description: str = None,
         algorithm: str = None,
+        resume: bool = False,
+        checkpoint: int = 10000,
         cpu: int = 1,
         verbosity: int = 1,
         **options
@@ -96,6 +114,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_similarity", params=locals())
+        start_index_update(history_obj)
         filename = os.path.basename(file)
         if organism_query == "mutispecies multispecies":
             history_obj.failure(description="Query's organism cannot be multispecies")
@@ -106,6 +125,7 @@ class Command(BaseCommand):
             raise CommandError(
                 "The format is not valid. Please choose: {}".format(VALID_FORMAT)
             )
+        provenance = ProvenanceRecorder(history=history_obj, filename=filename)
         try:
             FileValidator().validate(file)
             similarity_file = SimilarityLoader(
@@ -120,6 +140,16 @@ class Command(BaseCommand):
                 program=program,
                 programversion=programversion,
                 input_format=format,
+                provenance=provenance,
+                resume=resume,
+            )
+            checkpoint_obj = CheckpointRecorder(
+                history=history_obj,
+                command="load_similarity",
+                filename=filename,
+                interval=checkpoint,
+                resume=resume,
+                provenance=provenance,
             )
             similarity_records = SearchIO.parse(file, format)
         except ImportingError as e:
@@ -129,25 +159,67 @@ class Command(BaseCommand):
             history_obj.failure(description=str(e))
             return CommandError(e)
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-        if verbosity > 0:
-            self.stdout.write("Processing file: {}".format(filename))
-        for record in similarity_records:
-            if len(record.hsps) > 0:
+        try:
+            # Resume: roll back the matches created after the last checkpoint
+            if resume:
+                if verbosity > 0:
+                    self.stdout.write(
+                        "Resuming from record {}".format(checkpoint_obj.start)
+                    )
+                ChunkedRemover(verbosity=verbosity).remove(
+                    table="feature",
+                    pk="feature_id",
+                    select_sql="SELECT feature_id FROM analysisfeature "
+                    "WHERE analysis_id = %s AND feature_id > %s",
+                    params=[
+                        similarity_file.analysis.analysis_id,
+                        checkpoint_obj.last_id or 0,
+                    ],
+                    dependents=FEATURE_DEPENDENTS,
+                    desc="Rolling back",
+                )
+
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
+
+            chunk_size = cpu * 2
+
+            if verbosity > 0:
+                self.stdout.write("Processing file: {}".format(filename))
+            record = 0
+            for item in tqdm(similarity_records, disable=verbosity < 1):
+                record += 1
+                if record <= checkpoint_obj.start or len(item.hsps) == 0:
+                    continue
+                checkpoint_obj.count("queries")
+                checkpoint_obj.count("hsps", len(item.hsps))
                 tasks.append(
-                    pool.submit(similarity_file.store_bio_searchio_query_result, record)
+                    pool.submit(similarity_file.store_bio_searchio_query_result, item)
                 )
-        if verbosity > 0:
-            self.stdout.write("Loading")
-        for task in tqdm(as_completed(tasks), total=len(tasks)):
-            try:
-                task.result()
-            except ImportingError as e:
-                history_obj.failure(description=str(e))
-                raise CommandError(e)
-        pool.shutdown()
 
+                if len(tasks) >= chunk_size:
+                    for task in as_completed(tasks):
+                        try:
+                            task.result()
+                        except ImportingError as e:
+                            history_obj.failure(description=str(e))
+                            raise CommandError(e)
+                    tasks.clear()
+                    checkpoint_obj.save(record)
+            else:
+                for task in as_completed(tasks):
+                    try:
+                        task.result()
+                    except ImportingError as e:
+                        history_obj.failure(description=str(e))
+                        raise CommandError(e)
+                tasks.clear()
+                checkpoint_obj.save(record, force=True)
+            pool.shutdown()
+        finally:
+            provenance.flush()
+
+        refresh_feature_densities([similarity_file.org_query.organism_id])
         history_obj.success(description="Done")
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Done with {}".format(filename)))
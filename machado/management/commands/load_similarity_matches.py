@@ -15,6 +15,7 @@ from Bio import SearchIO
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import MultispeciesFeatureLoader
@@ -46,6 +47,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_similarity_matches", params=locals())
+        start_index_update(history_obj)
         # retrieve only the file name
         try:
             FileValidator().validate(file)
@@ -14,9 +14,12 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
 from machado.loaders.common import FileValidator, get_num_lines, retrieve_organism
+from machado.loaders.density import refresh_feature_densities
 from machado.loaders.exceptions import ImportingError
 from machado.loaders.feature import FeatureLoader
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.models import History
 
 
@@ -61,6 +64,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="load_vcf", params=locals())
+        start_index_update(history_obj)
         # retrieve only the file name
         filename = os.path.basename(file)
         if verbosity > 0:
@@ -87,26 +91,42 @@ class Command(BaseCommand):
                 history_obj.failure(description="No index found (.tbi/.csi)")
                 raise CommandError("No index found (.tbi/.csi)")
 
+        provenance = ProvenanceRecorder(history=history_obj, filename=filename)
         try:
             feature_file = FeatureLoader(
-                filename=filename, source="VCF_SOURCE", organism=organism, doi=doi
+                filename=filename,
+                source="VCF_SOURCE",
+                organism=organism,
+                doi=doi,
+                provenance=provenance,
             )
         except ImportingError as e:
             history_obj.failure(description=str(e))
             raise CommandError(e)
 
-        pool = ThreadPoolExecutor(max_workers=cpu)
-        tasks = list()
-
-        chunk_size = cpu * 2
-
-        # Load the GFF3 file
-        with open(file) as tbx_file:
-            tbx = pysam.TabixFile(filename=tbx_file.name, index=index_file)
-            for row in tqdm(tbx.fetch(parser=pysam.asVCF()), total=get_num_lines(file)):
-                tasks.append(pool.submit(feature_file.store_tabix_VCF_feature, row))
-
-                if len(tasks) >= chunk_size:
+        try:
+            pool = ThreadPoolExecutor(max_workers=cpu)
+            tasks = list()
+
+            chunk_size = cpu * 2
+
+            # Load the GFF3 file
+            with open(file) as tbx_file:
+                tbx = pysam.TabixFile(filename=tbx_file.name, index=index_file)
+                for row in tqdm(
+                    tbx.fetch(parser=pysam.asVCF()), total=get_num_lines(file)
+                ):
+                    tasks.append(pool.submit(feature_file.store_tabix_VCF_feature, row))
+
+                    if len(tasks) >= chunk_size:
+                        for task in as_completed(tasks):
+                            try:
+                                task.result()
+                            except ImportingError as e:
+                                history_obj.failure(description=str(e))
+                                raise CommandError(e)
+                        tasks.clear()
+                else:
                     for task in as_completed(tasks):
                         try:
                             task.result()
@@ -114,17 +134,12 @@ class Command(BaseCommand):
                             history_obj.failure(description=str(e))
                             raise CommandError(e)
                     tasks.clear()
-            else:
-                for task in as_completed(tasks):
-                    try:
-                        task.result()
-                    except ImportingError as e:
-                        history_obj.failure(description=str(e))
-                        raise CommandError(e)
-                tasks.clear()
 
-        pool.shutdown()
+            pool.shutdown()
+        finally:
+            provenance.flush()
 
+        refresh_feature_densities([organism.organism_id])
         history_obj.success(description="Done")
         if verbosity > 0:
             self.stdout.write(self.style.SUCCESS("Done with {}".format(filename)))
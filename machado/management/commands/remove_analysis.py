@@ -10,6 +10,9 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from tqdm import tqdm
 
+from machado.indexing import start_index_update
+from machado.loaders.density import refresh_feature_densities
+from machado.loaders.expression import refresh_feature_expression_samples
 from machado.models import Acquisition, Analysisprop, Analysis, Analysisfeature
 from machado.models import Cvterm, Feature, Featureloc
 from machado.models import FeatureCvterm, FeatureCvtermprop
@@ -36,6 +39,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_analysis", params=locals())
+        index_update = start_index_update(history_obj)
         if verbosity > 0:
             self.stdout.write(
                 "Deleting {} and every child record (CASCADE)".format(name)
@@ -49,6 +53,7 @@ class Command(BaseCommand):
         )
 
         if analysisprop_list.count() > 0:
+            organism_ids = set()
             for analysisprop in tqdm(
                 analysisprop_list,
                 total=len(analysisprop_list),
@@ -71,6 +76,12 @@ class Command(BaseCommand):
                             type=cvterm_contained_in, value=analysis.sourcename
                         ).values_list("feature_cvterm_id", flat=True)
                     )
+                    if index_update is not None:
+                        index_update.add_queryset(
+                            FeatureCvterm.objects.filter(
+                                feature_cvterm_id__in=cr_ids
+                            ).values_list("feature_id")
+                        )
                     FeatureCvterm.objects.filter(feature_cvterm_id__in=cr_ids).delete()
 
                     fr_ids = list(
@@ -78,6 +89,13 @@ class Command(BaseCommand):
                             type=cvterm_contained_in, value=analysis.sourcename
                         ).values_list("feature_relationship_id", flat=True)
                     )
+                    if index_update is not None:
+                        for field in ["subject_id", "object_id"]:
+                            index_update.add_queryset(
+                                FeatureRelationship.objects.filter(
+                                    feature_relationship_id__in=fr_ids
+                                ).values_list(field)
+                            )
                     FeatureRelationship.objects.filter(
                         feature_relationship_id__in=fr_ids
                     ).delete()
@@ -87,6 +105,17 @@ class Command(BaseCommand):
                             "feature_id", flat=True
                         )
                     )
+                    organism_ids.update(
+                        Feature.objects.filter(feature_id__in=feature_ids).values_list(
+                            "organism_id", flat=True
+                        )
+                    )
+                    if index_update is not None:
+                        index_update.add_removed(
+                            "SELECT feature_id FROM analysisfeature "
+                            "WHERE analysis_id = %s",
+                            [analysis.analysis_id],
+                        )
                     Featureloc.objects.filter(feature_id__in=feature_ids).delete()
                     # remove only features created by load_similarity
                     # type == match_part
@@ -98,6 +127,8 @@ class Command(BaseCommand):
                     pass
                 # finally removes analysis...
                 analysis.delete()
+            refresh_feature_expression_samples()
+            refresh_feature_densities(organism_ids)
             history_obj.success(description="Done")
             if verbosity > 0:
                 self.stdout.write(self.style.SUCCESS("Done"))
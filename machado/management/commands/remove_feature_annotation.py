@@ -8,6 +8,7 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 
+from machado.indexing import start_index_update
 from machado.loaders.common import retrieve_organism
 from machado.models import Cvterm, Featureprop, History
 
@@ -38,6 +39,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_feature_annotation", params=locals())
+        index_update = start_index_update(history_obj)
         try:
             cvterm_obj = Cvterm.objects.get(name=cvterm, cv__name="feature_property")
         except ObjectDoesNotExist:
@@ -53,6 +55,8 @@ class Command(BaseCommand):
             feature_props = Featureprop.objects.filter(type=cvterm_obj)
 
         count = feature_props.count()
+        if index_update is not None:
+            index_update.add_queryset(feature_props.values_list("feature_id"))
         feature_props.delete()
 
         history_obj.success(description="{} removed".format(count))
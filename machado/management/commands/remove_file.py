@@ -6,14 +6,17 @@
 
 """Remove file."""
 
-from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
+from django.db.models.expressions import RawSQL
+from django.db.utils import DatabaseError
 
-from machado.models import Assay, Assayprop, Analysis, Analysisprop
-from machado.models import Biomaterial, Biomaterialprop
-from machado.models import Feature, Dbxrefprop
-from machado.models import Project, Projectprop, AssayProject
-from machado.models import History
+from machado.indexing import start_index_update
+from machado.loaders.density import refresh_feature_densities
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.expression import refresh_feature_expression_samples
+from machado.loaders.provenance import has_provenance, provenance_sql
+from machado.loaders.remove import ChunkedRemover, FEATURE_DEPENDENTS
+from machado.models import Feature, History, Provenance
 
 import os
 
@@ -26,104 +29,134 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         """Define the arguments."""
         parser.add_argument("--name", help="File name", required=True, type=str)
+        parser.add_argument(
+            "--chunksize",
+            help="Number of records deleted per transaction",
+            default=10000,
+            type=int,
+        )
 
-    def handle(self, name: str, verbosity: int = 0, **options):
+    def handle(self, name: str, chunksize: int = 10000, verbosity: int = 0, **options):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_file", params=locals())
+        index_update = start_index_update(history_obj)
         filename = os.path.basename(name)
-        # Handling Features
-        if verbosity > 1:
-            self.stdout.write(
-                "Features: deleting {} and every "
-                "child record (CASCADE)".format(filename)
-            )
+
+        # Each step is (description, table, primary key, select, dependents).
+        # They run in dependency order and every step is chunked. The select
+        # on the text value of the *prop tables is only used for files loaded
+        # before the provenance table was available.
+        steps = [
+            (
+                "Features",
+                "feature",
+                "feature_id",
+                "SELECT f.feature_id FROM feature f "
+                "JOIN dbxrefprop dp ON dp.dbxref_id = f.dbxref_id "
+                "WHERE dp.value = %s",
+                FEATURE_DEPENDENTS,
+            ),
+            (
+                "Dbxrefprops",
+                "dbxrefprop",
+                "dbxrefprop_id",
+                "SELECT dbxrefprop_id FROM dbxrefprop WHERE value = %s",
+                list(),
+            ),
+            (
+                "Projects",
+                "project",
+                "project_id",
+                "SELECT project_id FROM projectprop WHERE value = %s",
+                [("assay_project", "project_id"), ("projectprop", "project_id")],
+            ),
+            (
+                "Assay",
+                "assay",
+                "assay_id",
+                "SELECT assay_id FROM assayprop WHERE value = %s",
+                [("assay_project", "assay_id"), ("assayprop", "assay_id")],
+            ),
+            (
+                "Biomaterial",
+                "biomaterial",
+                "biomaterial_id",
+                "SELECT biomaterial_id FROM biomaterialprop WHERE value = %s",
+                [("biomaterialprop", "biomaterial_id")],
+            ),
+            (
+                "Analysisfeatures",
+                "analysisfeature",
+                "analysisfeature_id",
+                "SELECT af.analysisfeature_id FROM analysisfeature af "
+                "JOIN analysisprop ap ON ap.analysis_id = af.analysis_id "
+                "WHERE ap.value = %s",
+                list(),
+            ),
+            (
+                "Analysis",
+                "analysis",
+                "analysis_id",
+                "SELECT analysis_id FROM analysisprop WHERE value = %s",
+                [("analysisprop", "analysis_id")],
+            ),
+        ]
+
         try:
-            Feature.objects.filter(
-                dbxref__Dbxrefprop_dbxref_Dbxref__value=filename
-            ).delete()
-            Dbxrefprop.objects.filter(value=filename).delete()
-        except ObjectDoesNotExist as e:
-            history_obj.failure(description=str(e))
-            raise CommandError(
-                "Features: cannot remove {} (not registered)".format(filename)
+            remover = ChunkedRemover(
+                chunk_size=chunksize,
+                verbosity=verbosity,
+                index_update=index_update,
             )
-        # Handling Projects
-        if verbosity > 1:
-            self.stdout.write(
-                "Projects: deleting {} and every "
-                "child record (CASCADE)".format(filename)
-            )
-        try:
-            project_ids = list(
-                Projectprop.objects.filter(value=filename).values_list(
-                    "project_id", flat=True
-                )
-            )
-            AssayProject.objects.filter(project_id__in=project_ids).delete()
-            Project.objects.filter(project_id__in=project_ids).delete()
-            Projectprop.objects.filter(value=filename).delete()
-        except ObjectDoesNotExist as e:
+        except ImportingError as e:
             history_obj.failure(description=str(e))
-            raise CommandError(
-                "Projects: cannot remove {} (not registered)".format(filename)
-            )
-        # Handling Assay
-        if verbosity > 1:
-            self.stdout.write(
-                "Assay: deleting {} and every "
-                "child record (CASCADE)".format(filename)
-            )
-        try:
-            assay_ids = list(
-                Assayprop.objects.filter(value=filename).values_list(
-                    "assay_id", flat=True
+            raise CommandError(e)
+
+        organism_ids = set()
+        for desc, table, pk, select_sql, dependents in steps:
+            if verbosity > 1:
+                self.stdout.write(
+                    "{}: deleting {} and every child record (CASCADE)".format(
+                        desc, filename
+                    )
                 )
-            )
-            AssayProject.objects.filter(assay_id__in=assay_ids).delete()
-            Assay.objects.filter(assay_id__in=assay_ids).delete()
-        except ObjectDoesNotExist as e:
-            history_obj.failure(description=str(e))
-            raise CommandError(
-                "Assays: cannot remove {} (not registered)".format(filename)
-            )
-        # Handling Biomaterial
-        if verbosity > 1:
-            self.stdout.write(
-                "Biomaterial: deleting {} and every "
-                "child record (CASCADE)".format(filename)
-            )
-        try:
-            biomaterial_ids = list(
-                Biomaterialprop.objects.filter(value=filename).values_list(
-                    "biomaterial_id", flat=True
+            try:
+                if has_provenance(filename, table):
+                    select_sql = provenance_sql(table, pk)
+                if table == "feature":
+                    organism_ids.update(
+                        Feature.objects.filter(
+                            feature_id__in=RawSQL(select_sql, [filename])
+                        )
+                        .values_list("organism_id", flat=True)
+                        .distinct()
+                    )
+                remover.remove(
+                    table=table,
+                    pk=pk,
+                    select_sql=select_sql,
+                    params=[filename],
+                    dependents=dependents,
+                    desc=desc,
                 )
-            )
-            Biomaterial.objects.filter(biomaterial_id__in=biomaterial_ids).delete()
-            Biomaterialprop.objects.filter(value=filename).delete()
-        except ObjectDoesNotExist as e:
-            history_obj.failure(description=str(e))
-            raise CommandError(
-                "Biomaterials: cannot remove {} (not registered)".format(filename)
-            )
-        # Handling Analysis
-        if verbosity > 1:
-            self.stdout.write(
-                "Analysis: deleting {} and every "
-                "child record (CASCADE)".format(filename)
-            )
-        try:
-            analysis_ids = list(
-                Analysisprop.objects.filter(value=filename).values_list(
-                    "analysis_id", flat=True
+            except DatabaseError as e:
+                history_obj.failure(description=str(e))
+                raise CommandError(
+                    "{}: cannot remove {} ({})".format(desc, filename, e)
                 )
-            )
-            Analysis.objects.filter(analysis_id__in=analysis_ids).delete()
-        except ObjectDoesNotExist as e:
-            history_obj.failure(description=str(e))
-            raise CommandError(
-                "Analysis: cannot remove {} (not registered)".format(filename)
-            )
+
+        Provenance.objects.filter(filename=filename).delete()
+        if any(
+            remover.counts.get(table)
+            for table in ["assay", "biomaterial", "analysisfeature"]
+        ):
+            refresh_feature_expression_samples()
+        refresh_feature_densities(organism_ids)
+
+        if verbosity > 1:
+            for table, count in remover.counts.items():
+                self.stdout.write("{}: {} rows removed".format(table, count))
 
         history_obj.success(description="Done")
         if verbosity > 0:
@@ -10,9 +10,10 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 
+from machado.indexing import start_index_update
 from machado.models import Cv, Cvterm, CvtermDbxref, Cvtermprop
 from machado.models import Cvtermsynonym, CvtermRelationship
-from machado.models import Dbxref, History
+from machado.models import Dbxref, FeatureCvterm, Featureprop, History
 
 
 class Command(BaseCommand):
@@ -28,6 +29,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_ontology", params=locals())
+        index_update = start_index_update(history_obj)
         try:
             cv = Cv.objects.get(name=name)
             if verbosity > 0:
@@ -37,6 +39,12 @@ class Command(BaseCommand):
             cvterm_ids = list(
                 Cvterm.objects.filter(cv=cv).values_list("cvterm_id", flat=True)
             )
+            if index_update is not None:
+                for queryset in [
+                    FeatureCvterm.objects.filter(cvterm_id__in=cvterm_ids),
+                    Featureprop.objects.filter(type_id__in=cvterm_ids),
+                ]:
+                    index_update.add_queryset(queryset.values_list("feature_id"))
             dbxref_ids = list(
                 CvtermDbxref.objects.filter(cvterm_id__in=cvterm_ids).values_list(
                     "dbxref_id", flat=True
@@ -5,9 +5,14 @@
 # have been included as part of this package for licensing information.
 
 """Remove organism."""
+
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import DatabaseError
+from machado.indexing import start_index_update
 from machado.loaders.common import retrieve_organism
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.remove import ChunkedRemover
 from machado.models import History
 
 
@@ -24,19 +29,38 @@ class Command(BaseCommand):
             required=True,
             type=str,
         )
+        parser.add_argument(
+            "--chunksize",
+            help="Number of features deleted per transaction",
+            default=10000,
+            type=int,
+        )
 
-    def handle(self, organism: str, verbosity: int = 1, **options):
+    def handle(
+        self, organism: str, chunksize: int = 10000, verbosity: int = 1, **options
+    ):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_organism", params=locals())
+        index_update = start_index_update(history_obj)
         try:
             organism_obj = retrieve_organism(organism)
-            if organism_obj:
-                organism_obj.delete()
-                history_obj.success(description="{} removed".format(organism))
-                if verbosity > 0:
-                    self.stdout.write(self.style.SUCCESS("{} removed".format(organism)))
-
+            remover = ChunkedRemover(
+                chunk_size=chunksize,
+                verbosity=verbosity,
+                index_update=index_update,
+            )
+            remover.remove_organism(organism_obj.organism_id)
         except ObjectDoesNotExist as e:
             history_obj.failure(description=str(e))
             raise CommandError("Organism does not exist in database!")
+        except (ImportingError, DatabaseError) as e:
+            history_obj.failure(description=str(e))
+            raise CommandError(e)
+
+        history_obj.success(description="{} removed".format(organism))
+        if verbosity > 1:
+            for table, count in remover.counts.items():
+                self.stdout.write("{}: {} rows removed".format(table, count))
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("{} removed".format(organism)))
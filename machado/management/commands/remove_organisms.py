@@ -8,6 +8,7 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 
+from machado.indexing import start_index_update
 from machado.models import Db, Dbxref, Organism, OrganismDbxref, History
 
 
@@ -26,6 +27,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_organisms", params=locals())
+        index_update = start_index_update(history_obj)
         try:
             db = Db.objects.get(name=dbname)
             dbxref_ids = list(
@@ -36,6 +38,11 @@ class Command(BaseCommand):
                     "organism_id", flat=True
                 )
             )
+            if index_update is not None:
+                index_update.add_removed(
+                    "SELECT feature_id FROM feature WHERE organism_id = ANY(%s)",
+                    [organism_ids],
+                )
             Organism.objects.filter(organism_id__in=organism_ids).delete()
             Dbxref.objects.filter(db=db).delete()
             db.delete()
@@ -8,6 +8,8 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 
+from machado.indexing import start_index_update
+from machado.models import FeatureCvterm, FeaturePub, FeaturepropPub
 from machado.models import History, Pub, PubDbxref, Dbxref
 
 
@@ -24,9 +26,19 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_publication", params=locals())
+        index_update = start_index_update(history_obj)
         try:
             dbxref = Dbxref.objects.get(accession=doi)
             pub_dbxref = PubDbxref.objects.get(dbxref=dbxref)
+            if index_update is not None:
+                for queryset, field in [
+                    (FeaturePub.objects, "feature_id"),
+                    (FeatureCvterm.objects, "feature_id"),
+                    (FeaturepropPub.objects, "featureprop__feature_id"),
+                ]:
+                    index_update.add_queryset(
+                        queryset.filter(pub_id=pub_dbxref.pub_id).values_list(field)
+                    )
             Pub.objects.get(pub_id=pub_dbxref.pub_id).delete()
 
             history_obj.success(description="Done")
@@ -12,6 +12,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.core.management.base import BaseCommand, CommandError
 from django.db.utils import IntegrityError
 
+from machado.indexing import start_index_update
 from machado.loaders.exceptions import ImportingError
 from machado.models import Cvterm, FeatureRelationship, History
 
@@ -31,6 +32,7 @@ class Command(BaseCommand):
         """Execute the main function."""
         history_obj = History()
         history_obj.start(command="remove_relationship", params=locals())
+        index_update = start_index_update(history_obj)
         # get cvterm for located in
         try:
             cvterm = Cvterm.objects.get(name="located in", cv__name="relationship")
@@ -41,10 +43,14 @@ class Command(BaseCommand):
         if verbosity > 0:
             self.stdout.write("Removing ...")
         try:
-            FeatureRelationship.objects.filter(
+            relationships = FeatureRelationship.objects.filter(
                 FeatureRelationshipprop_feature_relationship_FeatureRelationship__value=filename,
                 FeatureRelationshipprop_feature_relationship_FeatureRelationship__type=cvterm,
-            ).delete()
+            )
+            if index_update is not None:
+                for field in ["subject_id", "object_id"]:
+                    index_update.add_queryset(relationships.values_list(field))
+            relationships.delete()
 
             history_obj.success(description="Done")
             if verbosity > 0:
@@ -0,0 +1,60 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Update feature densities."""
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import DatabaseError
+
+from machado.loaders.common import retrieve_organism
+from machado.loaders.density import BIN_SIZES, store_feature_densities
+from machado.models import History
+
+
+class Command(BaseCommand):
+    """Update feature densities."""
+
+    help = "Compute the feature density histograms of an organism"
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument(
+            "--organism",
+            help="Species name (eg. Homo sapiens, Mus musculus)",
+            required=True,
+            type=str,
+        )
+        parser.add_argument(
+            "--binsizes",
+            help="Bases per bin of each zoom level",
+            default=BIN_SIZES,
+            nargs="+",
+            type=int,
+        )
+
+    def handle(
+        self, organism: str, binsizes: list = BIN_SIZES, verbosity: int = 1, **options
+    ):
+        """Execute the main function."""
+        history_obj = History()
+        history_obj.start(command="update_feature_densities", params=locals())
+        if any(bin_size < 1 for bin_size in binsizes):
+            history_obj.failure(description="Invalid bin size")
+            raise CommandError("The bin sizes must be positive integers")
+        try:
+            organism_obj = retrieve_organism(organism)
+            stored = store_feature_densities(organism_obj, bin_sizes=binsizes)
+        except ObjectDoesNotExist as e:
+            history_obj.failure(description=str(e))
+            raise CommandError("Organism does not exist in database!")
+        except DatabaseError as e:
+            history_obj.failure(description=str(e))
+            raise CommandError(e)
+
+        history_obj.success(description="{} densities stored".format(stored))
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,82 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Update search index."""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.utils import DatabaseError
+from tqdm import tqdm
+
+from machado.indexing import INDEX_CHUNK_SIZE, clear_index_updates
+from machado.indexing import get_index_updates, update_search_documents
+from machado.models import History
+
+
+class Command(BaseCommand):
+    """Update search index."""
+
+    help = (
+        "Update the search documents of the features changed by the loads "
+        "since the last update (requires MACHADO_INDEX_UPDATE)"
+    )
+
+    def add_arguments(self, parser):
+        """Define the arguments."""
+        parser.add_argument(
+            "--batchsize",
+            help="Number of features per batch",
+            default=INDEX_CHUNK_SIZE,
+            type=int,
+        )
+        parser.add_argument("--cpu", help="Number of threads", default=1, type=int)
+        parser.add_argument(
+            "--using", help="Haystack connection", default="default", type=str
+        )
+
+    def handle(
+        self,
+        batchsize: int = INDEX_CHUNK_SIZE,
+        cpu: int = 1,
+        using: str = "default",
+        verbosity: int = 1,
+        **options
+    ):
+        """Execute the main function."""
+        history_obj = History()
+        history_obj.start(command="update_search_index", params=locals())
+        if batchsize < 1:
+            history_obj.failure(description="Invalid batch size")
+            raise CommandError("The batch size must be a positive integer")
+
+        feature_ids, last_id = get_index_updates()
+        if verbosity > 0:
+            self.stdout.write("{} features to update".format(len(feature_ids)))
+
+        pool = ThreadPoolExecutor(max_workers=cpu)
+        tasks = list()
+        for start in range(0, len(feature_ids), batchsize):
+            end = start + batchsize
+            batch = feature_ids[start:end]
+            tasks.append(pool.submit(update_search_documents, batch, using))
+        updated = removed = 0
+        for task in tqdm(as_completed(tasks), total=len(tasks), disable=verbosity < 1):
+            try:
+                result = task.result()
+            except DatabaseError as e:
+                history_obj.failure(description=str(e))
+                raise CommandError(e)
+            updated += result[0]
+            removed += result[1]
+        pool.shutdown()
+
+        clear_index_updates(last_id)
+        history_obj.success(
+            description="{} documents updated, {} removed".format(updated, removed)
+        )
+        if verbosity > 0:
+            self.stdout.write(self.style.SUCCESS("Done"))
@@ -0,0 +1,50 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the provenance table."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0005_add_db_url"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Provenance",
+            fields=[
+                (
+                    "provenance_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                (
+                    "history",
+                    models.ForeignKey(
+                        on_delete=models.deletion.CASCADE,
+                        related_name="Provenance_history_History",
+                        to="machado.history",
+                    ),
+                ),
+                ("filename", models.CharField(max_length=255)),
+                ("table_name", models.CharField(max_length=63)),
+                ("min_id", models.BigIntegerField()),
+                ("max_id", models.BigIntegerField()),
+            ],
+            options={
+                "db_table": "provenance",
+                "indexes": [
+                    models.Index(
+                        fields=["filename", "table_name"],
+                        name="provenance_filenam_6dca34_idx",
+                    )
+                ],
+            },
+        )
+    ]
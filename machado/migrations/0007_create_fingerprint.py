@@ -0,0 +1,45 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the fingerprint table."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0006_create_provenance"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Fingerprint",
+            fields=[
+                (
+                    "fingerprint_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                ("filename", models.CharField(max_length=255)),
+                ("key", models.CharField(max_length=255)),
+                ("feature_id", models.BigIntegerField()),
+                ("fingerprint", models.CharField(max_length=32)),
+            ],
+            options={
+                "db_table": "fingerprint",
+                "indexes": [
+                    models.Index(
+                        fields=["filename", "key"],
+                        name="fingerprint_filenam_3c6b6f_idx",
+                    ),
+                    models.Index(
+                        fields=["feature_id"], name="fingerprint_feature_44415f_idx"
+                    ),
+                ],
+            },
+        )
+    ]
@@ -0,0 +1,53 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the checkpoint table."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0007_create_fingerprint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Checkpoint",
+            fields=[
+                (
+                    "checkpoint_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                (
+                    "history",
+                    models.ForeignKey(
+                        on_delete=models.deletion.CASCADE,
+                        related_name="Checkpoint_history_History",
+                        to="machado.history",
+                    ),
+                ),
+                ("command", models.CharField(max_length=255)),
+                ("filename", models.CharField(max_length=255)),
+                ("record", models.BigIntegerField(default=0)),
+                ("contig", models.CharField(blank=True, max_length=255, null=True)),
+                ("last_id", models.BigIntegerField(blank=True, null=True)),
+                ("counters", models.TextField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "db_table": "checkpoint",
+                "indexes": [
+                    models.Index(
+                        fields=["command", "filename"],
+                        name="checkpoint_command_cea1cf_idx",
+                    ),
+                ],
+            },
+        )
+    ]
@@ -0,0 +1,48 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the feature_density table."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0008_create_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeatureDensity",
+            fields=[
+                (
+                    "feature_density_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                ("organism_id", models.BigIntegerField()),
+                ("srcfeature_id", models.BigIntegerField()),
+                ("type_id", models.BigIntegerField()),
+                ("bin_size", models.IntegerField()),
+                ("feature_count", models.BigIntegerField()),
+                ("counts", models.BinaryField()),
+            ],
+            options={
+                "db_table": "feature_density",
+                "indexes": [
+                    models.Index(
+                        fields=["srcfeature_id", "type_id", "bin_size"],
+                        name="feature_den_srcfeat_9a43df_idx",
+                    ),
+                    models.Index(
+                        fields=["organism_id", "type_id"],
+                        name="feature_den_organis_384b59_idx",
+                    ),
+                ],
+            },
+        )
+    ]
@@ -0,0 +1,79 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the feature_expression_sample materialized view."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0009_create_feature_density"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE MATERIALIZED VIEW feature_expression_sample AS "
+            "SELECT row_number() OVER () AS feature_expression_sample_id, "
+            "analysisfeature.feature_id, "
+            "analysis.sourcename AS analysis_sourcename, "
+            "analysisfeature.normscore, "
+            "assay.name AS assay_name, "
+            "assay.description AS assay_description, "
+            "biomaterial.name AS biomaterial_name, "
+            "biomaterial.description AS biomaterial_description, "
+            "treatment.name AS treatment_name "
+            "FROM analysisfeature "
+            "JOIN analysis ON analysis.analysis_id = analysisfeature.analysis_id "
+            "JOIN quantification ON quantification.analysis_id = analysis.analysis_id "
+            "JOIN acquisition "
+            "ON acquisition.acquisition_id = quantification.acquisition_id "
+            "JOIN assay ON assay.assay_id = acquisition.assay_id "
+            "LEFT JOIN assay_biomaterial ON assay_biomaterial.assay_id = assay.assay_id "
+            "LEFT JOIN biomaterial "
+            "ON biomaterial.biomaterial_id = assay_biomaterial.biomaterial_id "
+            "LEFT JOIN treatment ON treatment.biomaterial_id = biomaterial.biomaterial_id "
+            "WHERE analysisfeature.normscore > 0 AND assay.name IS NOT NULL;",
+            reverse_sql="DROP MATERIALIZED VIEW feature_expression_sample;",
+        ),
+        migrations.RunSQL(
+            "CREATE UNIQUE INDEX feature_expression_sample_id "
+            "ON feature_expression_sample "
+            "USING btree (feature_expression_sample_id);",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            "CREATE INDEX feature_expression_sample_feature_id ON feature_expression_sample "
+            "USING btree (feature_id);",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.CreateModel(
+            name="FeatureExpressionSample",
+            fields=[
+                (
+                    "feature_expression_sample_id",
+                    models.BigIntegerField(primary_key=True, serialize=False),
+                ),
+                ("feature_id", models.BigIntegerField()),
+                (
+                    "analysis_sourcename",
+                    models.CharField(blank=True, max_length=255, null=True),
+                ),
+                ("normscore", models.FloatField(blank=True, null=True)),
+                ("assay_name", models.TextField(blank=True, null=True)),
+                ("assay_description", models.TextField(blank=True, null=True)),
+                ("biomaterial_name", models.TextField(blank=True, null=True)),
+                ("biomaterial_description", models.TextField(blank=True, null=True)),
+                ("treatment_name", models.TextField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "feature_expression_sample",
+                "managed": False,
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the index_update table."""
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0010_create_feature_expression_sample"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IndexUpdate",
+            fields=[
+                (
+                    "index_update_id",
+                    models.BigAutoField(primary_key=True, serialize=False),
+                ),
+                (
+                    "history",
+                    models.ForeignKey(
+                        on_delete=models.deletion.CASCADE,
+                        related_name="IndexUpdate_history_History",
+                        to="machado.history",
+                    ),
+                ),
+                ("min_id", models.BigIntegerField()),
+                ("max_id", models.BigIntegerField()),
+            ],
+            options={
+                "db_table": "index_update",
+            },
+        )
+    ]
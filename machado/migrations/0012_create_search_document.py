@@ -0,0 +1,50 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Create the search_document table."""
+
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Migration."""
+
+    dependencies = [
+        ("machado", "0011_create_index_update"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "search_document_id",
+                    models.CharField(max_length=255, primary_key=True, serialize=False),
+                ),
+                ("django_ct", models.CharField(max_length=100)),
+                ("django_id", models.CharField(max_length=255)),
+                ("document", models.JSONField()),
+                ("facets", models.JSONField()),
+                ("facet_values", ArrayField(models.TextField())),
+                ("text_vector", SearchVectorField(blank=True, null=True)),
+                ("autocomplete_vector", SearchVectorField(blank=True, null=True)),
+            ],
+            options={
+                "db_table": "search_document",
+                "indexes": [
+                    GinIndex(fields=["facet_values"], name="search_document_facets"),
+                    GinIndex(fields=["text_vector"], name="search_document_text"),
+                    GinIndex(
+                        fields=["autocomplete_vector"],
+                        name="search_document_autocomplete",
+                    ),
+                ],
+            },
+        )
+    ]
@@ -3,6 +3,10 @@
 # This code is part of the machado distribution and governed by its
 # license. Please see the LICENSE.txt and README.md files that should
 # have been included as part of this package for licensing information.
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 
@@ -4324,9 +4328,42 @@ class History(models.Model):
     finished_at = models.DateTimeField(blank=True, null=True)
     exit_code = models.IntegerField(null=True, blank=True)  # 0 = success, 1 = error
 
+    # memoized cache generation, see get_cache_generation
+    CACHE_GENERATION_KEY = "machado_cache_generation"
+    CACHE_GENERATION_TIMEOUT = 10
+    # commands that don't change the data served by the API, they keep the
+    # cache generation
+    READ_ONLY_COMMANDS = ["build_search_index", "export_jbrowse", "update_search_index"]
+    # the machado.indexing.IndexUpdateRecorder of the command, see
+    # machado.indexing.start_index_update
+    index_update = None
+
     class Meta:
         db_table = "history"
 
+    @classmethod
+    def get_cache_generation(cls) -> tuple:
+        """Return the id and finish time of the last successful command.
+
+        The id changes on every successful load, so it is used to version the
+        cache keys. The READ_ONLY_COMMANDS are not taken into account. It is
+        memoized for CACHE_GENERATION_TIMEOUT seconds to avoid a query per
+        request; success() drops the memoized value.
+        """
+        generation = cache.get(cls.CACHE_GENERATION_KEY)
+        if generation is None:
+            generation = (
+                cls.objects.filter(exit_code=0)
+                .exclude(command__in=cls.READ_ONLY_COMMANDS)
+                .order_by("-history_id")
+                .values_list("history_id", "finished_at")
+                .first()
+            ) or (0, None)
+            cache.set(
+                cls.CACHE_GENERATION_KEY, generation, cls.CACHE_GENERATION_TIMEOUT
+            )
+        return generation
+
     def start(self, command: str, params: str) -> None:
         """Create new entry."""
         self.command = command
@@ -4340,6 +4377,11 @@ class History(models.Model):
         self.exit_code = 0
         self.finished_at = timezone.now()
         self.save()
+        if self.index_update is not None:
+            self.index_update.record()
+            self.index_update = None
+        if self.command not in self.READ_ONLY_COMMANDS:
+            cache.delete(self.CACHE_GENERATION_KEY)
 
     def failure(self, description: str = None) -> None:
         """Update entry to log the finish."""
@@ -4347,3 +4389,121 @@ class History(models.Model):
         self.exit_code = 1
         self.finished_at = timezone.now()
         self.save()
+        # the changes of a failed command are not recorded
+        self.index_update = None
+
+
+class Provenance(models.Model):
+    provenance_id = models.BigAutoField(primary_key=True)
+    history = models.ForeignKey(
+        History, on_delete=models.CASCADE, related_name="Provenance_history_History"
+    )
+    filename = models.CharField(max_length=255)
+    table_name = models.CharField(max_length=63)
+    min_id = models.BigIntegerField()
+    max_id = models.BigIntegerField()
+
+    class Meta:
+        db_table = "provenance"
+        indexes = [models.Index(fields=["filename", "table_name"])]
+
+
+class Fingerprint(models.Model):
+    fingerprint_id = models.BigAutoField(primary_key=True)
+    filename = models.CharField(max_length=255)
+    key = models.CharField(max_length=255)
+    feature_id = models.BigIntegerField()
+    fingerprint = models.CharField(max_length=32)
+
+    class Meta:
+        db_table = "fingerprint"
+        indexes = [
+            models.Index(fields=["filename", "key"]),
+            models.Index(fields=["feature_id"]),
+        ]
+
+
+class Checkpoint(models.Model):
+    checkpoint_id = models.BigAutoField(primary_key=True)
+    history = models.ForeignKey(
+        History, on_delete=models.CASCADE, related_name="Checkpoint_history_History"
+    )
+    command = models.CharField(max_length=255)
+    filename = models.CharField(max_length=255)
+    record = models.BigIntegerField(default=0)
+    contig = models.CharField(max_length=255, blank=True, null=True)
+    last_id = models.BigIntegerField(blank=True, null=True)
+    counters = models.TextField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "checkpoint"
+        indexes = [models.Index(fields=["command", "filename"])]
+
+
+class FeatureDensity(models.Model):
+    feature_density_id = models.BigAutoField(primary_key=True)
+    organism_id = models.BigIntegerField()
+    srcfeature_id = models.BigIntegerField()
+    type_id = models.BigIntegerField()
+    bin_size = models.IntegerField()
+    feature_count = models.BigIntegerField()
+    counts = models.BinaryField()
+
+    class Meta:
+        db_table = "feature_density"
+        indexes = [
+            models.Index(fields=["srcfeature_id", "type_id", "bin_size"]),
+            models.Index(fields=["organism_id", "type_id"]),
+        ]
+
+
+class IndexUpdate(models.Model):
+    index_update_id = models.BigAutoField(primary_key=True)
+    history = models.ForeignKey(
+        History, on_delete=models.CASCADE, related_name="IndexUpdate_history_History"
+    )
+    min_id = models.BigIntegerField()
+    max_id = models.BigIntegerField()
+
+    class Meta:
+        db_table = "index_update"
+
+
+class SearchDocument(models.Model):
+    # haystack identifier, see machado.search_backend
+    search_document_id = models.CharField(primary_key=True, max_length=255)
+    django_ct = models.CharField(max_length=100)
+    django_id = models.CharField(max_length=255)
+    document = models.JSONField()
+    facets = models.JSONField()
+    facet_values = ArrayField(models.TextField())
+    text_vector = SearchVectorField(blank=True, null=True)
+    autocomplete_vector = SearchVectorField(blank=True, null=True)
+
+    class Meta:
+        db_table = "search_document"
+        indexes = [
+            GinIndex(fields=["facet_values"], name="search_document_facets"),
+            GinIndex(fields=["text_vector"], name="search_document_text"),
+            GinIndex(
+                fields=["autocomplete_vector"], name="search_document_autocomplete"
+            ),
+        ]
+
+
+class FeatureExpressionSample(models.Model):
+    feature_expression_sample_id = models.BigIntegerField(primary_key=True)
+    feature_id = models.BigIntegerField()
+    analysis_sourcename = models.CharField(max_length=255, blank=True, null=True)
+    normscore = models.FloatField(blank=True, null=True)
+    assay_name = models.TextField(blank=True, null=True)
+    assay_description = models.TextField(blank=True, null=True)
+    biomaterial_name = models.TextField(blank=True, null=True)
+    biomaterial_description = models.TextField(blank=True, null=True)
+    treatment_name = models.TextField(blank=True, null=True)
+
+    class Meta:
+        # materialized view, see machado.loaders.expression
+        managed = False
+        db_table = "feature_expression_sample"
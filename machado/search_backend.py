@@ -0,0 +1,515 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""PostgreSQL full-text search engine for haystack.
+
+The documents are stored in the search_document table, see
+machado.models.SearchDocument. The stored fields are kept in a jsonb
+column, the faceted fields are kept in another jsonb column to be sorted
+and in an array of field:value strings to be filtered and counted, the
+document field is kept in a tsvector column and the n-gram (autocomplete)
+fields in another tsvector column that is searched by word prefixes.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from haystack.backends import BaseEngine, BaseSearchBackend, BaseSearchQuery
+from haystack.backends import log_query
+from haystack.constants import DEFAULT_ALIAS, DJANGO_CT, DJANGO_ID, ID
+from haystack.exceptions import FacetingError, SearchBackendError, SkipDocument
+from haystack.fields import FacetField
+from haystack.inputs import BaseInput
+from haystack.models import SearchResult
+from haystack.utils import get_identifier, get_model_ct
+from haystack.utils.app_loading import haystack_get_model
+
+NGRAM_TYPES = ["ngram", "edge_ngram"]
+RANGE_OPERATORS = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+TEXT_CONDITION = "text_vector @@ "
+
+UPDATE_SQL = (
+    "INSERT INTO search_document (search_document_id, django_ct, django_id, "
+    "document, facets, facet_values, text_vector, autocomplete_vector) "
+    "VALUES {} ON CONFLICT (search_document_id) DO UPDATE SET "
+    "django_ct = EXCLUDED.django_ct, django_id = EXCLUDED.django_id, "
+    "document = EXCLUDED.document, facets = EXCLUDED.facets, "
+    "facet_values = EXCLUDED.facet_values, text_vector = EXCLUDED.text_vector, "
+    "autocomplete_vector = EXCLUDED.autocomplete_vector"
+)
+UPDATE_VALUES_SQL = (
+    "(%s, %s, %s, %s::jsonb, %s::jsonb, %s::text[], "
+    "to_tsvector(%s::regconfig, %s), to_tsvector(%s::regconfig, %s))"
+)
+# the page is selected before the documents are retrieved
+SEARCH_SQL = "SELECT search_document_id, {} FROM search_document WHERE {} ORDER BY {}"
+DOCUMENT_SQL = (
+    "SELECT search_document_id, django_ct, django_id, document::text "
+    "FROM search_document WHERE search_document_id = ANY(%s)"
+)
+COUNT_SQL = "SELECT count(*) FROM search_document WHERE {}"
+# the values of every facet are counted in a single pass over the matches
+FACET_SQL = (
+    "SELECT counts.facet_value, counts.count FROM ("
+    "SELECT facet_value, count(*) AS count, row_number() OVER ("
+    "PARTITION BY split_part(facet_value, ':', 1) "
+    "ORDER BY count(*) DESC, facet_value) AS position "
+    "FROM search_document CROSS JOIN LATERAL unnest(facet_values) AS facet_value "
+    "WHERE ({}) AND split_part(facet_value, ':', 1) = ANY(%s) "
+    "GROUP BY facet_value) AS counts "
+    "JOIN unnest(%s::text[], %s::int[], %s::int[]) AS f(facet, size, min_count) "
+    "ON f.facet = split_part(counts.facet_value, ':', 1) "
+    "WHERE counts.position <= f.size AND counts.count >= f.min_count "
+    "ORDER BY counts.facet_value"
+)
+# the narrow queries of haystack's FacetedSearchForm: field:"value"
+NARROW_QUERY = re.compile(r'^(\w+):"(.*)"$')
+
+
+def convert_value(field, value: Any) -> Any:
+    """Convert a value to the JSON type of a search field."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return [convert_value(field, item) for item in value]
+    field_type = getattr(field, "field_type", "string")
+    if field_type == "boolean":
+        if isinstance(value, str):
+            return value.lower() in ["true", "1"]
+        return bool(value)
+    if field_type == "integer":
+        return int(value)
+    if field_type == "float":
+        return float(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+def facet_value(field_name: str, field, value: Any) -> str:
+    """Return the field:value string of a facet value."""
+    value = convert_value(field, value)
+    if isinstance(value, bool):
+        value = "true" if value else "false"
+    return "{}:{}".format(field_name, value)
+
+
+def prefix_tsquery(text: str) -> str:
+    """Return a to_tsquery text matching the words of text as prefixes."""
+    words = list()
+    for word in text.split():
+        word = word.rstrip("*").replace("\\", "\\\\").replace("'", "''")
+        if word:
+            words.append("'{}':*".format(word))
+    return " & ".join(words)
+
+
+class PostgresSearchBackend(BaseSearchBackend):
+    """PostgreSQL search backend."""
+
+    def __init__(self, connection_alias, **connection_options):
+        """Set the text search configuration."""
+        super().__init__(connection_alias, **connection_options)
+        self.search_config = connection_options.get("SEARCH_CONFIG", "simple")
+
+    def get_unified_index(self):
+        """Get the unified index of the connection."""
+        from haystack import connections
+
+        return connections[self.connection_alias].get_unified_index()
+
+    def update(self, index, iterable, commit=True):
+        """Insert or replace the documents of the objects."""
+        rows = dict()
+        for obj in iterable:
+            try:
+                data = index.full_prepare(obj)
+            except SkipDocument:
+                continue
+            document = dict()
+            facets = dict()
+            facet_values = list()
+            text = ""
+            autocomplete = list()
+            for key, value in data.items():
+                field = index.fields.get(key)
+                if key in [ID, DJANGO_CT, DJANGO_ID]:
+                    continue
+                elif isinstance(field, FacetField):
+                    facets[key] = convert_value(field, value)
+                    if not isinstance(value, (list, tuple, set)):
+                        value = [value]
+                    for item in value:
+                        if item is not None:
+                            facet_values.append(facet_value(key, field, item))
+                    continue
+                elif field is not None and field.document is True:
+                    text = value
+                elif field is not None and field.field_type in NGRAM_TYPES:
+                    autocomplete.append(value)
+                document[key] = value
+            rows[data[ID]] = [
+                data[ID],
+                data[DJANGO_CT],
+                data[DJANGO_ID],
+                json.dumps(document, cls=DjangoJSONEncoder),
+                json.dumps(facets),
+                sorted(set(facet_values)),
+                self.search_config,
+                text or "",
+                self.search_config,
+                " ".join(autocomplete),
+            ]
+
+        if not rows:
+            return
+        rows = list(rows.values())
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, len(rows), self.batch_size):
+                end = start + self.batch_size
+                batch = rows[start:end]
+                cursor.execute(
+                    UPDATE_SQL.format(", ".join([UPDATE_VALUES_SQL] * len(batch))),
+                    [value for row in batch for value in row],
+                )
+
+    def remove(self, obj_or_string, commit=True):
+        """Remove the document of an object or identifier."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM search_document WHERE search_document_id = %s",
+                [get_identifier(obj_or_string)],
+            )
+
+    def clear(self, models=None, commit=True):
+        """Remove the documents of the models, or every document."""
+        with connection.cursor() as cursor:
+            if models is None:
+                cursor.execute("TRUNCATE search_document")
+            else:
+                cursor.execute(
+                    "DELETE FROM search_document WHERE django_ct = ANY(%s)",
+                    [[get_model_ct(model) for model in models]],
+                )
+
+    def build_text_query(self, text: str, exact: bool = False) -> Tuple[str, List]:
+        """Build the tsquery of a text search.
+
+        The query is parsed by websearch_to_tsquery, so quoted phrases, or
+        and -word are supported. The AND, OR and NOT operators and the
+        escaped characters of the haystack query syntax are translated, and
+        words ending with * are matched as prefixes.
+        """
+        if exact:
+            return "phraseto_tsquery(%s::regconfig, %s)", [self.search_config, text]
+        words = list()
+        prefixes = list()
+        negate = False
+        for word in re.sub(r"\\(.)", r"\1", text).split():
+            if word == "AND":
+                continue
+            elif word == "NOT":
+                negate = True
+                continue
+            elif word == "OR":
+                word = "or"
+            elif negate:
+                word = "-" + word
+            elif word.endswith("*"):
+                prefixes.append(word)
+                continue
+            negate = False
+            words.append(word)
+
+        tsqueries = list()
+        params = list()
+        if words:
+            tsqueries.append("websearch_to_tsquery(%s::regconfig, %s)")
+            params += [self.search_config, " ".join(words)]
+        if prefixes:
+            tsqueries.append("to_tsquery(%s::regconfig, %s)")
+            params += [self.search_config, prefix_tsquery(" ".join(prefixes))]
+        if not tsqueries:
+            return "''::tsquery", list()
+        return "({})".format(" && ".join(tsqueries)), params
+
+    def build_filter(
+        self, field: str, filter_type: str, value: Any
+    ) -> Tuple[str, List]:
+        """Build the SQL condition of a haystack filter.
+
+        The document field is searched in text_vector and the n-gram fields
+        in autocomplete_vector. The faceted fields are filtered by the
+        indexed facet_values, and any other field by its stored value.
+        """
+        unified_index = self.get_unified_index()
+        search_field = unified_index.all_searchfields().get(field)
+        if isinstance(value, BaseInput):
+            value = value.query_string
+
+        if field == unified_index.document_field or (
+            search_field is not None and search_field.field_type in NGRAM_TYPES
+        ):
+            if filter_type not in ["content", "contains", "exact"]:
+                raise SearchBackendError(
+                    "The {} filter is not supported in {}.".format(filter_type, field)
+                )
+            if field == unified_index.document_field:
+                tsquery, params = self.build_text_query(
+                    str(value), exact=filter_type == "exact"
+                )
+                return TEXT_CONDITION + tsquery, params
+            return "autocomplete_vector @@ to_tsquery(%s::regconfig, %s)", [
+                self.search_config,
+                prefix_tsquery(str(value)),
+            ]
+
+        is_facet = isinstance(search_field, FacetField)
+        column = "facets" if is_facet else "document"
+        if filter_type in ["content", "contains", "exact", "in"]:
+            values = value if filter_type == "in" else [value]
+            if not values:
+                return "FALSE", list()
+            if is_facet:
+                # any of the values
+                return "facet_values && %s::text[]", [
+                    [facet_value(field, search_field, item) for item in values]
+                ]
+            multivalued = getattr(search_field, "is_multivalued", False)
+            conditions = list()
+            params = list()
+            for item in values:
+                item = convert_value(search_field, item)
+                conditions.append("document @> %s::jsonb")
+                params.append(json.dumps({field: [item] if multivalued else item}))
+            return "({})".format(" OR ".join(conditions)), params
+
+        if filter_type in RANGE_OPERATORS:
+            bounds = [(RANGE_OPERATORS[filter_type], value)]
+        elif filter_type == "range":
+            bounds = [(">=", value[0]), ("<=", value[1])]
+        else:
+            raise SearchBackendError(
+                "The {} filter is not supported by the PostgreSQL backend.".format(
+                    filter_type
+                )
+            )
+        conditions = list()
+        params = list()
+        for operator, item in bounds:
+            conditions.append(
+                "jsonb_path_exists({}, %s::jsonpath, "
+                "jsonb_build_object('value', %s::jsonb))".format(column)
+            )
+            params += [
+                "$.{}[*] ? (@ {} $value)".format(json.dumps(field), operator),
+                json.dumps(convert_value(search_field, item)),
+            ]
+        return "({})".format(" AND ".join(conditions)), params
+
+    def build_sort(self, sort_by: List[str]) -> Tuple[str, List]:
+        """Build the ORDER BY expressions of the sorted fields."""
+        fields = self.get_unified_index().all_searchfields()
+        expressions = list()
+        params = list()
+        for field in sort_by:
+            direction = "DESC" if field.startswith("-") else "ASC"
+            field = field.lstrip("-")
+            search_field = fields.get(field)
+            column = "facets" if isinstance(search_field, FacetField) else "document"
+            if getattr(search_field, "field_type", "string") in ["integer", "float"]:
+                expressions.append("{}->%s {}".format(column, direction))
+            else:
+                expressions.append('({}->>%s) COLLATE "C" {}'.format(column, direction))
+            params.append(field)
+        return ", ".join(expressions), params
+
+    @log_query
+    def search(
+        self,
+        query_string,
+        query_params=None,
+        rank=None,
+        sort_by=None,
+        start_offset=0,
+        end_offset=None,
+        facets=None,
+        date_facets=None,
+        query_facets=None,
+        narrow_queries=None,
+        models=None,
+        limit_to_registered_models=True,
+        result_class=None,
+        **kwargs
+    ):
+        """Search the documents.
+
+        query_string is a SQL condition built by PostgresSearchQuery, and
+        rank the tsquery of its text search, if any. The results are ranked
+        by relevance unless they are sorted.
+        """
+        if date_facets or query_facets:
+            raise FacetingError(
+                "Only field facets are supported by the PostgreSQL backend."
+            )
+        conditions = ["({})".format(query_string)]
+        params = list(query_params or [])
+        for narrow_query in narrow_queries or []:
+            match = NARROW_QUERY.match(narrow_query)
+            if match is None:
+                raise SearchBackendError(
+                    "Invalid narrow query: {}".format(narrow_query)
+                )
+            condition, condition_params = self.build_filter(
+                match.group(1), "exact", re.sub(r"\\(.)", r"\1", match.group(2))
+            )
+            conditions.append(condition)
+            params += condition_params
+        if models:
+            conditions.append("django_ct = ANY(%s)")
+            params.append(sorted([get_model_ct(model) for model in models]))
+        elif limit_to_registered_models:
+            conditions.append("django_ct = ANY(%s)")
+            params.append(self.build_models_list())
+        where = " AND ".join(conditions)
+
+        score, score_params = "0", list()
+        if rank is not None and not sort_by:
+            score, score_params = "ts_rank(text_vector, {})".format(rank[0]), rank[1]
+        if sort_by:
+            order_by, order_params = self.build_sort(sort_by)
+        elif rank is not None:
+            order_by, order_params = "2 DESC", list()
+        else:
+            order_by, order_params = "", list()
+        order_by = ", ".join(filter(None, [order_by, "search_document_id"]))
+        sql = SEARCH_SQL.format(score, where, order_by)
+        sql_params = score_params + params + order_params
+        if end_offset is not None:
+            sql += " LIMIT %s"
+            sql_params.append(max(end_offset - start_offset, 0))
+        if start_offset:
+            sql += " OFFSET %s"
+            sql_params.append(start_offset)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, sql_params)
+            page = cursor.fetchall()
+            if start_offset or (end_offset is not None and len(page) == end_offset):
+                cursor.execute(COUNT_SQL.format(where), params)
+                hits = cursor.fetchone()[0]
+            else:
+                hits = len(page)
+
+            cursor.execute(DOCUMENT_SQL, [[row[0] for row in page]])
+            documents = {row[0]: row[1:] for row in cursor.fetchall()}
+
+            facet_counts = dict()
+            if facets:
+                facet_counts["fields"] = self.count_facets(
+                    cursor, where, params, facets
+                )
+
+        unified_index = self.get_unified_index()
+        indexed_models = unified_index.get_indexed_models()
+        result_class = result_class or SearchResult
+        results = list()
+        for search_document_id, score in page:
+            django_ct, django_id, document = documents[search_document_id]
+            app_label, model_name = django_ct.split(".")
+            model = haystack_get_model(app_label, model_name)
+            if model is None or model not in indexed_models:
+                continue
+            index = unified_index.get_index(model)
+            stored = dict()
+            for key, value in json.loads(document).items():
+                if key in index.fields and value is not None:
+                    value = index.fields[key].convert(value)
+                stored[key] = value
+            results.append(
+                result_class(app_label, model_name, django_id, score, **stored)
+            )
+        return {"results": results, "hits": hits, "facets": facet_counts}
+
+    def count_facets(self, cursor, where: str, params: List, facets: Dict) -> Dict:
+        """Count the values of the facets in the matching documents."""
+        fields = self.get_unified_index().all_searchfields()
+        names = sorted(facets)
+        sizes = [facets[name].get("size", 10) for name in names]
+        min_counts = [facets[name].get("min_doc_count", 1) for name in names]
+        cursor.execute(
+            FACET_SQL.format(where), params + [names, names, sizes, min_counts]
+        )
+        counts = {name: list() for name in names}
+        for value, count in cursor.fetchall():
+            name, value = value.split(":", 1)
+            field_type = getattr(fields.get(name), "field_type", None)
+            # boolean facets are counted as 0 and 1, as in elasticsearch
+            if field_type == "boolean":
+                value = int(value == "true")
+            elif field_type == "integer":
+                value = int(value)
+            elif field_type == "float":
+                value = float(value)
+            counts[name].append((value, count))
+        for name in names:
+            counts[name].sort(key=lambda item: item[1], reverse=True)
+        return counts
+
+
+class PostgresSearchQuery(BaseSearchQuery):
+    """PostgreSQL search query.
+
+    The query is built as a SQL condition whose parameters are collected in
+    query_params.
+    """
+
+    def __init__(self, using=DEFAULT_ALIAS):
+        """Initialize the parameters."""
+        super().__init__(using=using)
+        self.query_params = list()
+        self.rank = None
+
+    def matching_all_fragment(self):
+        """Match every document."""
+        return "TRUE"
+
+    def build_query(self):
+        """Build the SQL condition of the query filters."""
+        self.query_params = list()
+        self.rank = None
+        final_query = self.query_filter.as_query_string(self.build_query_fragment)
+        return final_query or self.matching_all_fragment()
+
+    def build_query_fragment(self, field, filter_type, value):
+        """Build the SQL condition of a filter."""
+        condition, params = self.backend.build_filter(field, filter_type, value)
+        # the first text search ranks the results
+        if self.rank is None and condition.startswith(TEXT_CONDITION):
+            start = len(TEXT_CONDITION)
+            self.rank = (condition[start:], params)
+        self.query_params += params
+        return condition
+
+    def build_params(self, spelling_query=None):
+        """Add the query parameters and the text search rank."""
+        kwargs = super().build_params(spelling_query=spelling_query)
+        kwargs["query_params"] = self.query_params
+        kwargs["rank"] = self.rank
+        kwargs.pop("boost", None)
+        return kwargs
+
+
+class PostgresSearchEngine(BaseEngine):
+    """PostgreSQL search engine."""
+
+    backend = PostgresSearchBackend
+    query = PostgresSearchQuery
@@ -6,21 +6,11 @@
 
 """Search indexes."""
 from django.conf import settings
-from django.core.exceptions import ObjectDoesNotExist
-from django.db.models import Q
 from haystack import indexes
 
-from machado.models import Analysis, Analysisfeature
-from machado.models import Feature, FeatureCvterm, FeatureDbxref, Featureprop
-from machado.models import Featureloc, FeatureRelationship
-
-VALID_PROGRAMS = (
-    Analysis.objects.filter(program__in=["interproscan", "diamond", "blast"])
-    .distinct("program")
-    .values_list("program")
-)
-
-OVERLAPPING_FEATURES = ["SNV", "QTL", "copy_number_variation"]
+from machado.indexing import get_index_data, get_orthologs_biomaterials
+from machado.indexing import prepare_in_chunks
+from machado.models import Feature
 
 
 class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
@@ -36,28 +26,17 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
     display = indexes.CharField(faceted=True, null=True)
     doi = indexes.MultiValueField(faceted=True)
     relationship = indexes.MultiValueField(indexed=False)
-    if Featureprop.objects.filter(
-        type__name="orthologous group", type__cv__name="feature_property"
-    ).exists():
-        orthology = indexes.BooleanField(faceted=True)
-        orthologous_group = indexes.CharField(faceted=True)
-    if Featureprop.objects.filter(
-        type__name="coexpression group", type__cv__name="feature_property"
-    ).exists():
-        coexpression = indexes.BooleanField(faceted=True)
-        coexpression_group = indexes.CharField(faceted=True)
+    # null unless there are orthologous and coexpression groups, see
+    # machado.indexing.get_search_schema
+    orthology = indexes.BooleanField(faceted=True, null=True)
+    orthologous_group = indexes.CharField(faceted=True, null=True)
+    coexpression = indexes.BooleanField(faceted=True, null=True)
+    coexpression_group = indexes.CharField(faceted=True, null=True)
     biomaterial = indexes.MultiValueField(faceted=True)
     treatment = indexes.MultiValueField(faceted=True)
     # orthologs_biomaterial = indexes.MultiValueField(faceted=True)
     orthologs_coexpression = indexes.MultiValueField(faceted=True)
 
-    def __init__(self):
-        """Check for overlapping features."""
-        self.has_overlapping_features = Feature.objects.filter(
-            type__name__in=OVERLAPPING_FEATURES
-        ).exists()
-        super().__init__()
-
     def get_model(self):
         """Get model."""
         return Feature
@@ -65,7 +44,7 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
     def index_queryset(self, using=None):
         """Index queryset."""
         try:
-            return (
+            return prepare_in_chunks(
                 self.get_model()
                 .objects.filter(
                     type__name__in=settings.MACHADO_VALID_TYPES,
@@ -89,57 +68,39 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
     def prepare_analyses(self, obj):
         """Prepare analyses."""
         # similarity analyses
-        match_part_ids = (
-            Featureloc.objects.filter(srcfeature=obj)
-            .filter(feature__organism_id=obj.organism_id)
-            .filter(feature__type__name="match_part")
-            .filter(feature__type__cv__name="sequence")
-            .values_list("feature_id")
-        )
-        match_part_programs = (
-            Analysisfeature.objects.filter(feature_id__in=match_part_ids)
-            .values_list("analysis__program")
-            .distinct()
-        )
+        data = get_index_data(obj)
         result = list()
-        for i in list(VALID_PROGRAMS):
-            if i in list(match_part_programs):
-                result.append("{} matches".format(i[0]))
+        for program in data["schema"]["programs"]:
+            if program in data["programs"]:
+                result.append("{} matches".format(program))
             else:
-                result.append("no {} matches".format(i[0]))
+                result.append("no {} matches".format(program))
 
         return result
 
     def prepare_text(self, obj):
         """Prepare text."""
         keywords = set()
+        data = get_index_data(obj)
 
         # Featureprop: display or product or description or note (in that order)
         if obj.get_display():
             keywords.add(obj.get_display())
 
         # DBxRef
-        feature_dbxref = FeatureDbxref.objects.filter(feature=obj)
-        for i in feature_dbxref:
-            keywords.add(i.dbxref.accession)
+        for accession in data["dbxrefs"]:
+            keywords.add(accession)
 
         # GO terms
-        feature_cvterm = FeatureCvterm.objects.filter(feature=obj)
-        for i in feature_cvterm:
-            term = "{}:{}".format(i.cvterm.dbxref.db.name, i.cvterm.dbxref.accession)
-            keywords.add(term)
-            keywords.add(i.cvterm.name)
+        for db, accession, name in data["cvterms"]:
+            keywords.add("{}:{}".format(db, accession))
+            keywords.add(name)
 
         # Protein matches
-        feature_relationships = FeatureRelationship.objects.filter(
-            object=obj,
-            subject__type__name="protein_match",
-            subject__type__cv__name="sequence",
-        )
-        for feature_relationship in feature_relationships:
-            keywords.add(feature_relationship.subject.uniquename)
-            if feature_relationship.subject.name is not None:
-                keywords.add(feature_relationship.subject.name)
+        for uniquename, name in data["protein_matches"]:
+            keywords.add(uniquename)
+            if name is not None:
+                keywords.add(name)
 
         # Annotation
         for annotation in obj.get_annotation():
@@ -153,33 +114,22 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
         for sample in obj.get_expression_samples():
             keywords.add(sample.get("assay_name"))
             keywords.add(sample.get("biomaterial_name"))
-            for i in sample.get("biomaterial_description").split(" "):
+            for i in (sample.get("biomaterial_description") or "").split(" "):
                 keywords.add(i)
-            for i in sample.get("treatment_name").split(" "):
+            for i in (sample.get("treatment_name") or "").split(" "):
                 keywords.add(i)
 
         # IDs of overlapping features
-        if self.has_overlapping_features:
-            try:
-                for location in obj.Featureloc_feature_Feature.filter(
-                    feature__type__name__in=settings.MACHADO_VALID_TYPES
-                ):
-                    for overlapping_feature in Featureloc.objects.filter(
-                        ~Q(feature__type__name=location.feature.type.name),
-                        srcfeature=location.srcfeature,
-                        feature__type__name__in=OVERLAPPING_FEATURES,
-                        fmin__lte=location.fmax,
-                        fmax__gte=location.fmin,
-                    ):
-                        keywords.add(overlapping_feature.feature.uniquename)
-                        if overlapping_feature.feature.name:
-                            keywords.add(overlapping_feature.feature.name)
-            except AttributeError:
-                raise AttributeError("The setting of MACHADO_VALID_TYPES is required.")
+        if data["schema"]["overlapping_features"]:
+            for uniquename, name in data["overlapping"]:
+                keywords.add(uniquename)
+                if name:
+                    keywords.add(name)
 
         if obj.name is not None:
             keywords.add(obj.name)
         keywords.add(obj.uniquename)
+        keywords.discard(None)
 
         self.temp = " ".join(keywords)
         return " ".join(keywords)
@@ -193,18 +143,26 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
 
     def prepare_orthology(self, obj):
         """Prepare orthology."""
+        if not get_index_data(obj)["schema"]["orthology"]:
+            return None
         return bool(obj.get_orthologous_group())
 
     def prepare_orthologous_group(self, obj):
         """Prepare orthology."""
+        if not get_index_data(obj)["schema"]["orthology"]:
+            return None
         return obj.get_orthologous_group()
 
     def prepare_coexpression(self, obj):
         """Prepare coexpression."""
+        if not get_index_data(obj)["schema"]["coexpression"]:
+            return None
         return bool(obj.get_coexpression_group())
 
     def prepare_coexpression_group(self, obj):
         """Prepare coepxression group."""
+        if not get_index_data(obj)["schema"]["coexpression"]:
+            return None
         return obj.get_coexpression_group()
 
     def prepare_biomaterial(self, obj):
@@ -225,60 +183,17 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
 
     def prepare_orthologs_biomaterial(self, obj):
         """Prepare orthologs biomaterial."""
-        result = list()
-        try:
-            ortholog_group = Featureprop.objects.get(
-                type__cv__name="feature_property",
-                type__name="orthologous group",
-                feature=obj,
-            ).value
-        except ObjectDoesNotExist:
-            return result
-
-        protein_ids = Featureprop.objects.filter(
-            type__cv__name="feature_property",
-            type__name="orthologous group",
-            value=ortholog_group,
-        ).values_list("feature_id", flat=True)
-
-        for mrna_protein_obj in FeatureRelationship.objects.filter(
-            type__name="translation_of", object_id__in=protein_ids
-        ):
-            # mrna_protein_obj.subject == mRNA
-            for sample in mrna_protein_obj.subject.get_expression_samples():
-                if sample.get("biomaterial_description") not in result:
-                    result.append(sample.get("biomaterial_description"))
-        return result
+        group = get_index_data(obj)["orthologous_group"]
+        if group is None:
+            return list()
+        return list(get_orthologs_biomaterials(group))
 
     def prepare_orthologs_coexpression(self, obj):
         """Prepare orthologs coexpression."""
-        try:
-            ortholog_group = Featureprop.objects.get(
-                type__cv__name="feature_property",
-                type__name="orthologous group",
-                feature=obj,
-            ).value
-        except ObjectDoesNotExist:
+        group = get_index_data(obj)["orthologous_group"]
+        if group is None:
             return False
-
-        protein_ids = Featureprop.objects.filter(
-            type__cv__name="feature_property",
-            type__name="orthologous group",
-            value=ortholog_group,
-        ).values_list("feature_id", flat=True)
-
-        for mrna_protein_obj in FeatureRelationship.objects.filter(
-            type__name="translation_of", object_id__in=protein_ids
-        ):
-            # mrna_protein_obj.subject == mRNA
-            have_coexp = Featureprop.objects.filter(
-                type__cv__name="feature_property",
-                type__name="coexpression group",
-                feature=mrna_protein_obj.subject,
-            ).exists()
-            if have_coexp:
-                return True
-        return False
+        return group["coexpression"]
 
     def prepare_display(self, obj):
         """Prepare display."""
@@ -287,8 +202,8 @@ class FeatureIndex(indexes.SearchIndex, indexes.Indexable):
     def prepare_relationship(self, obj):
         """Prepare relationship."""
         result = list()
-        for r in obj.get_relationship():
-            result.append("{} {}".format(r.feature_id, r.type.name))
+        for feature_id, type_name in get_index_data(obj)["relationships"]:
+            result.append("{} {}".format(feature_id, type_name))
         return result
 
     def prepare_autocomplete(self, obj):
@@ -42,9 +42,7 @@ MACHADO_JBROWSE_OFFSET = 1200
 
 HAYSTACK_CONNECTIONS = {
     "default": {
-        "ENGINE": "haystack.backends.elasticsearch7_backend.Elasticsearch7SearchEngine",
-        "URL": "http://127.0.0.1:9200/",
-        "INDEX_NAME": "haystack",
+        "ENGINE": "machado.search_backend.PostgresSearchEngine",
     }
 }
 
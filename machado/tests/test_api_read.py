@@ -0,0 +1,561 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests read API."""
+
+import json
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from machado.api.serializers.read import JBrowseFeatureSerializer
+from machado.api.serializers.read import JBrowseNamesSerializer
+from machado.api.views.read import FeatureBatchViewSet, FeatureIDViewSet
+from machado.api.views.read import FeatureSimilarityViewSet
+from machado.api.views.read import FeatureInfoViewSet, FeatureLocationViewSet
+from machado.api.views.read import FeatureOntologyViewSet, FeaturePublicationViewSet
+from machado.api.views.read import HistoryListViewSet, JBrowseNamesViewSet
+from machado.api.views.read import JBrowseFeatureViewSet, JBrowseGlobalViewSet
+from machado.api.views.read import JBrowseRegionFeatureDensitiesViewSet
+from machado.api.views.read import JBrowseRegionStatsViewSet, retrieve_tile_stats
+from machado.loaders.density import store_feature_densities
+from machado.models import Analysis, Analysisfeature
+from machado.models import Cv, Cvterm, Db, Dbxref, Organism
+from machado.models import Feature, Featureloc, Featureprop, FeatureRelationship
+from machado.models import FeatureCvterm, FeaturePub, History
+from machado.models import Pub, Pubauthor, PubDbxref
+
+
+class JBrowseFeatureTest(TestCase):
+    """Tests API - JBrowse viewsets."""
+
+    def setUp(self):
+        """Set up."""
+        cache.clear()
+        self.factory = APIRequestFactory()
+        so_db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        fp_cv = Cv.objects.create(name="feature_property")
+        self.cvterms = dict()
+        for name, cv in [
+            ("assembly", so_cv),
+            ("gene", so_cv),
+            ("exon", so_cv),
+            ("part_of", so_cv),
+            ("display", fp_cv),
+        ]:
+            dbxref = Dbxref.objects.create(accession=name, db=so_db)
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=dbxref,
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        self.contig = self.create_feature("contig1", "assembly")
+
+    def create_feature(self, uniquename, soterm, fmin=None, fmax=None):
+        """Create a feature located in contig1."""
+        feature = Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            type=self.cvterms[soterm],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        if fmin is not None:
+            Featureloc.objects.create(
+                feature=feature,
+                srcfeature=self.contig,
+                fmin=fmin,
+                fmax=fmax,
+                strand=1,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+        return feature
+
+    def create_gene(self, i):
+        """Create a gene with two exons."""
+        gene = self.create_feature("gene{}".format(i), "gene", i * 1000, i * 1000 + 500)
+        Featureprop.objects.create(
+            feature=gene,
+            type=self.cvterms["display"],
+            value="gene {}".format(i),
+            rank=0,
+        )
+        for j in range(2):
+            exon = self.create_feature(
+                "exon{}.{}".format(i, j),
+                "exon",
+                i * 1000 + j * 200,
+                i * 1000 + j * 200 + 100,
+            )
+            FeatureRelationship.objects.create(
+                subject=gene, object=exon, type=self.cvterms["part_of"], rank=0
+            )
+
+    def get_features(self, start):
+        """Request the genes of contig1."""
+        request = self.factory.get(
+            "/api/jbrowse/features/contig1",
+            {"organism": "Mus musculus", "soType": "gene", "start": start},
+        )
+        view = JBrowseFeatureViewSet.as_view({"get": "list"})
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = view(request, refseq="contig1")
+        return response.data["features"], len(queries)
+
+    def test_list(self):
+        """Tests - list."""
+        self.create_gene(1)
+        features, num_queries = self.get_features(start=1)
+        self.assertEqual(1, len(features))
+        self.assertEqual("gene1", features[0]["uniqueID"])
+        self.assertEqual(1000, features[0]["start"])
+        self.assertEqual(1500, features[0]["end"])
+        self.assertEqual(1, features[0]["strand"])
+        self.assertEqual("gene 1", features[0]["display"])
+        self.assertEqual(
+            [(1000, 1100, "exon"), (1200, 1300, "exon")],
+            sorted(
+                (i["start"], i["end"], i["type"]) for i in features[0]["subfeatures"]
+            ),
+        )
+
+        # the number of queries doesn't grow with the number of features
+        for i in range(2, 6):
+            self.create_gene(i)
+        features, more_queries = self.get_features(start=2)
+        self.assertEqual(5, len(features))
+        self.assertEqual(num_queries, more_queries)
+
+    def test_serializers(self):
+        """Tests - values() serialization."""
+        for i in range(1, 4):
+            self.create_gene(i)
+        Feature.objects.filter(type=self.cvterms["gene"]).update(name="Abc")
+        queryset = Feature.objects.filter(type=self.cvterms["gene"])
+
+        view = JBrowseFeatureViewSet()
+        context = {"refseq": self.contig, "soType": "gene"}
+        serializer = JBrowseFeatureSerializer(queryset, context=context, many=True)
+        self.assertEqual(
+            [dict(i) for i in serializer.data],
+            view.serialize_features(queryset, context),
+        )
+        context = {"refseq": self.contig, "soType": None}
+        serializer = JBrowseFeatureSerializer(queryset, context=context, many=True)
+        self.assertEqual(
+            [dict(i) for i in serializer.data],
+            view.serialize_features(queryset, context),
+        )
+
+        view = JBrowseNamesViewSet()
+        serializer = JBrowseNamesSerializer(queryset, many=True)
+        self.assertEqual(
+            [dict(i) for i in serializer.data],
+            view.serialize_names(
+                queryset.values("feature_id", "name", "uniquename", "type__name")
+            ),
+        )
+
+        view = JBrowseNamesViewSet.as_view({"get": "list"})
+        query = {"organism": "Mus musculus", "startswith": "gene"}
+        response = view(self.factory.get("/api/jbrowse/names", query))
+        streamed = view(
+            self.factory.get("/api/jbrowse/names", dict(query, stream="true"))
+        )
+        self.assertEqual(
+            json.loads(response.render().content),
+            json.loads(b"".join(streamed.streaming_content)),
+        )
+
+    def test_stats(self):
+        """Tests - stats."""
+        for i in range(1, 4):
+            self.create_gene(i)
+        self.contig.seqlen = 10000
+        self.contig.save()
+        query = {"organism": "Mus musculus", "soType": "gene"}
+
+        view = JBrowseGlobalViewSet.as_view({"get": "list"})
+        response = view(self.factory.get("/api/jbrowse/stats/global", query))
+        self.assertEqual({"featureDensity": 0.02}, response.data)
+
+        store_feature_densities(self.organism)
+        cache.clear()
+        response = view(self.factory.get("/api/jbrowse/stats/global", query))
+        self.assertEqual({"featureDensity": 0.0003, "featureCount": 3}, response.data)
+
+        view = JBrowseRegionStatsViewSet.as_view({"get": "list"})
+        response = view(
+            self.factory.get(
+                "/api/jbrowse/stats/region/contig1",
+                dict(query, start=0, end=2000),
+            ),
+            refseq="contig1",
+        )
+        self.assertEqual(1, response.data["featureCount"])
+
+        view = JBrowseRegionFeatureDensitiesViewSet.as_view({"get": "list"})
+        response = view(
+            self.factory.get(
+                "/api/jbrowse/stats/regionFeatureDensities/contig1",
+                dict(query, start=0, end=4000, basesPerBin=1000),
+            ),
+            refseq="contig1",
+        )
+        self.assertEqual([0, 1, 1, 1], response.data["bins"])
+        self.assertEqual({"basesPerBin": 1000, "max": 1}, response.data["stats"])
+
+        response = view(
+            self.factory.get(
+                "/api/jbrowse/stats/regionFeatureDensities/contig2",
+                dict(query, start=0, end=4000, basesPerBin=1000),
+            ),
+            refseq="contig2",
+        )
+        self.assertEqual(404, response.status_code)
+
+    @mock.patch("machado.api.views.read.TILE_SIZE", 2000)
+    def test_tiles(self):
+        """Tests - tiles."""
+        for i in range(1, 6):
+            self.create_gene(i)
+        self.contig.seqlen = 10000
+        self.contig.save()
+        view = JBrowseFeatureViewSet.as_view({"get": "list"})
+
+        def get_features(start, end):
+            request = self.factory.get(
+                "/api/jbrowse/features/contig1",
+                {
+                    "organism": "Mus musculus",
+                    "soType": "gene",
+                    "start": start,
+                    "end": end,
+                },
+            )
+            response = view(request, refseq="contig1")
+            features = sorted(i["uniqueID"] for i in response.data["features"])
+            return features, response["X-Tile-Hits"], response["X-Tile-Misses"]
+
+        self.assertEqual(
+            (["gene1", "gene2", "gene3"], "0", "2"), get_features(1200, 3000)
+        )
+        # a slightly different region is assembled from the same tiles
+        self.assertEqual((["gene2", "gene3"], "2", "0"), get_features(1600, 3900))
+        self.assertEqual(
+            (["gene3", "gene4", "gene5"], "1", "1"), get_features(3000, 5000)
+        )
+        self.assertEqual({"hits": 3, "misses": 3}, retrieve_tile_stats())
+
+        # features are only listed once, whatever the tiles they span
+        features, hits, misses = get_features(0, 10000)
+        self.assertEqual(["gene1", "gene2", "gene3", "gene4", "gene5"], features)
+
+    def test_pagination(self):
+        """Tests - keyset pagination."""
+        for i in range(1, 6):
+            self.create_gene(i)
+        view = FeatureIDViewSet.as_view({"get": "list"})
+        query = {
+            "soType": "gene",
+            "organism_id": self.organism.organism_id,
+            "page_size": 2,
+            "count": "true",
+        }
+        feature_ids = list()
+        request = self.factory.get("/api/feature/ID", query)
+        while request is not None:
+            response = view(request)
+            self.assertEqual(5, response.data["count"])
+            feature_ids += [i["feature_id"] for i in response.data["results"]]
+            request = response.data["next"] and self.factory.get(response.data["next"])
+        self.assertEqual(
+            list(
+                Feature.objects.filter(type=self.cvterms["gene"])
+                .order_by("feature_id")
+                .values_list("feature_id", flat=True)
+            ),
+            feature_ids,
+        )
+
+        # without count there is no COUNT(*)
+        query.pop("count")
+        with CaptureQueriesContext(connection) as queries:
+            response = view(self.factory.get("/api/feature/ID", query))
+        self.assertNotIn("count", response.data)
+        self.assertFalse(any("COUNT(" in i["sql"] for i in queries.captured_queries))
+
+        # an accession still retrieves a single feature ID
+        response = view(
+            self.factory.get("/api/feature/ID", dict(query, accession="gene3"))
+        )
+        self.assertEqual(feature_ids[2], response.data["feature_id"])
+
+        for i in range(3):
+            history = History()
+            history.start(command="load{}".format(i), params="")
+            history.success(description="Done")
+        view = HistoryListViewSet.as_view({"get": "list"})
+        response = view(self.factory.get("/api/history", {"page_size": 2}))
+        self.assertEqual(
+            ["load2", "load1"], [i["command"] for i in response.data["results"]]
+        )
+        response = view(self.factory.get(response.data["next"]))
+        self.assertEqual(["load0"], [i["command"] for i in response.data["results"]])
+        self.assertIsNone(response.data["next"])
+        response = view(self.factory.get("/api/history", {"ordering": "created_at"}))
+        self.assertEqual(
+            ["load0", "load1", "load2"],
+            [i["command"] for i in response.data["results"]],
+        )
+
+    @override_settings(MACHADO_VALID_TYPES=["gene", "exon"])
+    def test_batch(self):
+        """Tests - batch."""
+        for i in range(1, 4):
+            self.create_gene(i)
+        gene_ids = list(
+            Feature.objects.filter(type=self.cvterms["gene"])
+            .order_by("feature_id")
+            .values_list("feature_id", flat=True)
+        )
+        go_db = Db.objects.create(name="GO")
+        go_cv = Cv.objects.create(name="biological_process")
+        go_term = Cvterm.objects.create(
+            name="transport",
+            definition="movement",
+            cv=go_cv,
+            dbxref=Dbxref.objects.create(accession="0006810", db=go_db),
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        pub = Pub.objects.create(
+            uniquename="pub1", title="Genes", pyear="2018", type=go_term
+        )
+        PubDbxref.objects.create(
+            pub=pub,
+            dbxref=Dbxref.objects.create(
+                accession="10.1/abc", db=Db.objects.create(name="DOI")
+            ),
+            is_current=True,
+        )
+        Pubauthor.objects.create(pub=pub, rank=0, surname="Doe", givennames="J.")
+        FeaturePub.objects.create(feature_id=gene_ids[0], pub=pub)
+        FeatureCvterm.objects.create(
+            feature_id=gene_ids[0], cvterm=go_term, pub=pub, is_not=False, rank=0
+        )
+
+        def get_batch(feature_ids, sections):
+            request = self.factory.get(
+                "/api/feature/batch",
+                {
+                    "feature_id": ",".join(str(i) for i in feature_ids),
+                    "sections": ",".join(sections),
+                },
+            )
+            view = FeatureBatchViewSet.as_view({"get": "list", "post": "create"})
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request)
+                content = b"".join(response.streaming_content)
+            return json.loads(content), len(queries)
+
+        sections = ["info", "location", "sequence", "ontology", "publication"]
+        features, num_queries = get_batch(gene_ids[:1] + [0], sections)
+        self.assertEqual([gene_ids[0]], [i["feature_id"] for i in features])
+        self.assertEqual("gene 1", features[0]["info"]["display"])
+        self.assertEqual(
+            ["exon"] * 2,
+            [i["relative_type"] for i in features[0]["info"]["relationship"]],
+        )
+        self.assertEqual(1000, features[0]["location"][0]["start"])
+        self.assertEqual(
+            [
+                {
+                    "cvterm": "transport",
+                    "cvterm_definition": "movement",
+                    "cv": "biological_process",
+                    "db": "GO",
+                    "dbxref": "0006810",
+                }
+            ],
+            features[0]["ontology"],
+        )
+
+        # the same as the single feature endpoints
+        for viewset, section in [
+            (FeatureInfoViewSet, "info"),
+            (FeatureLocationViewSet, "location"),
+            (FeatureOntologyViewSet, "ontology"),
+            (FeaturePublicationViewSet, "publication"),
+        ]:
+            view = viewset.as_view({"get": "list"})
+            response = view(
+                self.factory.get("/api/feature/{}".format(section)),
+                feature_id=gene_ids[0],
+            )
+            self.assertEqual(
+                json.loads(json.dumps(response.data)), features[0][section]
+            )
+
+        # the number of queries doesn't grow with the number of features
+        features, more_queries = get_batch(gene_ids, sections)
+        self.assertEqual(gene_ids, [i["feature_id"] for i in features])
+        self.assertEqual(num_queries, more_queries)
+
+        # the features are streamed in chunks
+        with mock.patch("machado.api.views.read.BATCH_CHUNK_SIZE", 2):
+            chunked, chunked_queries = get_batch(gene_ids + [0], sections)
+        self.assertEqual(features, chunked)
+        self.assertGreater(chunked_queries, num_queries)
+
+        view = FeatureBatchViewSet.as_view({"get": "list", "post": "create"})
+        response = view(
+            self.factory.post(
+                "/api/feature/batch",
+                {"feature_id": gene_ids, "sections": ["sequence"]},
+                format="json",
+            )
+        )
+        self.assertEqual(
+            [{"feature_id": i, "sequence": {"sequence": None}} for i in gene_ids],
+            json.loads(b"".join(response.streaming_content)),
+        )
+        response = view(self.factory.get("/api/feature/batch", {"feature_id": "a"}))
+        self.assertEqual(400, response.status_code)
+        response = view(
+            self.factory.get(
+                "/api/feature/batch", {"feature_id": "1", "sections": "foo"}
+            )
+        )
+        self.assertEqual({"error": "Invalid section: foo"}, response.data)
+
+    def test_similarity(self):
+        """Tests - similarity."""
+        query = self.create_feature("query1", "gene")
+        uniprot = Db.objects.create(name="UniProt")
+        analyses = {
+            program: Analysis.objects.create(
+                program=program,
+                programversion="1.0",
+                sourcename="hits.xml",
+                timeexecuted=datetime.now(timezone.utc),
+            )
+            for program in ["diamond", "interproscan"]
+        }
+        for i, (program, identity, normscore, significance) in enumerate(
+            [
+                ("diamond", 90, 50.0, 1e-10),
+                ("diamond", 40, None, 1e-3),
+                ("interproscan", None, 80.0, 1e-20),
+            ]
+        ):
+            hit = self.create_feature("hit{}".format(i), "gene")
+            hit.name = "hit {}".format(i)
+            hit.dbxref = Dbxref.objects.create(accession=hit.uniquename, db=uniprot)
+            hit.save()
+            match_part = self.create_feature("match_part{}".format(i), "exon")
+            Analysisfeature.objects.create(
+                feature=match_part,
+                analysis=analyses[program],
+                identity=identity,
+                rawscore=10.0,
+                normscore=normscore,
+                significance=significance,
+            )
+            for rank, srcfeature in enumerate([query, hit]):
+                Featureloc.objects.create(
+                    feature=match_part,
+                    srcfeature=srcfeature,
+                    fmin=i * 10,
+                    fmax=i * 10 + 5,
+                    is_fmin_partial=False,
+                    is_fmax_partial=False,
+                    locgroup=0,
+                    rank=rank,
+                )
+
+        def get_similarity(**params):
+            request = self.factory.get("/api/feature/similarity", params)
+            view = FeatureSimilarityViewSet.as_view({"get": "list"})
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = view(request, feature_id=query.feature_id)
+            return response, len(queries)
+
+        response, num_queries = get_similarity()
+        self.assertEqual(["hit2", "hit0", "hit1"], [i["unique"] for i in response.data])
+        self.assertEqual(
+            {
+                "program": "diamond",
+                "programversion": "1.0",
+                "db_name": "UniProt",
+                "unique": "hit0",
+                "name": "hit 0",
+                "sotype": "gene",
+                "query_start": "0",
+                "query_end": "5",
+                "score": "50.0",
+                "evalue": "1e-10",
+                "identity": "90.0",
+            },
+            response.data[1],
+        )
+        self.assertEqual("10.0", response.data[2]["score"])
+        self.assertIsNone(response.data[0]["identity"])
+        # a single query, whatever the number of matches
+        self.assertLessEqual(num_queries, 2)
+
+        for params, expected in [
+            ({"limit": 1}, ["hit2"]),
+            ({"program": "DIAMOND"}, ["hit0", "hit1"]),
+            ({"min_identity": 50}, ["hit0"]),
+            ({"max_evalue": 1e-5, "program": "diamond"}, ["hit0"]),
+        ]:
+            response, num_queries = get_similarity(**params)
+            self.assertEqual(expected, [i["unique"] for i in response.data])
+
+        for params in [{"limit": 0}, {"limit": "a"}, {"max_evalue": "a"}]:
+            response, num_queries = get_similarity(**params)
+            self.assertEqual(400, response.status_code)
+
+        # the matches of the query to itself are not listed
+        self_match = self.create_feature("match_part3", "exon")
+        Analysisfeature.objects.create(
+            feature=self_match,
+            analysis=analyses["diamond"],
+            identity=100,
+            rawscore=100.0,
+            significance=0,
+        )
+        for rank in range(2):
+            Featureloc.objects.create(
+                feature=self_match,
+                srcfeature=query,
+                fmin=0,
+                fmax=100,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=rank,
+            )
+        response, num_queries = get_similarity()
+        self.assertEqual(["hit2", "hit0", "hit1"], [i["unique"] for i in response.data])
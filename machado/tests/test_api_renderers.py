@@ -0,0 +1,42 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests API renderers."""
+
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+
+from machado.api.renderers import ORJSONRenderer, stream_json
+
+
+class RenderersTest(TestCase):
+    """Tests API - renderers."""
+
+    def test_orjson_renderer(self):
+        """Tests - ORJSONRenderer."""
+        renderer = ORJSONRenderer()
+        data = {"features": [{"start": 1, "score": Decimal("0.5"), "seq": None}]}
+        self.assertEqual(
+            {"features": [{"start": 1, "score": 0.5, "seq": None}]},
+            json.loads(renderer.render(data)),
+        )
+        self.assertEqual(b"", renderer.render(None))
+
+    @mock.patch("machado.api.renderers.STREAM_CHUNK_SIZE", 2)
+    def test_stream_json(self):
+        """Tests - stream_json."""
+        items = [{"id": i} for i in range(5)]
+        chunks = list(stream_json(iter(items)))
+        self.assertEqual(5, len(chunks))
+        self.assertEqual(items, json.loads(b"".join(chunks)))
+        self.assertEqual(
+            {"features": items},
+            json.loads(b"".join(stream_json(items, key="features"))),
+        )
+        self.assertEqual([], json.loads(b"".join(stream_json([]))))
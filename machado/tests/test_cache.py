@@ -0,0 +1,125 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests versioned cache."""
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, RequestFactory
+
+from machado.cache import versioned_cache_key, versioned_cache_page
+from machado.models import History
+
+
+class VersionedCacheTest(TestCase):
+    """Tests versioned cache."""
+
+    def setUp(self):
+        """Set up."""
+        cache.clear()
+        self.factory = RequestFactory()
+        self.calls = 0
+
+        def view(request):
+            self.calls += 1
+            return HttpResponse("calls {}".format(self.calls))
+
+        self.view = versioned_cache_page(60 * 60)(view)
+
+    def load(self, command="load"):
+        """Record a successful load."""
+        history = History()
+        history.start(command=command, params="")
+        history.success(description="Done")
+        return history
+
+    def test_generation(self):
+        """Tests - get_cache_generation."""
+        self.assertEqual((0, None), History.get_cache_generation())
+        history = self.load()
+        self.assertEqual(history.history_id, History.get_cache_generation()[0])
+        failed = History()
+        failed.start(command="load", params="")
+        failed.failure(description="Error")
+        cache.clear()
+        self.assertEqual(history.history_id, History.get_cache_generation()[0])
+        # the search index commands don't change the generation
+        self.load(command="update_search_index")
+        self.assertEqual(history.history_id, History.get_cache_generation()[0])
+        cache.delete(History.CACHE_GENERATION_KEY)
+        self.assertEqual(history.history_id, History.get_cache_generation()[0])
+
+    def test_key(self):
+        """Tests - versioned_cache_key."""
+        key = versioned_cache_key("tile", 1, "gene")
+        self.assertEqual("tile:0:1:gene", key)
+        history = self.load()
+        self.assertEqual(
+            "tile:{}:1:gene".format(history.history_id),
+            versioned_cache_key("tile", 1, "gene"),
+        )
+
+    def test_page(self):
+        """Tests - versioned_cache_page."""
+        response = self.view(self.factory.get("/data/"))
+        self.assertEqual(b"calls 1", response.content)
+        self.assertIn("no-cache", response["Cache-Control"])
+        etag = response["ETag"]
+        self.assertNotIn("Last-Modified", response)
+
+        response = self.view(self.factory.get("/data/"))
+        self.assertEqual(b"calls 1", response.content)
+        self.assertEqual(etag, response["ETag"])
+        response = self.view(self.factory.get("/data/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(304, response.status_code)
+
+        self.load()
+        response = self.view(self.factory.get("/data/", HTTP_IF_NONE_MATCH=etag))
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"calls 2", response.content)
+        self.assertNotEqual(etag, response["ETag"])
+        self.assertIn("Last-Modified", response)
+
+        response = self.view(self.factory.post("/data/"))
+        self.assertEqual(b"calls 3", response.content)
+        self.assertNotIn("ETag", response)
+
+    def test_page_vary(self):
+        """Tests - versioned_cache_page, ETag of negotiated responses."""
+
+        def view(request):
+            response = HttpResponse(request.headers.get("Accept", ""))
+            response["Vary"] = "Accept, Accept-Language"
+            return response
+
+        view = versioned_cache_page(60 * 60)(view)
+        json = view(self.factory.get("/vary/", HTTP_ACCEPT="application/json"))
+        html = view(self.factory.get("/vary/", HTTP_ACCEPT="text/html"))
+        self.assertNotEqual(json["ETag"], html["ETag"])
+        self.assertNotEqual(
+            json["ETag"],
+            view(
+                self.factory.get(
+                    "/vary/", HTTP_ACCEPT="application/json", HTTP_ACCEPT_LANGUAGE="pt"
+                )
+            )["ETag"],
+        )
+        response = view(
+            self.factory.get(
+                "/vary/", HTTP_ACCEPT="text/html", HTTP_IF_NONE_MATCH=json["ETag"]
+            )
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b"text/html", response.content)
+
+        # DRF adds the Vary header after the viewset methods return
+        response = self.view(self.factory.get("/data/", HTTP_ACCEPT="text/html"))
+        self.assertNotEqual(
+            response["ETag"],
+            self.view(self.factory.get("/data/", HTTP_ACCEPT="application/json"))[
+                "ETag"
+            ],
+        )
@@ -0,0 +1,579 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests search index preparation."""
+
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import numpy as np
+import pysam
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from machado.indexing import build_search_partition, clear_index_updates
+from machado.indexing import get_index_data
+from machado.indexing import get_index_partitions, get_index_updates
+from machado.indexing import get_orthologs_biomaterials, get_search_schema
+from machado.indexing import load_index_data, load_orthologous_groups
+from machado.indexing import overlapping_pairs, prepare_in_chunks
+from machado.indexing import start_index_update
+from machado.models import Analysis, Analysisfeature, Cv, Cvterm, Db, Dbxref
+from machado.models import Feature, FeatureCvterm, FeatureDbxref, Featureloc
+from machado.models import Featureprop, FeatureRelationship, History, Organism, Pub
+from machado.models import SearchDocument
+
+
+class OverlappingPairsTest(TestCase):
+    """Tests Indexing - overlapping pairs."""
+
+    def test_overlapping_pairs(self):
+        """Tests - overlapping pairs."""
+        queries, targets = overlapping_pairs(
+            np.array([10, 100]),
+            np.array([20, 200]),
+            np.array([0, 20, 21, 150, 5, 0]),
+            np.array([9, 25, 30, 150, 15, 1000]),
+        )
+        self.assertEqual([0, 0, 0, 1, 1], queries.tolist())
+        self.assertEqual([1, 4, 5, 3, 5], targets.tolist())
+
+        rng = random.Random(0)
+        query_fmin = np.array([rng.randrange(10000) for i in range(200)])
+        query_fmax = query_fmin + [rng.randrange(500) for i in range(200)]
+        fmin = np.array([rng.randrange(10000) for i in range(500)])
+        fmax = fmin + [rng.choice([0, 1, 50, 5000]) for i in range(500)]
+        expected = [
+            (i, j)
+            for i in range(len(query_fmin))
+            for j in range(len(fmin))
+            if fmin[j] <= query_fmax[i] and fmax[j] >= query_fmin[i]
+        ]
+        queries, targets = overlapping_pairs(query_fmin, query_fmax, fmin, fmax)
+        self.assertEqual(expected, list(zip(queries.tolist(), targets.tolist())))
+
+
+@override_settings(MACHADO_VALID_TYPES=["gene", "mRNA"])
+class IndexingTest(TestCase):
+    """Tests Indexing."""
+
+    def setUp(self):
+        """Set up."""
+        cache.clear()
+        self.db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        fp_cv = Cv.objects.create(name="feature_property")
+        self.cvterms = dict()
+        for name, cv in [
+            ("chromosome", so_cv),
+            ("gene", so_cv),
+            ("mRNA", so_cv),
+            ("SNV", so_cv),
+            ("protein_match", so_cv),
+            ("match_part", so_cv),
+            ("polypeptide", so_cv),
+            ("part_of", so_cv),
+            ("translation_of", so_cv),
+            ("display", fp_cv),
+            ("orthologous group", fp_cv),
+            ("coexpression group", fp_cv),
+        ]:
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=Dbxref.objects.create(accession=name, db=self.db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        self.chromosome = self.create_feature("chr1", "chromosome")
+        self.pub = Pub.objects.create(uniquename="pub", type=self.cvterms["display"])
+        self.analysis = Analysis.objects.create(
+            program="diamond",
+            programversion="1.0",
+            timeexecuted=datetime.now(timezone.utc),
+        )
+
+    def create_feature(self, uniquename, soterm, fmin=None, name=None):
+        """Create a feature, located in chr1 if fmin is set."""
+        feature = Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            name=name,
+            type=self.cvterms[soterm],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        if fmin is not None:
+            self.create_featureloc(feature, self.chromosome, fmin)
+        return feature
+
+    def create_featureloc(self, feature, srcfeature, fmin, rank=0):
+        """Create a featureloc of 100 bases."""
+        Featureloc.objects.create(
+            feature=feature,
+            srcfeature=srcfeature,
+            fmin=fmin,
+            fmax=fmin + 100,
+            is_fmin_partial=False,
+            is_fmax_partial=False,
+            locgroup=0,
+            rank=rank,
+        )
+
+    def create_gene(self, i):
+        """Create a gene, its mRNA and related data."""
+        gene = self.create_feature("gene{}".format(i), "gene", i * 1000)
+        mrna = self.create_feature("mRNA{}".format(i), "mRNA", i * 1000)
+        FeatureRelationship.objects.create(
+            subject=mrna, object=gene, type=self.cvterms["part_of"], rank=0
+        )
+        Featureprop.objects.create(
+            feature=gene,
+            type=self.cvterms["display"],
+            value="gene {}".format(i),
+            rank=0,
+        )
+        FeatureDbxref.objects.create(
+            feature=gene,
+            dbxref=Dbxref.objects.create(accession="X{}".format(i), db=self.db),
+            is_current=True,
+        )
+        FeatureCvterm.objects.create(
+            feature=gene,
+            cvterm=self.cvterms["SNV"],
+            pub=self.pub,
+            is_not=False,
+            rank=0,
+        )
+        protein_match = self.create_feature(
+            "PF{}".format(i), "protein_match", name="domain"
+        )
+        FeatureRelationship.objects.create(
+            subject=protein_match, object=gene, type=self.cvterms["part_of"], rank=0
+        )
+        self.create_feature("snv{}".format(i), "SNV", i * 1000 + 50, name="rs")
+        match_part = self.create_feature("match_part{}".format(i), "match_part")
+        Analysisfeature.objects.create(feature=match_part, analysis=self.analysis)
+        self.create_featureloc(match_part, gene, 0)
+        self.create_featureloc(match_part, protein_match, 0, rank=1)
+        return gene
+
+    def test_load_index_data(self):
+        """Tests - load index data."""
+        genes = [self.create_gene(i) for i in range(1, 3)]
+        features = list(Feature.objects.filter(feature_id=genes[0].feature_id))
+        # cached until the next load
+        get_search_schema()
+        with CaptureQueriesContext(connection) as queries:
+            load_index_data(features)
+        num_queries = len(queries)
+
+        data = get_index_data(features[0])
+        self.assertEqual(["X1"], data["dbxrefs"])
+        self.assertEqual([["SO", "SNV", "SNV"]], data["cvterms"])
+        self.assertEqual([["PF1", "domain"]], data["protein_matches"])
+        self.assertEqual({"diamond"}, data["programs"])
+        mrna = Feature.objects.get(uniquename="mRNA1")
+        self.assertEqual([(mrna.feature_id, "mRNA")], data["relationships"])
+        self.assertEqual([("snv1", "rs")], data["overlapping"])
+
+        # the data is memoized by the Feature methods
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual("gene 1", features[0].get_display())
+            self.assertEqual(list(), features[0].get_annotation())
+            self.assertEqual(set(), features[0].get_doi())
+            self.assertEqual(list(), features[0].get_expression_samples())
+        self.assertEqual(0, len(queries))
+
+        # the number of queries doesn't grow with the number of features
+        features = list(Feature.objects.filter(type=self.cvterms["gene"]))
+        with CaptureQueriesContext(connection) as queries:
+            load_index_data(features)
+        self.assertEqual(num_queries, len(queries))
+        self.assertEqual(
+            [[("snv1", "rs")], [("snv2", "rs")]],
+            [get_index_data(feature)["overlapping"] for feature in features],
+        )
+
+    def test_prepare_in_chunks(self):
+        """Tests - prepare in chunks."""
+        for i in range(1, 4):
+            self.create_gene(i)
+        queryset = prepare_in_chunks(
+            Feature.objects.filter(type=self.cvterms["gene"]).order_by("feature_id")
+        )
+        get_search_schema()
+        with CaptureQueriesContext(connection) as queries:
+            features = list(queryset.all()[1:3])
+            self.assertEqual(["gene2", "gene3"], [i.uniquename for i in features])
+            self.assertEqual(
+                [["X2"], ["X3"]], [get_index_data(i)["dbxrefs"] for i in features]
+            )
+            self.assertEqual("Mus", features[0].organism.genus)
+            self.assertEqual("gene", features[0].type.name)
+        num_queries = len(queries)
+        with CaptureQueriesContext(connection) as queries:
+            list(queryset.all()[0:1])
+        self.assertEqual(num_queries, len(queries))
+
+        # the orthologous groups are shared by the slices of the queryset
+        Featureprop.objects.create(
+            feature=features[0],
+            type=self.cvterms["orthologous group"],
+            value="OG1",
+            rank=0,
+        )
+        queryset = prepare_in_chunks(
+            Feature.objects.filter(type=self.cvterms["gene"]).order_by("feature_id")
+        )
+        list(queryset.all()[1:2])
+        self.assertEqual(["OG1"], list(queryset._iterable_class.orthologous_groups))
+        group = queryset._iterable_class.orthologous_groups["OG1"]
+        features = list(queryset.all()[0:2])
+        self.assertIs(group, get_index_data(features[1])["orthologous_group"])
+
+    def test_orthologous_groups(self):
+        """Tests - orthologous groups."""
+        proteins = list()
+        mrnas = list()
+        for i, group in enumerate(["OG1", "OG1", "OG2"]):
+            protein = self.create_feature("protein{}".format(i), "polypeptide")
+            mrna = self.create_feature("mRNA{}".format(i), "mRNA")
+            FeatureRelationship.objects.create(
+                subject=mrna,
+                object=protein,
+                type=self.cvterms["translation_of"],
+                rank=0,
+            )
+            Featureprop.objects.create(
+                feature=protein,
+                type=self.cvterms["orthologous group"],
+                value=group,
+                rank=0,
+            )
+            proteins.append(protein)
+            mrnas.append(mrna)
+        Featureprop.objects.create(
+            feature=mrnas[1], type=self.cvterms["coexpression group"], value="C", rank=0
+        )
+
+        groups = dict()
+        load_index_data(proteins[:2], orthologous_groups=groups)
+        group = get_index_data(proteins[0])["orthologous_group"]
+        self.assertIs(group, get_index_data(proteins[1])["orthologous_group"])
+        self.assertEqual([mrnas[0].feature_id, mrnas[1].feature_id], group["mrnas"])
+        self.assertTrue(group["coexpression"])
+        self.assertEqual(["OG1"], list(groups))
+
+        # the groups are loaded once
+        with CaptureQueriesContext(connection) as queries:
+            load_orthologous_groups(groups, {"OG1"})
+        self.assertEqual(0, len(queries))
+        load_index_data(proteins[2:], orthologous_groups=groups)
+        self.assertEqual(["OG1", "OG2"], sorted(groups))
+        self.assertFalse(groups["OG2"]["coexpression"])
+        self.assertIsNone(get_index_data(mrnas[0])["orthologous_group"])
+
+        self.assertEqual(list(), get_orthologs_biomaterials(group))
+        with CaptureQueriesContext(connection) as queries:
+            get_orthologs_biomaterials(group)
+        self.assertEqual(0, len(queries))
+
+    @override_settings(MACHADO_INDEX_UPDATE=True)
+    def test_index_updates(self):
+        """Tests - index updates."""
+        gene = self.create_gene(1)
+        mrna = Feature.objects.get(uniquename="mRNA1")
+        snv = Feature.objects.get(uniquename="snv1")
+        proteins = list()
+        for i, group in enumerate(["OG1", "OG1", "OG2"]):
+            proteins.append(self.create_feature("protein{}".format(i), "polypeptide"))
+            Featureprop.objects.create(
+                feature=proteins[i],
+                type=self.cvterms["orthologous group"],
+                value=group,
+                rank=0,
+            )
+        FeatureRelationship.objects.create(
+            subject=mrna,
+            object=proteins[2],
+            type=self.cvterms["translation_of"],
+            rank=0,
+        )
+        obsolete = self.create_feature("gene2", "gene")
+        clear_index_updates(get_index_updates()[1])
+
+        history = History()
+        history.start(command="load_test", params="")
+        index_update = start_index_update(history)
+        new_snv = self.create_feature("snv", "SNV", 1020)
+        new_protein = self.create_feature("protein3", "polypeptide")
+        Featureprop.objects.create(
+            feature=new_protein,
+            type=self.cvterms["orthologous group"],
+            value="OG1",
+            rank=0,
+        )
+        Featureprop.objects.create(
+            feature=mrna, type=self.cvterms["coexpression group"], value="C", rank=0
+        )
+        obsolete.is_obsolete = True
+        obsolete.save()
+        index_update.add(obsolete.feature_id)
+        history.success(description="Done")
+
+        feature_ids, last_id = get_index_updates()
+        expected = [
+            # the new features, the srcfeature of the new location
+            new_snv.feature_id,
+            new_protein.feature_id,
+            self.chromosome.feature_id,
+            # the features overlapping the new SNV
+            gene.feature_id,
+            mrna.feature_id,
+            snv.feature_id,
+            # the members of the orthologous groups
+            proteins[0].feature_id,
+            proteins[1].feature_id,
+            proteins[2].feature_id,
+            obsolete.feature_id,
+        ]
+        self.assertEqual(sorted(expected), feature_ids)
+        self.assertLess(0, clear_index_updates(last_id))
+        self.assertEqual((list(), 0), get_index_updates())
+
+        # the removed features are stored right away
+        history = History()
+        history.start(command="remove_test", params="")
+        start_index_update(history).add_removed(
+            "SELECT feature_id FROM feature WHERE uniquename = %s", ["protein0"]
+        )
+        self.assertEqual(
+            sorted(
+                [proteins[0].feature_id, proteins[1].feature_id, new_protein.feature_id]
+            ),
+            get_index_updates()[0],
+        )
+        clear_index_updates(get_index_updates()[1])
+
+        # nothing is recorded by a failed command
+        history = History()
+        history.start(command="load_test", params="")
+        start_index_update(history).add(obsolete.feature_id)
+        self.create_feature("protein4", "polypeptide")
+        history.failure(description="Failed")
+        self.assertEqual((list(), 0), get_index_updates())
+
+    def test_index_updates_disabled(self):
+        """Tests - index updates, not enabled in the settings."""
+        history = History()
+        history.start(command="load_test", params="")
+        self.assertIsNone(start_index_update(history))
+        self.create_feature("protein0", "polypeptide")
+        history.success(description="Done")
+        self.assertEqual((list(), 0), get_index_updates())
+
+    def test_search_schema(self):
+        """Tests - search schema."""
+        cache.clear()
+        self.create_gene(1)
+        expected = {
+            "orthology": False,
+            "coexpression": False,
+            "overlapping_features": True,
+            "programs": ["diamond"],
+        }
+        self.assertEqual(expected, get_search_schema())
+
+        Featureprop.objects.create(
+            feature=self.chromosome,
+            type=self.cvterms["orthologous group"],
+            value="OG1",
+            rank=0,
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(expected, get_search_schema())
+
+        history = History()
+        history.start(command="load_test", params="")
+        history.success(description="Done")
+        expected["orthology"] = True
+        self.assertEqual(expected, get_search_schema())
+
+    def test_index_partitions(self):
+        """Tests - index partitions."""
+        genes = [self.create_feature("gene{}".format(i), "gene") for i in range(5)]
+        other = Organism.objects.create(genus="Homo", species="sapiens")
+        Feature.objects.filter(feature_id=genes[4].feature_id).update(organism=other)
+        feature_ids = [gene.feature_id for gene in genes]
+
+        queryset = Feature.objects.filter(type=self.cvterms["gene"]).order_by(
+            "feature_id"
+        )
+        self.assertEqual(
+            [feature_ids[:3], feature_ids[3:]],
+            get_index_partitions(queryset, partitions=2),
+        )
+        self.assertEqual(
+            [[i] for i in feature_ids], get_index_partitions(queryset, partitions=10)
+        )
+        self.assertEqual(
+            [feature_ids[:2], feature_ids[2:4]],
+            get_index_partitions(queryset.filter(organism=self.organism), 2),
+        )
+        self.assertEqual(list(), get_index_partitions(queryset.none(), 2))
+
+
+def failing_partition(feature_ids, batch_size, using):
+    """Fail the first time a partition is indexed, see SearchIndexCommandsTest."""
+    marker = os.path.join(os.environ["MACHADO_TEST_TMPDIR"], str(feature_ids[0]))
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        raise RuntimeError("failed")
+    return build_search_partition(feature_ids, batch_size, using)
+
+
+def broken_partition(feature_ids, batch_size, using):
+    """Always fail, see SearchIndexCommandsTest."""
+    raise RuntimeError("broken")
+
+
+class SearchIndexCommandsTest(TransactionTestCase):
+    """Tests the search index commands.
+
+    The commands index the features by threads and processes with their own
+    database connections, so the data must be committed.
+    """
+
+    def setUp(self):
+        """Set up."""
+        cache.clear()
+        so_db = Db.objects.create(name="SO")
+        for name, cv_name in [
+            ("assembly", "sequence"),
+            ("gene", "sequence"),
+            ("polypeptide", "sequence"),
+            ("protein_match", "sequence"),
+            ("part_of", "sequence"),
+            ("located in", "relationship"),
+            ("exact", "synonym_type"),
+        ]:
+            Cvterm.objects.create(
+                name=name,
+                cv=Cv.objects.get_or_create(name=cv_name)[0],
+                dbxref=Dbxref.objects.create(accession=name, db=so_db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        organism = Organism.objects.create(genus="Mus", species="musculus")
+        Feature.objects.create(
+            dbxref=Dbxref.objects.create(
+                accession="contig1", db=Db.objects.create(name="FASTA_SOURCE")
+            ),
+            organism=organism,
+            uniquename="contig1",
+            type=Cvterm.objects.get(name="assembly"),
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        self.tmpdir = tempfile.mkdtemp()
+        gff = os.path.join(self.tmpdir, "genes.gff")
+        with open(gff, "w") as gff_file:
+            for i in range(1, 7):
+                gff_file.write(
+                    "contig1\ttest\tgene\t{}\t{}\t.\t+\t.\tID=gene{}\n".format(
+                        i * 100, i * 100 + 50, i
+                    )
+                )
+        self.file = pysam.tabix_index(gff, preset="gff")
+        os.environ["MACHADO_TEST_TMPDIR"] = self.tmpdir
+
+    def tearDown(self):
+        """Tear down."""
+        shutil.rmtree(self.tmpdir)
+        del os.environ["MACHADO_TEST_TMPDIR"]
+        # the chado tables are not managed, so they are not flushed
+        with connection.cursor() as cursor:
+            cursor.execute("TRUNCATE db, cv, organism CASCADE")
+
+    @override_settings(MACHADO_INDEX_UPDATE=True)
+    def test_update_search_index(self):
+        """Tests - update_search_index after load_gff and remove_file."""
+        call_command("load_gff", file=self.file, organism="Mus musculus", verbosity=0)
+        call_command("update_search_index", verbosity=0)
+        self.assertEqual(
+            ["gene{}".format(i) for i in range(1, 7)],
+            sorted(i.document["uniquename"] for i in SearchDocument.objects.all()),
+        )
+        self.assertEqual((list(), 0), get_index_updates())
+
+        # the documents of the removed features are removed
+        call_command("remove_file", name="genes.gff.gz", verbosity=0)
+        call_command("update_search_index", verbosity=0)
+        self.assertFalse(SearchDocument.objects.exists())
+
+    def test_build_search_index(self):
+        """Tests - build_search_index."""
+        call_command("load_gff", file=self.file, organism="Mus musculus", verbosity=0)
+        call_command("build_search_index", cpu=1, partitions=2, verbosity=0)
+        self.assertEqual(6, SearchDocument.objects.count())
+        self.assertEqual(
+            "6 documents indexed",
+            History.objects.filter(command="build_search_index").get().description,
+        )
+
+        human = Organism.objects.create(genus="Homo", species="sapiens")
+        Feature.objects.create(
+            organism=human,
+            uniquename="HsGene1",
+            type=Cvterm.objects.get(name="gene"),
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        # the failed partitions are retried
+        with patch(
+            "machado.management.commands.build_search_index.build_search_partition",
+            failing_partition,
+        ):
+            call_command(
+                "build_search_index",
+                cpu=1,
+                organism="Homo sapiens",
+                clear=True,
+                verbosity=0,
+            )
+        self.assertEqual(
+            ["HsGene1"],
+            [i.document["uniquename"] for i in SearchDocument.objects.all()],
+        )
+
+        with patch(
+            "machado.management.commands.build_search_index.build_search_partition",
+            broken_partition,
+        ):
+            with self.assertRaisesMessage(CommandError, "partition 0: broken"):
+                call_command("build_search_index", cpu=1, retries=1, verbosity=0)
+        self.assertEqual(
+            1,
+            History.objects.filter(command="build_search_index", exit_code=1).count(),
+        )
+        with self.assertRaises(CommandError):
+            call_command("build_search_index", cpu=1, organism="Foo bar", verbosity=0)
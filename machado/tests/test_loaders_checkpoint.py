@@ -0,0 +1,214 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests checkpoint loader."""
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import pysam
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+
+from machado.loaders.checkpoint import CheckpointRecorder
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.feature import FeatureLoader
+from machado.loaders.provenance import ProvenanceRecorder
+from machado.models import Checkpoint, Cv, Cvterm, Db, Dbxref, Feature
+from machado.models import History, Organism, Provenance
+
+
+class CheckpointRecorderTest(TestCase):
+    """Tests Loaders - CheckpointRecorder."""
+
+    def test_save(self):
+        """Tests - save."""
+        history = History()
+        history.start(command="load_gff", params="")
+        checkpoint = CheckpointRecorder(
+            history=history, command="load_gff", filename="test.gff", interval=10
+        )
+        self.assertEqual(0, checkpoint.start)
+
+        checkpoint.count("features", 5)
+        checkpoint.save(5, contig="chr1")
+        test_checkpoint = Checkpoint.objects.get(history=history)
+        self.assertEqual(0, test_checkpoint.record)
+
+        checkpoint.save(12, contig="chr2")
+        test_checkpoint = Checkpoint.objects.get(history=history)
+        self.assertEqual(12, test_checkpoint.record)
+        self.assertEqual("chr2", test_checkpoint.contig)
+        self.assertEqual({"features": 5}, json.loads(test_checkpoint.counters))
+
+        checkpoint.save(15, force=True)
+        self.assertEqual(15, Checkpoint.objects.get(history=history).record)
+
+    def test_save_provenance(self):
+        """Tests - save the pending provenance with the checkpoint."""
+        history = History()
+        history.start(command="load_gff", params="")
+        provenance = ProvenanceRecorder(history=history, filename="test.gff")
+        checkpoint = CheckpointRecorder(
+            history=history,
+            command="load_gff",
+            filename="test.gff",
+            interval=10,
+            provenance=provenance,
+        )
+        provenance.add("feature", 1)
+        checkpoint.save(5)
+        self.assertFalse(Provenance.objects.exists())
+        checkpoint.save(10)
+        self.assertEqual(1, Provenance.objects.filter(filename="test.gff").count())
+        self.assertEqual({}, provenance.runs)
+
+    def test_resume(self):
+        """Tests - resume."""
+        with self.assertRaisesMessage(
+            ImportingError, "No interrupted load_gff of test.gff to resume"
+        ):
+            history = History()
+            history.start(command="load_gff", params="")
+            CheckpointRecorder(
+                history=history, command="load_gff", filename="test.gff", resume=True
+            )
+
+        checkpoint = CheckpointRecorder(
+            history=history, command="load_gff", filename="test.gff", interval=1
+        )
+        checkpoint.count("features", 20)
+        checkpoint.save(20)
+        history.failure(description="interrupted")
+
+        history2 = History()
+        history2.start(command="load_gff", params="")
+        resumed = CheckpointRecorder(
+            history=history2, command="load_gff", filename="test.gff", resume=True
+        )
+        self.assertEqual(20, resumed.start)
+        self.assertEqual({"features": 20}, resumed.counters)
+        self.assertEqual(20, Checkpoint.objects.get(history=history2).record)
+
+        # a successful load cannot be resumed
+        history2.success(description="Done")
+        with self.assertRaises(ImportingError):
+            CheckpointRecorder(
+                history=history, command="load_gff", filename="test.gff", resume=True
+            )
+
+    def test_interval(self):
+        """Tests - invalid interval."""
+        history = History()
+        history.start(command="load_gff", params="")
+        with self.assertRaisesMessage(
+            ImportingError, "The checkpoint interval must be a positive integer"
+        ):
+            CheckpointRecorder(
+                history=history, command="load_gff", filename="test.gff", interval=0
+            )
+
+
+class CheckpointResumeTest(TransactionTestCase):
+    """Tests Commands - load_gff --resume."""
+
+    def setUp(self):
+        """Set up."""
+        so_db = Db.objects.create(name="SO")
+        for name, cv_name in [
+            ("assembly", "sequence"),
+            ("gene", "sequence"),
+            ("polypeptide", "sequence"),
+            ("protein_match", "sequence"),
+            ("part_of", "sequence"),
+            ("located in", "relationship"),
+            ("exact", "synonym_type"),
+        ]:
+            Cvterm.objects.create(
+                name=name,
+                cv=Cv.objects.get_or_create(name=cv_name)[0],
+                dbxref=Dbxref.objects.create(accession=name, db=so_db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        organism = Organism.objects.create(genus="Mus", species="musculus")
+        Feature.objects.create(
+            dbxref=Dbxref.objects.create(
+                accession="contig1", db=Db.objects.create(name="FASTA_SOURCE")
+            ),
+            organism=organism,
+            uniquename="contig1",
+            type=Cvterm.objects.get(name="assembly"),
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        self.tmpdir = tempfile.mkdtemp()
+        gff = os.path.join(self.tmpdir, "genes.gff")
+        with open(gff, "w") as gff_file:
+            for i in range(1, 7):
+                gff_file.write(
+                    "contig1\ttest\tgene\t{}\t{}\t.\t+\t.\tID=gene{}\n".format(
+                        i * 100, i * 100 + 50, i
+                    )
+                )
+        self.file = pysam.tabix_index(gff, preset="gff")
+
+    def tearDown(self):
+        """Tear down."""
+        shutil.rmtree(self.tmpdir)
+
+    def test_resume_remove_file(self):
+        """Tests - crash, resume and remove the file."""
+        store = FeatureLoader.store_tabix_GFF_feature
+        flush = ProvenanceRecorder.flush
+        stored = list()
+        killed = list()
+
+        def crashing_store(loader, tabix_feature, qtl):
+            if len(stored) == 4:
+                killed.append(tabix_feature)
+                raise RuntimeError("killed")
+            stored.append(tabix_feature)
+            return store(loader, tabix_feature, qtl)
+
+        def crashing_flush(recorder):
+            # nothing is written once the load is killed
+            if killed:
+                raise RuntimeError("killed")
+            return flush(recorder)
+
+        with patch.object(
+            FeatureLoader, "store_tabix_GFF_feature", crashing_store
+        ), patch.object(ProvenanceRecorder, "flush", crashing_flush):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    "load_gff",
+                    file=self.file,
+                    organism="Mus musculus",
+                    checkpoint=2,
+                    verbosity=0,
+                )
+        self.assertEqual(4, Feature.objects.filter(type__name="gene").count())
+        self.assertEqual(4, Checkpoint.objects.get().record)
+
+        call_command(
+            "load_gff",
+            file=self.file,
+            organism="Mus musculus",
+            resume=True,
+            verbosity=0,
+        )
+        self.assertEqual(6, Feature.objects.filter(type__name="gene").count())
+
+        call_command("remove_file", name="genes.gff.gz", verbosity=0)
+        self.assertFalse(Feature.objects.filter(type__name="gene").exists())
+        self.assertTrue(Feature.objects.filter(uniquename="contig1").exists())
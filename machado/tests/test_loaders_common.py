@@ -7,13 +7,15 @@
 """Tests Loaders - Common."""
 
 import os
+from datetime import datetime, timezone
 
 from django.test import TestCase
 
 from machado.loaders.common import FileValidator
 from machado.loaders.common import insert_organism, retrieve_organism
+from machado.loaders.common import retrieve_overlapping_featurelocs
 from machado.loaders.exceptions import ImportingError
-from machado.models import Cv, Cvterm, Db, Dbxref, Organism
+from machado.models import Cv, Cvterm, Db, Dbxref, Feature, Featureloc, Organism
 
 
 class CommonTest(TestCase):
@@ -71,6 +73,61 @@ class CommonTest(TestCase):
         test_organism = retrieve_organism("Bos taurus indicus")
         self.assertEqual("indicus", test_organism.infraspecific_name)
 
+    def test_retrieve_overlapping_featurelocs(self):
+        """Tests - retrieve overlapping featurelocs."""
+        test_db = Db.objects.create(name="SO")
+        test_cv = Cv.objects.create(name="sequence")
+        test_cvterm = Cvterm.objects.create(
+            name="gene",
+            cv=test_cv,
+            dbxref=Dbxref.objects.create(accession="gene", db=test_db),
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        test_organism = Organism.objects.create(genus="Mus", species="musculus")
+        features = dict()
+        for uniquename in ["chr1", "chr2", "gene1", "gene2", "gene3"]:
+            features[uniquename] = Feature.objects.create(
+                organism=test_organism,
+                uniquename=uniquename,
+                type=test_cvterm,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned=datetime.now(timezone.utc),
+                timelastmodified=datetime.now(timezone.utc),
+            )
+        for uniquename, srcfeature, fmin, fmax in [
+            ("gene1", "chr1", 100, 200),
+            ("gene2", "chr1", 300, 400),
+            ("gene3", "chr2", 100, 200),
+        ]:
+            Featureloc.objects.create(
+                feature=features[uniquename],
+                srcfeature=features[srcfeature],
+                fmin=fmin,
+                fmax=fmax,
+                strand=1,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+        chr1_id = features["chr1"].feature_id
+
+        def overlapping(start, end=None):
+            return set(
+                retrieve_overlapping_featurelocs(chr1_id, start, end).values_list(
+                    "feature__uniquename", flat=True
+                )
+            )
+
+        self.assertEqual({"gene1", "gene2"}, overlapping(1))
+        self.assertEqual({"gene1"}, overlapping(150, 250))
+        # the interval is closed on both ends
+        self.assertEqual({"gene1", "gene2"}, overlapping(200, 300))
+        self.assertEqual(set(), overlapping(201, 299))
+        self.assertEqual({"gene2"}, overlapping("350"))
+
     def test_validate_file(self):
         """Tests - validate file."""
         # test file not exists
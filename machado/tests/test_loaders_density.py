@@ -0,0 +1,129 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests feature densities."""
+
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from machado.loaders.density import BIN_SIZES, refresh_feature_densities
+from machado.loaders.density import retrieve_feature_densities
+from machado.loaders.density import retrieve_feature_density
+from machado.loaders.density import store_feature_densities, unpack_counts
+from machado.models import Cv, Cvterm, Db, Dbxref, Organism
+from machado.models import Feature, FeatureDensity, Featureloc
+
+
+class FeatureDensityTest(TestCase):
+    """Tests Loaders - feature densities."""
+
+    def setUp(self):
+        """Set up."""
+        so_db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        self.cvterms = dict()
+        for name in ["chromosome", "gene", "SNV"]:
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=so_cv,
+                dbxref=Dbxref.objects.create(accession=name, db=so_db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        self.chromosome = self.create_feature("chr1", "chromosome")
+        self.chromosome.seqlen = 1000
+        self.chromosome.save()
+        # genes on bins 0, 0-1 and 5 of 100 bases
+        for i, (fmin, fmax) in enumerate([(10, 50), (50, 150), (500, 600)]):
+            self.create_feature("gene{}".format(i), "gene", fmin, fmax)
+        self.create_feature("snv1", "SNV", 120, 121)
+        obsolete = self.create_feature("obsolete", "gene", 10, 50)
+        obsolete.is_obsolete = True
+        obsolete.save()
+
+    def create_feature(self, uniquename, soterm, fmin=None, fmax=None):
+        """Create a feature located in chr1."""
+        feature = Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            type=self.cvterms[soterm],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        if fmin is not None:
+            Featureloc.objects.create(
+                feature=feature,
+                srcfeature=self.chromosome,
+                fmin=fmin,
+                fmax=fmax,
+                strand=1,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+        return feature
+
+    def test_store(self):
+        """Tests - store feature densities."""
+        self.assertEqual(4, store_feature_densities(self.organism, [100, 1000]))
+        gene_id = self.cvterms["gene"].cvterm_id
+        density = FeatureDensity.objects.get(type_id=gene_id, bin_size=100)
+        self.assertEqual(3, density.feature_count)
+        self.assertEqual([2, 1, 0, 0, 0, 1], list(unpack_counts(density.counts)))
+
+        # stored again, replacing the previous densities
+        self.assertEqual(2, store_feature_densities(self.organism, [100]))
+        self.assertEqual(2, FeatureDensity.objects.count())
+
+    def test_refresh(self):
+        """Tests - refresh feature densities."""
+        self.assertEqual(0, refresh_feature_densities([]))
+        self.assertEqual(
+            2 * len(BIN_SIZES), refresh_feature_densities([self.organism.organism_id])
+        )
+        # the bin sizes already stored are kept
+        store_feature_densities(self.organism, [100])
+        self.create_feature("gene3", "gene", 700, 800)
+        self.assertEqual(2, refresh_feature_densities([self.organism.organism_id]))
+        density = FeatureDensity.objects.get(
+            type_id=self.cvterms["gene"].cvterm_id, bin_size=100
+        )
+        self.assertEqual(4, density.feature_count)
+
+    def test_retrieve(self):
+        """Tests - retrieve feature densities."""
+        chr_id = self.chromosome.feature_id
+        gene_id = self.cvterms["gene"].cvterm_id
+        self.assertIsNone(retrieve_feature_densities(chr_id, 0, 1000, 100))
+        self.assertIsNone(retrieve_feature_density(self.organism.organism_id))
+
+        store_feature_densities(self.organism, [100, 1000])
+        # finest level
+        self.assertEqual(
+            ([2, 1, 0, 0, 0, 1], 100),
+            retrieve_feature_densities(chr_id, 0, 600, 100, type_id=gene_id),
+        )
+        # summed from the finest level
+        self.assertEqual(
+            ([3, 1], 100),
+            retrieve_feature_densities(chr_id, 0, 1000, 500, type_id=gene_id),
+        )
+        # coarse level, every type
+        self.assertEqual(([4], 1000), retrieve_feature_densities(chr_id, 0, 1000, 1000))
+        # finer than the finest level
+        self.assertEqual(
+            ([1, 1], 100),
+            retrieve_feature_densities(chr_id, 100, 200, 50, type_id=gene_id),
+        )
+        self.assertEqual(
+            {"featureCount": 3, "featureDensity": 0.003},
+            retrieve_feature_density(self.organism.organism_id, gene_id),
+        )
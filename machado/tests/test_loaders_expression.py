@@ -0,0 +1,124 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests feature expression samples."""
+
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from machado.loaders.analysis import AnalysisLoader
+from machado.loaders.assay import AssayLoader
+from machado.loaders.biomaterial import BiomaterialLoader
+from machado.loaders.expression import refresh_feature_expression_samples
+from machado.loaders.treatment import TreatmentLoader
+from machado.models import Cv, Cvterm, Db, Dbxref, Organism
+from machado.models import Feature, FeatureExpressionSample
+
+
+class FeatureExpressionSampleTest(TestCase):
+    """Tests Loaders - feature expression samples."""
+
+    def test_refresh_feature_expression_samples(self):
+        """Tests - refresh_feature_expression_samples."""
+        organism = Organism.objects.create(genus="Oryza", species="sativa")
+        so_db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        mrna = Cvterm.objects.create(
+            name="mRNA",
+            cv=so_cv,
+            dbxref=Dbxref.objects.create(accession="mRNA", db=so_db),
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        features = [
+            Feature.objects.create(
+                organism=organism,
+                uniquename="mRNA{}".format(i),
+                type=mrna,
+                is_analysis=False,
+                is_obsolete=False,
+                timeaccessioned=datetime.now(timezone.utc),
+                timelastmodified=datetime.now(timezone.utc),
+            )
+            for i in range(2)
+        ]
+        ro_db = Db.objects.create(name="RO")
+        ro_cv = Cv.objects.create(name="relationship")
+        Cvterm.objects.create(
+            name="located in",
+            cv=ro_cv,
+            dbxref=Dbxref.objects.create(accession="located in", db=ro_db),
+            is_obsolete=0,
+            is_relationshiptype=1,
+        )
+
+        biomaterial_loader = BiomaterialLoader()
+        biomaterial = biomaterial_loader.store_biomaterial(
+            db="GEO",
+            acc="GSM1",
+            organism=organism,
+            name="GSM1",
+            filename="info.csv",
+            description="Leaf",
+        )
+        treatment = TreatmentLoader().store_treatment(
+            name="Heat stress", biomaterial=biomaterial
+        )
+        biomaterial_loader.store_biomaterial_treatment(
+            biomaterial=biomaterial, treatment=treatment
+        )
+        assay_loader = AssayLoader()
+        assay = assay_loader.store_assay(
+            db="SRA",
+            acc="SRR1",
+            assaydate="Jul-20-2018",
+            name="SRR1",
+            filename="info.csv",
+            description="heat leaf",
+        )
+        assay_loader.store_assay_biomaterial(assay=assay, biomaterial=biomaterial)
+
+        analysis_loader = AnalysisLoader()
+        analysis = analysis_loader.store_analysis(
+            program="LSTrAP",
+            sourcename="SRR1.htseq",
+            programversion="1.3",
+            name="SRR1",
+            filename="exp_matrix.tpm.txt",
+        )
+        analysis_loader.store_quantification(
+            analysis=analysis, assayacc="SRR1", assaydb="SRA"
+        )
+        for feature, normscore in zip(features, [5.5, 0]):
+            analysis_loader.store_analysisfeature(
+                analysis=analysis,
+                feature=feature,
+                organism=organism,
+                normscore=normscore,
+            )
+
+        self.assertEqual([], features[0].get_expression_samples())
+        refresh_feature_expression_samples()
+        self.assertEqual(1, FeatureExpressionSample.objects.count())
+        # the expression samples are memoized on the instances
+        features = [Feature.objects.get(pk=feature.pk) for feature in features]
+        self.assertEqual(
+            [
+                {
+                    "analysis__sourcename": "SRR1.htseq",
+                    "normscore": 5.5,
+                    "assay_name": "SRR1",
+                    "assay_description": "heat leaf",
+                    "biomaterial_name": "GSM1",
+                    "biomaterial_description": "Leaf",
+                    "treatment_name": "Heat stress",
+                }
+            ],
+            features[0].get_expression_samples(),
+        )
+        # samples with normscore 0 are not listed
+        self.assertEqual([], features[1].get_expression_samples())
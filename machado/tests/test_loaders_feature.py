@@ -13,9 +13,10 @@ from bibtexparser.bibdatabase import BibDatabase
 from django.test import TestCase
 
 from machado.loaders.feature import FeatureLoader, MultispeciesFeatureLoader
+from machado.loaders.provenance import ProvenanceRecorder
 from machado.loaders.publication import PublicationLoader
-from machado.models import Cv, Cvterm, Db, Dbxref, Organism
-from machado.models import Feature, Featureprop
+from machado.models import Cv, Cvterm, Db, Dbxref, History, Organism
+from machado.models import Feature, Featureprop, Fingerprint
 from machado.models import FeatureCvterm, FeatureDbxref
 from machado.models import Featureloc, FeatureRelationship
 from machado.models import Pub, PubDbxref, FeaturePub
@@ -180,17 +181,37 @@ class FeatureTest(TestCase):
         test_tabix_feature2.end = "100"
         test_tabix_feature2.strand = "-"
         test_tabix_feature2.frame = "2"
-        test_tabix_feature2.attributes = "id=id2;name=name2;parent=id1"
+        test_tabix_feature2.attributes = (
+            "id=id2;name=name2;parent=id1;annotation=kinase;"
+            "Ontology_term=GO:0000001,GO:0000002"
+        )
+        test_db_go = Db.objects.create(name="GO")
+        test_cv_go = Cv.objects.create(name="biological_process")
+        for accession in ["0000001", "0000002"]:
+            Cvterm.objects.create(
+                name="go{}".format(accession),
+                cv=test_cv_go,
+                dbxref=Dbxref.objects.create(accession=accession, db=test_db_go),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
 
         # instantiate the loader
+        test_history = History()
+        test_history.start(command="load_gff", params="")
+        test_provenance = ProvenanceRecorder(history=test_history, filename="file.name")
         test_feature_file = FeatureLoader(
-            filename="file.name", source="GFF_source", organism=test_organism
+            filename="file.name",
+            source="GFF_source",
+            organism=test_organism,
+            provenance=test_provenance,
         )
 
         # store the tabix feature
         qtl = False
         test_feature_file.store_tabix_GFF_feature(test_tabix_feature1, qtl)
         test_feature_file.store_tabix_GFF_feature(test_tabix_feature2, qtl)
+        test_provenance.flush()
 
         # store the relationships
         for item in test_feature_file.relationships:
@@ -208,6 +229,79 @@ class FeatureTest(TestCase):
         self.assertEqual(10, test_featureloc.fmin)
         self.assertEqual("id1", test_src_feature.uniquename)
 
+        # delta: update id2 and obsolete id1
+        key, fingerprint = test_feature_file.get_tabix_GFF_fingerprint(
+            test_tabix_feature2
+        )
+        self.assertEqual("id2", key)
+        test_fingerprint = Fingerprint.objects.get(filename="file.name", key="id2")
+        self.assertEqual(fingerprint, test_fingerprint.fingerprint)
+        self.assertEqual(test_feature.feature_id, test_fingerprint.feature_id)
+
+        # an annotation loaded from another file is kept by the delta
+        Featureprop.objects.create(
+            feature=test_feature,
+            type=Cvterm.objects.get(name="annotation", cv__name="feature_property"),
+            value="other file",
+            rank=5,
+        )
+
+        test_tabix_feature2.start = "20"
+        test_tabix_feature2.attributes = (
+            "id=id2;name=name3;parent=id1;annotation=phosphatase;"
+            "Ontology_term=GO:0000001"
+        )
+        test_feature_file.changes = list()
+        test_feature_file.relationships = list()
+        test_feature_file.update_tabix_GFF_feature(
+            test_feature.feature_id, test_tabix_feature2, qtl
+        )
+        for item in test_feature_file.relationships:
+            test_feature_file.store_relationship(item["subject_id"], item["object_id"])
+        test_feature_file.obsolete_tabix_GFF_features(
+            [Feature.objects.get(uniquename="id1").feature_id]
+        )
+
+        test_feature = Feature.objects.get(uniquename="id2")
+        self.assertEqual("name3", test_feature.name)
+        self.assertEqual(20, Featureloc.objects.get(feature=test_feature).fmin)
+        self.assertEqual(
+            [(5, "other file"), (6, "phosphatase")],
+            list(
+                Featureprop.objects.filter(
+                    feature=test_feature, type__name="annotation"
+                )
+                .order_by("rank")
+                .values_list("rank", "value")
+            ),
+        )
+        self.assertEqual(
+            ["go0000001"],
+            list(
+                FeatureCvterm.objects.filter(feature=test_feature).values_list(
+                    "cvterm__name", flat=True
+                )
+            ),
+        )
+        self.assertEqual(
+            1, FeatureRelationship.objects.filter(object=test_feature).count()
+        )
+        self.assertTrue(Feature.objects.get(uniquename="id1").is_obsolete)
+        self.assertEqual(
+            [
+                (test_feature.feature_id, "updated"),
+                (test_src_feature.feature_id, "obsoleted"),
+            ],
+            test_feature_file.changes,
+        )
+        self.assertNotEqual(
+            fingerprint,
+            Fingerprint.objects.get(filename="file.name", key="id2").fingerprint,
+        )
+        self.assertEqual(
+            "", Fingerprint.objects.get(filename="file.name", key="id1").fingerprint
+        )
+
     def test_store_tabix_VCF_feature(self):
         """Tests - store tabix VCF feature / store relationships."""
         # creating exact term
@@ -0,0 +1,215 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests JBrowse exporter."""
+
+import json
+import os
+import tempfile
+import zlib
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.jbrowse import JBrowseExporter, NCListBuilder
+from machado.models import Cv, Cvterm, Db, Dbxref, Organism
+from machado.models import Feature, Featureloc, Featureprop, FeatureRelationship
+
+
+def read_json(*path):
+    """Read a JSON file."""
+    with open(os.path.join(*path)) as handle:
+        return json.load(handle)
+
+
+class NCListBuilderTest(TestCase):
+    """Tests Loaders - NCListBuilder."""
+
+    def test_add(self):
+        """Tests - add."""
+        with tempfile.TemporaryDirectory() as path:
+            builder = NCListBuilder(path=path, chunk_size=10)
+            for start, end in [(0, 100), (10, 50), (20, 30), (40, 120), (40, 60)]:
+                builder.add([0, start, end, 1, "f", None, "gene", None, None])
+            intervals = builder.finish()
+            self.assertEqual(5, intervals["count"])
+            self.assertEqual(0, intervals["minStart"])
+            self.assertEqual(120, intervals["maxEnd"])
+            self.assertNotIn("lazyClass", intervals)
+            nclist = intervals["nclist"]
+            self.assertEqual([(0, 100), (40, 120)], [(f[1], f[2]) for f in nclist])
+            sublist = nclist[0][9]["Sublist"]
+            self.assertEqual([(10, 50)], [(f[1], f[2]) for f in sublist])
+            self.assertEqual(20, sublist[0][9]["Sublist"][0][1])
+            self.assertEqual(40, nclist[1][9]["Sublist"][0][1])
+
+            with self.assertRaisesMessage(
+                ImportingError, "Features must be added sorted by start"
+            ):
+                builder.add([0, 0, 10, 1, "f", None, "gene", None, None])
+
+    def test_chunks(self):
+        """Tests - lazy chunks."""
+        with tempfile.TemporaryDirectory() as path:
+            builder = NCListBuilder(path=path, chunk_size=2)
+            for start in range(5):
+                builder.add(
+                    [0, start * 10, start * 10 + 5, 1, "f", None, "gene", None, None]
+                )
+            builder.add([0, 41, 44, 1, "f", None, "gene", None, None])
+            intervals = builder.finish()
+            self.assertEqual(2, intervals["lazyClass"])
+            self.assertEqual(
+                [[2, 0, 15, 0], [2, 20, 35, 1], [2, 40, 45, 2]], intervals["nclist"]
+            )
+            chunk = read_json(path, "lf-2.json")
+            self.assertEqual(1, len(chunk))
+            self.assertEqual(41, chunk[0][9]["Sublist"][0][1])
+
+
+class JBrowseExporterTest(TestCase):
+    """Tests Loaders - JBrowseExporter."""
+
+    def setUp(self):
+        """Set up."""
+        so_db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        fp_cv = Cv.objects.create(name="feature_property")
+        self.cvterms = dict()
+        for name, cv in [
+            ("chromosome", so_cv),
+            ("gene", so_cv),
+            ("exon", so_cv),
+            ("part_of", so_cv),
+            ("display", fp_cv),
+        ]:
+            dbxref = Dbxref.objects.create(accession=name, db=so_db)
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=dbxref,
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        self.chromosome = self.create_feature("chr1", "chromosome")
+        self.chromosome.residues = "ACGT" * 10
+        self.chromosome.seqlen = 40
+        self.chromosome.save()
+        gene = self.create_feature("gene1", "gene", 10, 30, name="Abc1")
+        exon = self.create_feature("exon1", "exon", 12, 20)
+        FeatureRelationship.objects.create(
+            subject=gene, object=exon, type=self.cvterms["part_of"], rank=0
+        )
+        Featureprop.objects.create(
+            feature=gene, type=self.cvterms["display"], value="gene one", rank=0
+        )
+
+    def create_feature(self, uniquename, soterm, fmin=None, fmax=None, name=None):
+        """Create a feature located in chr1."""
+        feature = Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            name=name,
+            type=self.cvterms[soterm],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        if fmin is not None:
+            Featureloc.objects.create(
+                feature=feature,
+                srcfeature=self.chromosome,
+                fmin=fmin,
+                fmax=fmax,
+                strand=-1,
+                phase=0,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+        return feature
+
+    def test_export(self):
+        """Tests - export."""
+        with tempfile.TemporaryDirectory() as path:
+            exporter = JBrowseExporter(
+                organism=self.organism,
+                path=path,
+                soterms=["gene"],
+                seq_chunk_size=16,
+            )
+            refseqs = exporter.retrieve_refseqs("chromosome")
+            self.assertEqual([(self.chromosome.feature_id, "chr1", 40)], refseqs)
+            exporter.export_refseqs(refseqs)
+            self.assertEqual(1, exporter.export_refseq(refseqs[0]))
+            exporter.export_names()
+            exporter.export_tracklist()
+
+            self.assertEqual(
+                [
+                    {
+                        "name": "chr1",
+                        "start": 0,
+                        "end": 40,
+                        "length": 40,
+                        "seqChunkSize": 16,
+                    }
+                ],
+                read_json(path, "seq", "refSeqs.json"),
+            )
+            sequence = ""
+            for i in range(3):
+                with open(os.path.join(path, "seq", "chr1-{}.txt".format(i))) as f:
+                    sequence += f.read()
+            self.assertEqual("ACGT" * 10, sequence)
+
+            track = read_json(path, "tracks", "gene", "chr1", "trackData.json")
+            self.assertEqual(1, track["featureCount"])
+            self.assertEqual(
+                [
+                    [
+                        0,
+                        10,
+                        30,
+                        -1,
+                        "gene1",
+                        "Abc1",
+                        "gene",
+                        "gene one",
+                        [[1, 12, 20, -1, "exon", 0]],
+                    ]
+                ],
+                track["intervals"]["nclist"],
+            )
+
+            meta = read_json(path, "names", "meta.json")
+            self.assertEqual(["gene"], meta["track_names"])
+            hex_characters = meta["hash_bits"] // 4
+            crc = "{:08x}".format(zlib.crc32(b"abc1"))[-hex_characters:]
+            bucket = read_json(path, "names", crc + ".json")
+            self.assertEqual(
+                [["Abc1", 0, "Abc1", "chr1", 10, 30]], bucket["abc1"]["exact"]
+            )
+            # the spilled names are removed
+            self.assertEqual(
+                ["names", "seq", "trackList.json", "tracks"], sorted(os.listdir(path))
+            )
+
+            tracklist = read_json(path, "trackList.json")
+            self.assertEqual(
+                ["ref_seq", "gene"], [i["label"] for i in tracklist["tracks"]]
+            )
+            self.assertEqual(
+                "tracks/gene/{refseq}/trackData.json",
+                tracklist["tracks"][1]["urlTemplate"],
+            )
+
+        with self.assertRaisesMessage(ImportingError, "No assembly registered"):
+            exporter.retrieve_refseqs("assembly")
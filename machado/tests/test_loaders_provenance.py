@@ -0,0 +1,79 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests provenance loader."""
+
+from django.db import connection
+from django.test import TestCase
+
+from machado.loaders.provenance import ProvenanceRecorder, has_provenance
+from machado.loaders.provenance import provenance_sql, provenance_summary
+from machado.models import Db, History, Provenance
+
+
+class ProvenanceRecorderTest(TestCase):
+    """Tests Loaders - ProvenanceRecorder."""
+
+    def setUp(self):
+        """Set up."""
+        self.history = History()
+        self.history.start(command="load_gff", params="")
+
+    def test_flush(self):
+        """Tests - flush."""
+        recorder = ProvenanceRecorder(history=self.history, filename="test.gff")
+        for row_id in [5, 6, 7, 4, 10, 12, 11, 7]:
+            recorder.add("feature", row_id)
+        recorder.add("dbxrefprop", 1)
+        self.assertFalse(Provenance.objects.exists())
+        recorder.flush()
+
+        ranges = Provenance.objects.filter(table_name="feature").order_by("min_id")
+        self.assertEqual([(4, 7), (10, 12)], [(p.min_id, p.max_id) for p in ranges])
+        self.assertEqual(self.history, ranges[0].history)
+        self.assertTrue(has_provenance("test.gff", "dbxrefprop"))
+        self.assertFalse(has_provenance("test.gff", "analysis"))
+        self.assertFalse(has_provenance("other.gff", "feature"))
+
+        summary = provenance_summary("test.gff")
+        self.assertEqual(
+            {"dbxrefprop": 1, "feature": 7}, {i["table"]: i["rows"] for i in summary}
+        )
+
+        # nothing pending
+        recorder.flush()
+        self.assertEqual(3, Provenance.objects.count())
+
+    def test_flush_size(self):
+        """Tests - flush size."""
+        recorder = ProvenanceRecorder(
+            history=self.history, filename="test.gff", flush_size=2
+        )
+        recorder.add("feature", 1)
+        recorder.add("feature", 3)
+        self.assertEqual(2, Provenance.objects.count())
+        self.assertEqual({}, recorder.runs)
+
+        # consecutive ids are flushed on the number of rows, not of runs
+        for row_id in range(10, 15):
+            recorder.add("feature", row_id)
+        self.assertEqual(
+            [(1, 1), (3, 3), (10, 11), (12, 13)],
+            list(Provenance.objects.order_by("min_id").values_list("min_id", "max_id")),
+        )
+        self.assertEqual(1, recorder.pending)
+
+    def test_provenance_sql(self):
+        """Tests - provenance sql."""
+        recorder = ProvenanceRecorder(history=self.history, filename="test.fasta")
+        db_ids = [Db.objects.create(name="db{}".format(i)).db_id for i in range(5)]
+        for db_id in db_ids[1:4]:
+            recorder.add("db", db_id)
+        recorder.flush()
+
+        with connection.cursor() as cursor:
+            cursor.execute(provenance_sql("db", "db_id"), ["test.fasta"])
+            self.assertEqual(db_ids[1:4], sorted(row[0] for row in cursor.fetchall()))
@@ -0,0 +1,169 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests remove loader."""
+
+from datetime import datetime, timezone
+
+from django.test import TestCase
+
+from machado.loaders.exceptions import ImportingError
+from machado.loaders.remove import ChunkedRemover, FEATURE_DEPENDENTS
+from machado.models import Cv, Cvterm, Db, Dbxref, Dbxrefprop, Organism
+from machado.models import Feature, Featureloc, Featureprop
+
+
+class ChunkedRemoverTest(TestCase):
+    """Tests Loaders - ChunkedRemover."""
+
+    def setUp(self):
+        """Set up."""
+        test_db = Db.objects.create(name="SO")
+        test_cv = Cv.objects.create(name="sequence")
+        test_dbxref = Dbxref.objects.create(accession="00001", db=test_db)
+        self.cvterm_gene = Cvterm.objects.create(
+            name="gene",
+            cv=test_cv,
+            dbxref=test_dbxref,
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        test_dbxref = Dbxref.objects.create(accession="00002", db=test_db)
+        self.cvterm_chr = Cvterm.objects.create(
+            name="chromosome",
+            cv=test_cv,
+            dbxref=test_dbxref,
+            is_obsolete=0,
+            is_relationshiptype=0,
+        )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        self.gff_db = Db.objects.create(name="GFF_SOURCE")
+        self.chromosome = self.create_feature("chr1", self.cvterm_chr, "chr.fasta")
+
+    def create_feature(self, uniquename, cvterm, filename):
+        """Create a feature registered to filename."""
+        dbxref = Dbxref.objects.create(
+            db=self.gff_db, accession=uniquename, version=filename
+        )
+        Dbxrefprop.objects.create(
+            dbxref=dbxref, type=self.cvterm_gene, value=filename, rank=0
+        )
+        return Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            type=cvterm,
+            dbxref=dbxref,
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+
+    def test_remove(self):
+        """Tests - remove."""
+        for i in range(5):
+            feature = self.create_feature(
+                "gene{}".format(i), self.cvterm_gene, "genes.gff"
+            )
+            Featureloc.objects.create(
+                feature=feature,
+                srcfeature=self.chromosome,
+                fmin=i * 100,
+                fmax=i * 100 + 50,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+            Featureprop.objects.create(
+                feature=feature, type=self.cvterm_gene, value="note", rank=0
+            )
+
+        remover = ChunkedRemover(chunk_size=2, verbosity=0)
+        removed = remover.remove(
+            table="feature",
+            pk="feature_id",
+            select_sql="SELECT f.feature_id FROM feature f "
+            "JOIN dbxrefprop dp ON dp.dbxref_id = f.dbxref_id "
+            "WHERE dp.value = %s",
+            params=["genes.gff"],
+            dependents=FEATURE_DEPENDENTS,
+        )
+        self.assertEqual(5, removed)
+        self.assertEqual(5, remover.counts["featureloc"])
+        self.assertEqual(5, remover.counts["featureprop"])
+        self.assertFalse(Feature.objects.filter(type=self.cvterm_gene).exists())
+        self.assertFalse(Featureloc.objects.exists())
+        self.assertFalse(Featureprop.objects.exists())
+        self.assertTrue(Feature.objects.filter(uniquename="chr1").exists())
+
+        # nothing left to remove
+        removed = remover.remove(
+            table="dbxrefprop",
+            pk="dbxrefprop_id",
+            select_sql="SELECT dbxrefprop_id FROM dbxrefprop WHERE value = %s",
+            params=["missing.gff"],
+        )
+        self.assertEqual(0, removed)
+
+    def test_remove_organism(self):
+        """Tests - remove organism."""
+        organism2 = Organism.objects.create(genus="Homo", species="sapiens")
+        for i in range(3):
+            feature = self.create_feature(
+                "gene{}".format(i), self.cvterm_gene, "genes.gff"
+            )
+            Featureloc.objects.create(
+                feature=feature,
+                srcfeature=self.chromosome,
+                fmin=i * 100,
+                fmax=i * 100 + 50,
+                is_fmin_partial=False,
+                is_fmax_partial=False,
+                locgroup=0,
+                rank=0,
+            )
+        dbxref = Dbxref.objects.create(db=self.gff_db, accession="other")
+        feature2 = Feature.objects.create(
+            organism=organism2,
+            uniquename="gene0",
+            type=self.cvterm_gene,
+            dbxref=dbxref,
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        # a location of another organism placed on the removed chromosome
+        Featureloc.objects.create(
+            feature=feature2,
+            srcfeature=self.chromosome,
+            fmin=0,
+            fmax=50,
+            is_fmin_partial=False,
+            is_fmax_partial=False,
+            locgroup=0,
+            rank=1,
+        )
+
+        remover = ChunkedRemover(chunk_size=2, verbosity=0)
+        removed = remover.remove_organism(self.organism.organism_id)
+        self.assertEqual(4, removed)
+        self.assertEqual(1, remover.counts["organism"])
+        self.assertFalse(Organism.objects.filter(genus="Mus").exists())
+        self.assertEqual(
+            [(feature2.feature_id, None)],
+            list(Featureloc.objects.values_list("feature_id", "srcfeature_id")),
+        )
+        self.assertEqual(1, Feature.objects.count())
+        self.assertTrue(Feature.objects.filter(organism=organism2).exists())
+
+    def test_chunk_size(self):
+        """Tests - invalid chunk size."""
+        with self.assertRaisesMessage(
+            ImportingError, "The chunk size must be a positive integer"
+        ):
+            ChunkedRemover(chunk_size=0)
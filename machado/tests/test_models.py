@@ -6,9 +6,18 @@
 
 """Tests Models."""
 
+from datetime import datetime, timezone
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
+from machado.decorators import get_feature_locations, prefetch_feature_props
+from machado.decorators import retrieve_display_props, retrieve_feature_displays
 from machado.models import Db, Dbxref, Cvterm, Cv, Pub, PubDbxref
+from machado.models import Feature, Featureloc, Featureprop, FeaturepropPub
+from machado.models import FeaturePub
+from machado.models import Organism
 
 
 class DbModelTest(TestCase):
@@ -80,3 +89,183 @@ class DbModelTest(TestCase):
             pub=test_pub2, dbxref=test_dbxref_doi2, is_current=True
         )
         self.assertEqual("2003", test_pub2.pyear)
+
+
+class FeatureModelTest(TestCase):
+    """Tests Models - Feature."""
+
+    def setUp(self):
+        """Set up."""
+        db = Db.objects.create(name="internal")
+        so_cv = Cv.objects.create(name="sequence")
+        fp_cv = Cv.objects.create(name="feature_property")
+        self.cvterms = dict()
+        for name, cv in [
+            ("gene", so_cv),
+            ("display", fp_cv),
+            ("product", fp_cv),
+            ("note", fp_cv),
+            ("annotation", fp_cv),
+            ("orthologous group", fp_cv),
+        ]:
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=Dbxref.objects.create(accession=name, db=db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        self.organism = Organism.objects.create(genus="Mus", species="musculus")
+        doi_db = Db.objects.create(name="DOI")
+        self.pubs = list()
+        for i in range(2):
+            pub = Pub.objects.create(
+                uniquename="pub{}".format(i), type=self.cvterms["note"]
+            )
+            PubDbxref.objects.create(
+                pub=pub,
+                dbxref=Dbxref.objects.create(accession="10.1/{}".format(i), db=doi_db),
+                is_current=True,
+            )
+            self.pubs.append(pub)
+
+    def create_feature(self, uniquename, props):
+        """Create a gene and its props."""
+        feature = Feature.objects.create(
+            organism=self.organism,
+            uniquename=uniquename,
+            type=self.cvterms["gene"],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        for rank, (name, value) in enumerate(props):
+            Featureprop.objects.create(
+                feature=feature, type=self.cvterms[name], value=value, rank=rank
+            )
+        return feature
+
+    def test_props(self):
+        """Tests - feature props."""
+        feature = self.create_feature(
+            "gene1",
+            [
+                ("note", "a note"),
+                ("product", "kinase"),
+                ("annotation", "first"),
+                ("annotation", "second"),
+                ("orthologous group", "OG1"),
+            ],
+        )
+        FeaturepropPub.objects.create(
+            featureprop=Featureprop.objects.get(value="first"), pub=self.pubs[0]
+        )
+        FeaturePub.objects.create(feature=feature, pub=self.pubs[1])
+
+        feature = Feature.objects.get(feature_id=feature.feature_id)
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(2):
+                self.assertEqual("kinase", feature.get_display())
+                self.assertEqual("kinase", feature.get_product())
+                self.assertEqual("a note", feature.get_note())
+                self.assertIsNone(feature.get_description())
+                self.assertEqual("OG1", feature.get_orthologous_group())
+                self.assertIsNone(feature.get_coexpression_group())
+                self.assertEqual(
+                    ["first (DOI:10.1/0)", "second"], feature.get_annotation()
+                )
+                self.assertEqual({"10.1/0", "10.1/1"}, feature.get_doi())
+                self.assertEqual(
+                    [
+                        ("note", "a note"),
+                        ("orthologous group", "OG1"),
+                        ("product", "kinase"),
+                    ],
+                    feature.get_properties(),
+                )
+        # props, annotation DOIs and feature DOIs
+        self.assertEqual(3, len(queries))
+
+    def test_prefetch_props(self):
+        """Tests - prefetch feature props."""
+        for i in range(3):
+            self.create_feature(
+                "gene{}".format(i),
+                [("product", "product {}".format(i)), ("display", "gene {}".format(i))],
+            )
+        self.create_feature("gene3", list())
+        with CaptureQueriesContext(connection) as queries:
+            displays = [
+                feature.get_display()
+                for feature in prefetch_feature_props(
+                    Feature.objects.order_by("feature_id")
+                )
+            ]
+        self.assertEqual(["gene 0", "gene 1", "gene 2", None], displays)
+        self.assertEqual(2, len(queries))
+
+    def test_location(self):
+        """Tests - feature location."""
+        chromosome = self.create_feature("chr1", list())
+        features = [self.create_feature("gene{}".format(i), list()) for i in range(3)]
+        for i, feature in enumerate(features[:2]):
+            for rank in range(2):
+                Featureloc.objects.create(
+                    feature=feature,
+                    srcfeature=chromosome,
+                    fmin=i * 5000 + rank * 2000,
+                    fmax=i * 5000 + rank * 2000 + 100,
+                    strand=1,
+                    is_fmin_partial=False,
+                    is_fmax_partial=False,
+                    locgroup=0,
+                    rank=rank,
+                )
+
+        feature = Feature.objects.get(feature_id=features[0].feature_id)
+        with CaptureQueriesContext(connection) as queries:
+            locations = feature.get_location()
+            self.assertEqual(locations, feature.get_location())
+        self.assertEqual(1, len(queries))
+        self.assertEqual(
+            {
+                "start": 2000,
+                "end": 2100,
+                "strand": 1,
+                "ref": "chr1",
+                "jbrowse_url": "http://localhost/jbrowse/?data=data/Mus musculus"
+                "&loc=chr1:800..3300&tracklist=0&nav=0&overview=0"
+                "&tracks=ref_seq,gene,transcripts,CDS",
+            },
+            locations[1],
+        )
+
+        feature_ids = [feature.feature_id for feature in features]
+        with CaptureQueriesContext(connection) as queries:
+            locations = get_feature_locations(feature_ids)
+        self.assertEqual(1, len(queries))
+        self.assertEqual([2, 2, 0], [len(locations[i]) for i in feature_ids])
+        self.assertEqual(5000, locations[feature_ids[1]][0]["start"])
+
+    def test_retrieve_displays(self):
+        """Tests - retrieve_feature_displays."""
+        features = [
+            self.create_feature("gene0", [("note", "a note"), ("product", "kinase")]),
+            self.create_feature("gene1", [("display", "first"), ("display", "second")]),
+            self.create_feature("gene2", [("orthologous group", "OG1")]),
+        ]
+        Featureprop.objects.filter(value="first").update(rank=2)
+        feature_ids = [feature.feature_id for feature in features]
+        with CaptureQueriesContext(connection) as queries:
+            displays = retrieve_feature_displays(feature_ids)
+        self.assertEqual(1, len(queries))
+        self.assertEqual({feature_ids[0]: "kinase", feature_ids[1]: "second"}, displays)
+        self.assertEqual(
+            [Feature.objects.get(feature_id=i).get_display() for i in feature_ids[:2]],
+            [displays[i] for i in feature_ids[:2]],
+        )
+        self.assertEqual(
+            {"note": "a note", "product": "kinase"},
+            retrieve_display_props(feature_ids)[feature_ids[0]],
+        )
@@ -0,0 +1,172 @@
+# Copyright 2018 by Embrapa.  All rights reserved.
+#
+# This code is part of the machado distribution and governed by its
+# license. Please see the LICENSE.txt and README.md files that should
+# have been included as part of this package for licensing information.
+
+"""Tests PostgreSQL search backend."""
+
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.http import QueryDict
+from django.test import TestCase
+from haystack import connections
+from haystack.query import SearchQuerySet
+
+from machado.forms import FeatureSearchForm
+from machado.cache import versioned_cache_key
+from machado.indexing import update_search_documents
+from machado.models import Cv, Cvterm, Db, Dbxref, Feature, Featureprop
+from machado.models import Organism, SearchDocument
+from machado.search_backend import prefix_tsquery
+
+
+class PostgresSearchBackendTest(TestCase):
+    """Tests PostgreSQL search backend."""
+
+    def setUp(self):
+        """Set up."""
+        cache.clear()
+        db = Db.objects.create(name="SO")
+        so_cv = Cv.objects.create(name="sequence")
+        fp_cv = Cv.objects.create(name="feature_property")
+        self.cvterms = dict()
+        for name, cv in [
+            ("gene", so_cv),
+            ("polypeptide", so_cv),
+            ("display", fp_cv),
+            ("orthologous group", fp_cv),
+        ]:
+            self.cvterms[name] = Cvterm.objects.create(
+                name=name,
+                cv=cv,
+                dbxref=Dbxref.objects.create(accession=name, db=db),
+                is_obsolete=0,
+                is_relationshiptype=0,
+            )
+        mouse = Organism.objects.create(genus="Mus", species="musculus")
+        human = Organism.objects.create(genus="Homo", species="sapiens")
+        self.features = [
+            self.create_feature(mouse, "Mm0001", "gene", "protein kinase"),
+            self.create_feature(mouse, "Mm0002", "gene", "ubiquitin ligase"),
+            self.create_feature(mouse, "Mm0003.1", "polypeptide", "protein kinase"),
+            self.create_feature(human, "Hs0001.1", "polypeptide", "kinase-like"),
+        ]
+        for feature in self.features[2:]:
+            Featureprop.objects.create(
+                feature=feature,
+                type=self.cvterms["orthologous group"],
+                value="OG1",
+                rank=0,
+            )
+        self.sqs = SearchQuerySet()
+        update_search_documents([feature.feature_id for feature in self.features])
+
+    def create_feature(self, organism, uniquename, soterm, display):
+        """Create a feature and its display."""
+        feature = Feature.objects.create(
+            organism=organism,
+            uniquename=uniquename,
+            type=self.cvterms[soterm],
+            is_analysis=False,
+            is_obsolete=False,
+            timeaccessioned=datetime.now(timezone.utc),
+            timelastmodified=datetime.now(timezone.utc),
+        )
+        Featureprop.objects.create(
+            feature=feature, type=self.cvterms["display"], value=display, rank=0
+        )
+        return feature
+
+    def search(self, q, *selected_facets):
+        """Search using the feature search form."""
+        data = QueryDict(mutable=True)
+        data["q"] = q
+        data.setlist("selected_facets", selected_facets)
+        form = FeatureSearchForm(data, searchqueryset=self.sqs, load_all=False)
+        self.assertTrue(form.is_valid())
+        return form.search()
+
+    def test_prefix_tsquery(self):
+        """Tests - prefix tsquery."""
+        self.assertEqual("'kin':* & 'o''brien':*", prefix_tsquery("kin* o'brien"))
+        self.assertEqual("", prefix_tsquery(" * "))
+
+    def test_update(self):
+        """Tests - update."""
+        self.assertEqual(4, SearchDocument.objects.count())
+        document = SearchDocument.objects.get(
+            search_document_id="machado.feature.{}".format(self.features[2].feature_id)
+        )
+        self.assertEqual("machado.feature", document.django_ct)
+        self.assertEqual("Mm0003.1", document.document["uniquename"])
+        self.assertEqual("Mus musculus", document.facets["organism_exact"])
+        self.assertTrue(document.facets["orthology_exact"])
+        self.assertNotIn("organism_exact", document.document)
+
+        # the documents are replaced
+        update_search_documents([self.features[2].feature_id])
+        self.assertEqual(4, SearchDocument.objects.count())
+
+        # the search schema is retrieved once per chunk of documents
+        with patch(
+            "machado.indexing.versioned_cache_key", wraps=versioned_cache_key
+        ) as schema_key:
+            update_search_documents([feature.feature_id for feature in self.features])
+        self.assertEqual(1, schema_key.call_count)
+
+    def test_search(self):
+        """Tests - search."""
+        results = self.search("protein kinase")
+        self.assertEqual(2, results.count())
+        self.assertEqual(
+            ["Mm0001", "Mm0003.1"],
+            [result.uniquename for result in results.order_by("uniquename_exact")],
+        )
+        result = results.order_by("-uniquename_exact")[0]
+        self.assertEqual("Mm0003.1", result.uniquename)
+        self.assertEqual("Mus musculus", result.organism)
+        self.assertEqual(str(self.features[2].feature_id), result.pk)
+
+        self.assertEqual(3, self.search("kinase").count())
+        self.assertEqual(3, self.search("kin*").count())
+        self.assertEqual(2, self.search("kinase NOT Mm0003.1").count())
+        self.assertEqual(4, self.search("kinase OR ubiquitin").count())
+        self.assertEqual(1, self.search("Mm0003.1").count())
+        self.assertEqual(4, self.search("").count())
+        self.assertEqual(0, self.search("phosphatase").count())
+        self.assertEqual(1, len(self.search("")[1:2]))
+
+    def test_facets(self):
+        """Tests - facets."""
+        results = self.search("kinase").facet("organism").facet("orthology")
+        facets = results.facet_counts()["fields"]
+        self.assertEqual([("Mus musculus", 2), ("Homo sapiens", 1)], facets["organism"])
+        self.assertEqual([(1, 2), (0, 1)], facets["orthology"])
+
+        results = self.search("kinase", "organism:Mus musculus", "orthology:true")
+        self.assertEqual(["Mm0003.1"], [result.uniquename for result in results])
+        results = self.search("", "so_term:gene", "so_term:polypeptide")
+        self.assertEqual(4, results.count())
+        results = self.search("", "orthologs_coexpression:false")
+        self.assertEqual(4, results.count())
+        results = self.sqs.narrow('organism_exact:"Homo sapiens"')
+        self.assertEqual(["Hs0001.1"], [result.uniquename for result in results])
+
+    def test_autocomplete(self):
+        """Tests - autocomplete."""
+        results = self.sqs.filter(autocomplete="ubiq")
+        self.assertEqual(["Mm0002"], [result.uniquename for result in results])
+        self.assertIn("ubiquitin", results[0].autocomplete)
+        self.assertEqual(2, self.sqs.filter(autocomplete="prot").count())
+        self.assertEqual(0, self.sqs.filter(autocomplete="biq").count())
+
+    def test_remove(self):
+        """Tests - remove and clear."""
+        backend = connections["default"].get_backend()
+        backend.remove("machado.feature.{}".format(self.features[0].feature_id))
+        self.assertEqual(3, self.sqs.all().count())
+        backend.clear(models=[Feature])
+        self.assertEqual(0, self.sqs.all().count())
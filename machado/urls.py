@@ -8,8 +8,8 @@
 
 from django.conf import settings
 from django.urls import include, re_path
-from django.views.decorators.cache import cache_page
 
+from machado.cache import versioned_cache_page
 from machado.views import common
 
 try:
@@ -25,31 +25,37 @@ if "haystack" in settings.INSTALLED_APPS:
         re_path(r"account/", include("machado.account.urls"), name="account"),
         re_path(
             r"feature/",
-            cache_page(CACHE_TIMEOUT)(feature.FeatureView.as_view()),
+            versioned_cache_page(CACHE_TIMEOUT)(feature.FeatureView.as_view()),
             name="feature",
         ),
         re_path(
             r"data/",
-            cache_page(CACHE_TIMEOUT)(common.DataSummaryView.as_view()),
+            versioned_cache_page(CACHE_TIMEOUT)(common.DataSummaryView.as_view()),
             name="data_numbers",
         ),
         re_path(
             r"find/",
-            cache_page(CACHE_TIMEOUT)(search.FeatureSearchView.as_view()),
+            versioned_cache_page(CACHE_TIMEOUT)(search.FeatureSearchView.as_view()),
             name="feature_search",
         ),
         re_path(
             r"export/",
-            cache_page(CACHE_TIMEOUT)(search.FeatureSearchExportView.as_view()),
+            versioned_cache_page(CACHE_TIMEOUT)(
+                search.FeatureSearchExportView.as_view()
+            ),
             name="feature_search_export",
         ),
         re_path(
-            r"^$", cache_page(CACHE_TIMEOUT)(common.HomeView.as_view()), name="home"
+            r"^$",
+            versioned_cache_page(CACHE_TIMEOUT)(common.HomeView.as_view()),
+            name="home",
         ),
     ]
 else:
     urlpatterns = [
         re_path(
-            r"^$", cache_page(CACHE_TIMEOUT)(common.CongratsView.as_view()), name="home"
+            r"^$",
+            versioned_cache_page(CACHE_TIMEOUT)(common.CongratsView.as_view()),
+            name="home",
         )
     ]
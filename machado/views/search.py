@@ -8,7 +8,7 @@
 from haystack.generic_views import FacetedSearchView
 
 from machado.forms import FeatureSearchForm
-from machado.models import Featureprop
+from machado.indexing import get_search_schema
 
 FACET_FIELDS = {
     "organism": "Filter by organism (gene, mRNA, polypeptide)",
@@ -75,13 +75,9 @@ class FeatureSearchView(FacetedSearchView):
         context["selected_facets"] = selected_facets
         context["selected_facets_fields"] = selected_facets_fields
 
-        context["orthologs"] = Featureprop.objects.filter(
-            type__name="orthologous group", type__cv__name="feature_property"
-        ).exists()
-
-        context["coexp_groups"] = Featureprop.objects.filter(
-            type__name="coexpression group", type__cv__name="feature_property"
-        ).exists()
+        schema = get_search_schema()
+        context["orthologs"] = schema["orthology"]
+        context["coexp_groups"] = schema["coexpression"]
 
         return context
 
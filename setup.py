@@ -42,6 +42,8 @@ setup(
         "drf-nested-routers~=0.94.1",
         "pysam~=0.22.1",
         "django-haystack~=3.3.0",
+        "orjson~=3.8",
+        "numpy>=1.22",
     ],
     zip_safe=False,
 )